@@ -7,6 +7,11 @@ class Aggregator(ShotHandler):
         super(Aggregator, self).__init__(name=name, datatool_type=DataTool.AGGREGATOR)
         self.verifier_datafield_names = verifier_datafield_names
 
+    def link_within_datamodel(self):
+        super(Aggregator, self).link_within_datamodel()
+        for verifier_datafield_name in self.verifier_datafield_names:
+            self.add_parent(verifier_datafield_name)
+
     def aggregate(self, shot_num, quiet=False):
         self.handle(shot_num, quiet=quiet)
 
@@ -1,16 +1,73 @@
+import numpy as np
 from .datatool import DataTool
+from .utils import get_shot_list_from_point
+
+
+def resolve_dtype(dtype_policy, native_dtype):
+    if dtype_policy is None or dtype_policy == DataField.DTYPE_NATIVE:
+        return np.dtype(native_dtype)
+    return np.dtype(dtype_policy)
+
+
+def read_h5_dataset(dataset, selection=(), dtype_policy=None, out=None):
+    """
+    Read selection from an h5py dataset. The conversion to the dtype given by dtype_policy (DataField.DTYPE_NATIVE,
+    DataField.DTYPE_FLOAT32, DataField.DTYPE_FLOAT64 or any numpy dtype) is done by HDF5 during the read so that no
+    intermediate copy in the stored dtype is made. If out is given the data is read directly into out (converting to
+    out.dtype) and out is returned.
+    """
+    if out is not None:
+        if isinstance(selection, tuple) and len(selection) == 0:
+            selection = None
+        dataset.read_direct(out, source_sel=selection)
+        return out
+    dtype = resolve_dtype(dtype_policy, dataset.dtype)
+    if dtype == dataset.dtype:
+        return dataset[selection]
+    return dataset.astype(dtype)[selection]
+
+
+def convert_data(data, dtype_policy=None, out=None):
+    """ In-memory counterpart to read_h5_dataset for data which has already been read. """
+    if out is not None:
+        out[...] = data
+        return out
+    if dtype_policy is None:
+        return data
+    return np.asarray(data).astype(resolve_dtype(dtype_policy, np.asarray(data).dtype), copy=False)
 
 
 class DataField(DataTool):
+    # DataFields which can read many entries with a single vectorized call set SUPPORTS_BATCH_READS to True and
+    # override get_batch_data.
+    SUPPORTS_BATCH_READS = False
+    # DataFields whose reads are expensive (e.g. from .h5 files) set CACHEABLE to True so that repeated reads of the
+    # same shot are served from the DataModel shot_data_cache.
+    CACHEABLE = False
+    # dtype policies for DataFields backed by .h5 files. DTYPE_NATIVE returns data in the dtype it is stored in.
+    DTYPE_NATIVE = 'native'
+    DTYPE_FLOAT32 = 'float32'
+    DTYPE_FLOAT64 = 'float64'
+
     def __init__(self, *, name, datatool_type):
         super(DataField, self).__init__(name=name, datatool_type=datatool_type)
 
+    def get_data(self, data_index):
+        raise NotImplementedError
+
+    def get_batch_data(self, data_index_list):
+        data_list = []
+        for data_index in data_index_list:
+            data = self.get_data(data_index)
+            data_list.append(data)
+        return data_list
+
 
 class ShotDataField(DataField):
     def __init__(self, *, name):
         super(ShotDataField, self).__init__(name=name, datatool_type=DataTool.SHOT_DATAFIELD)
 
-    def get_data(self, shot_num):
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
         raise NotImplementedError
 
     def set_data(self, shot_num, data):
@@ -23,6 +80,10 @@ class ShotDataField(DataField):
             data_list.append(data)
         return data_list
 
+    def get_point_data(self, point_num, num_points, num_shots):
+        shot_list, num_loops = get_shot_list_from_point(point_num, num_points, num_shots)
+        return self.get_batch_data(list(shot_list))
+
 
 class PointDataField(DataField):
     def __init__(self, *, name):
@@ -36,24 +97,57 @@ class PointDataField(DataField):
 
 
 class DataStreamDataField(ShotDataField):
-    def __init__(self, *, name, datastream_name, h5_subpath, h5_dataset_name):
+    CACHEABLE = True
+
+    def __init__(self, *, name, datastream_name, h5_subpath, h5_dataset_name, dtype=DataField.DTYPE_FLOAT64):
         super(DataStreamDataField, self).__init__(name=name)
         self.datastream_name = datastream_name
         self.h5_subpath = h5_subpath
         self.h5_dataset_name = h5_dataset_name
+        self.dtype = dtype
         self.datastream = None
 
     def link_within_datamodel(self):
         super(DataStreamDataField, self).link_within_datamodel()
         self.datastream = self.datamodel.datatool_dict[self.datastream_name]
 
-    def get_data(self, shot_num):
-        h5_file = self.datastream.load_shot(shot_num)
-        if self.h5_subpath is not None:
-            h5_group = h5_file[self.h5_subpath]
-        else:
-            h5_group = h5_file
-        data = h5_group[self.h5_dataset_name][:].astype(float)
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
+        """
+        Read the dataset for shot_num. If region, a tuple of slices, is given only that region is read from the file as
+        an h5py hyperslab selection. dtype overrides the dtype policy of the datafield for this read and out may be a
+        preallocated array into which the data is read.
+        """
+        shot_prefetcher = self.datamodel.shot_prefetcher
+        if shot_prefetcher is not None:
+            data = shot_prefetcher.get_data(self.name, shot_num)
+            if data is not None:
+                if region is not None:
+                    data = data[region]
+                if out is not None:
+                    out[...] = data
+                    return out
+                # The prefetched data is stored in its native dtype and shared by all readers of this shot. The dtype
+                # policy is applied here, while making the copy for this reader.
+                if dtype is None:
+                    dtype = self.dtype
+                return np.array(data, dtype=resolve_dtype(dtype, data.dtype))
+        return self.load_data(shot_num, region=region, dtype=dtype, out=out)
+
+    def load_data(self, shot_num, region=None, dtype=None, out=None):
+        if region is None:
+            region = ()
+        if dtype is None:
+            dtype = self.dtype
+        performance_monitor = self.datamodel.performance_monitor
+        with self.datastream.load_shot(shot_num) as h5_file:
+            with performance_monitor.measure(performance_monitor.STAGE_DATASTREAM_READ, self.name,
+                                             shot_num) as measurement:
+                if self.h5_subpath is not None:
+                    h5_group = h5_file[self.h5_subpath]
+                else:
+                    h5_group = h5_file
+                data = read_h5_dataset(h5_group[self.h5_dataset_name], selection=region, dtype_policy=dtype, out=out)
+                measurement.num_bytes = data.nbytes
         return data
 
     def set_data(self, shot_num, data):
@@ -62,8 +156,11 @@ class DataStreamDataField(ShotDataField):
 
 
 class H5ShotDataField(ShotDataField):
-    def __init__(self, *, name):
+    CACHEABLE = True
+
+    def __init__(self, *, name, dtype=DataField.DTYPE_FLOAT64):
         super(H5ShotDataField, self).__init__(name=name)
+        self.dtype = dtype
         self.datafield_group = None
 
     def reset(self):
@@ -74,13 +171,15 @@ class H5ShotDataField(ShotDataField):
 
     def link_within_datamodel(self):
         super(H5ShotDataField, self).link_within_datamodel()
-        if self.name not in self.datamodel.data_h5['shot_data']:
-            self.datamodel.data_h5['shot_data'].create_group(name=self.name)
-        self.datafield_group = self.datamodel.data_h5['shot_data'][self.name]
+        self.datafield_group = self.datamodel.get_data_h5_group('shot_data', self.name)
 
-    def get_data(self, shot_num):
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
+        if region is None:
+            region = ()
+        if dtype is None:
+            dtype = self.dtype
         shot_key = f'shot_{shot_num:05d}'
-        data = self.datafield_group[shot_key][:].astype(float)
+        data = read_h5_dataset(self.datafield_group[shot_key], selection=region, dtype_policy=dtype, out=out)
         return data
 
     def set_data(self, shot_num, data):
@@ -89,8 +188,9 @@ class H5ShotDataField(ShotDataField):
 
 
 class H5PointDataField(PointDataField):
-    def __init__(self, *, name):
+    def __init__(self, *, name, dtype=DataField.DTYPE_FLOAT64):
         super(H5PointDataField, self).__init__(name=name)
+        self.dtype = dtype
         self.datafield_group = None
 
     def reset(self):
@@ -101,13 +201,13 @@ class H5PointDataField(PointDataField):
 
     def link_within_datamodel(self):
         super(H5PointDataField, self).link_within_datamodel()
-        if self.name not in self.datamodel.data_h5['point_data']:
-            self.datafield_group = self.datamodel.data_h5['point_data'].create_group(name=self.name)
-        self.datafield_group = self.datamodel.data_h5['point_data'][self.name]
+        self.datafield_group = self.datamodel.get_data_h5_group('point_data', self.name)
 
-    def get_data(self, point_num):
+    def get_data(self, point_num, dtype=None, out=None):
+        if dtype is None:
+            dtype = self.dtype
         point_key = f'point_{point_num:02d}'
-        data = self.datafield_group[point_key][:].astype(float)
+        data = read_h5_dataset(self.datafield_group[point_key], dtype_policy=dtype, out=out)
         return data
 
     def set_data(self, point_num, data):
@@ -121,23 +221,26 @@ class H5PointDataField(PointDataField):
 class DataDictShotDataField(ShotDataField):
     def __init__(self, *, name):
         super(DataDictShotDataField, self).__init__(name=name)
-        self.datafield_dict = None
+
+    @property
+    def datafield_dict(self):
+        return self.datamodel.data_dict['shot_data'][self.name]
 
     def reset(self):
         super(DataDictShotDataField, self).reset()
         self.datamodel.data_dict['shot_data'][self.name] = dict()
-        self.datafield_dict = self.datamodel.data_dict['shot_data'][self.name]
 
     def link_within_datamodel(self):
         super(DataDictShotDataField, self).link_within_datamodel()
         if self.name not in self.datamodel.data_dict['shot_data']:
             self.datamodel.data_dict['shot_data'][self.name] = dict()
-        self.datafield_dict = self.datamodel.data_dict['shot_data'][self.name]
 
-    def get_data(self, shot_num):
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
         shot_key = f'shot_{shot_num:05d}'
         data = self.datafield_dict[shot_key]
-        return data
+        if region is not None:
+            data = data[region]
+        return convert_data(data, dtype_policy=dtype, out=out)
 
     def set_data(self, shot_num, data):
         shot_key = f'shot_{shot_num:05d}'
@@ -147,18 +250,19 @@ class DataDictShotDataField(ShotDataField):
 class DataDictPointDataField(PointDataField):
     def __init__(self, *, name):
         super(DataDictPointDataField, self).__init__(name=name)
-        self.datafield_dict = None
+
+    @property
+    def datafield_dict(self):
+        return self.datamodel.data_dict['point_data'][self.name]
 
     def reset(self):
         super(DataDictPointDataField, self).reset()
         self.datamodel.data_dict['point_data'][self.name] = dict()
-        self.datafield_dict = self.datamodel.data_dict['point_data'][self.name]
 
     def link_within_datamodel(self):
         super(DataDictPointDataField, self).link_within_datamodel()
         if self.name not in self.datamodel.data_dict['point_data']:
             self.datamodel.data_dict['point_data'][self.name] = dict()
-        self.datafield_dict = self.datamodel.data_dict['point_data'][self.name]
 
     def get_data(self, point_num):
         point_key = f'point_{point_num:d}'
@@ -168,3 +272,222 @@ class DataDictPointDataField(PointDataField):
     def set_data(self, point_num, data):
         point_key = f'point_{point_num:d}'
         self.datafield_dict[point_key] = data
+
+
+class ArrayShotDataField(ShotDataField):
+    """ Columnar ShotDataField for scalars or small fixed-shape arrays of a fixed dtype.
+
+    Data is stored in data_dict['shot_data'][<name>] as a dict holding a growable NumPy array 'data' of shape
+    (capacity, *shape) indexed by shot number and a boolean 'valid' mask marking which shots have been set. Shots which
+    have not been set hold fill_value (NaN for float dtypes, 0 otherwise) in the underlying array. get_point_data
+    returns a read-only strided view of the underlying array rather than a list if every shot of the point has been
+    set. Otherwise, like StackedH5ShotDataField, it returns a copy with NaN for the missing shots for float and complex
+    dtypes and leaves the missing shots out for other dtypes. get_data returns a copy of array entries.
+    """
+    SUPPORTS_BATCH_READS = True
+
+    def __init__(self, *, name, dtype=float, shape=(), fill_value=None, initial_capacity=1024):
+        super(ArrayShotDataField, self).__init__(name=name)
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        if fill_value is None:
+            fill_value = np.nan if self.dtype.kind in 'fc' else 0
+        self.fill_value = fill_value
+        self.initial_capacity = initial_capacity
+
+    @property
+    def datafield_dict(self):
+        return self.datamodel.data_dict['shot_data'][self.name]
+
+    def make_storage(self, capacity):
+        data = np.full((capacity,) + self.shape, self.fill_value, dtype=self.dtype)
+        valid = np.zeros(capacity, dtype=bool)
+        return {'data': data, 'valid': valid}
+
+    def reset(self):
+        super(ArrayShotDataField, self).reset()
+        self.datamodel.data_dict['shot_data'][self.name] = self.make_storage(self.initial_capacity)
+
+    def link_within_datamodel(self):
+        super(ArrayShotDataField, self).link_within_datamodel()
+        if self.name not in self.datamodel.data_dict['shot_data']:
+            self.datamodel.data_dict['shot_data'][self.name] = self.make_storage(self.initial_capacity)
+
+    def grow(self, min_capacity):
+        old_data = self.datafield_dict['data']
+        old_valid = self.datafield_dict['valid']
+        new_capacity = max(2 * len(old_data), min_capacity, 1)
+        new_storage = self.make_storage(new_capacity)
+        new_storage['data'][:len(old_data)] = old_data
+        new_storage['valid'][:len(old_valid)] = old_valid
+        self.datafield_dict['data'] = new_storage['data']
+        self.datafield_dict['valid'] = new_storage['valid']
+
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
+        valid = self.datafield_dict['valid']
+        if not 0 <= shot_num < len(valid) or not valid[shot_num]:
+            raise KeyError(f'shot_{shot_num:05d}')
+        data = self.datafield_dict['data'][shot_num]
+        if region is not None:
+            data = data[region]
+        data = convert_data(data, dtype_policy=dtype, out=out)
+        if out is None and isinstance(data, np.ndarray) and data.base is not None:
+            # Don't hand out a writeable view into the stored data.
+            data = data.copy()
+        return data
+
+    def set_data(self, shot_num, data):
+        if shot_num >= len(self.datafield_dict['valid']):
+            self.grow(shot_num + 1)
+        self.datafield_dict['data'][shot_num] = data
+        self.datafield_dict['valid'][shot_num] = True
+
+    def get_batch_data(self, shot_list):
+        shot_array = np.asarray(shot_list, dtype=int)
+        valid = self.datafield_dict['valid']
+        missing_mask = (shot_array < 0) | (shot_array >= len(valid))
+        missing_mask[~missing_mask] = ~valid[shot_array[~missing_mask]]
+        if np.any(missing_mask):
+            raise KeyError(f'shot_{shot_array[missing_mask][0]:05d}')
+        return self.datafield_dict['data'][shot_array]
+
+    def get_point_data(self, point_num, num_points, num_shots):
+        stop_shot = min(num_shots, len(self.datafield_dict['valid']))
+        point_selection = np.s_[point_num:stop_shot:num_points]
+        data = self.datafield_dict['data'][point_selection]
+        valid = self.datafield_dict['valid'][point_selection]
+        if np.all(valid):
+            data = data.view()
+            data.flags.writeable = False
+            return data
+        if data.dtype.kind in 'fc':
+            data = data.copy()
+            data[~valid] = np.nan
+            return data
+        return data[valid]
+
+    def get_valid_mask(self, num_shots=None):
+        valid = self.datafield_dict['valid']
+        if num_shots is not None:
+            valid = valid[:num_shots]
+        return valid
+
+
+class StackedH5ShotDataField(ShotDataField):
+    """ ShotDataField which stores all shots in a single resizable, chunked HDF5 dataset.
+
+    The data lives in data_h5['shot_data'][<name>]['data'] with shape (capacity, *frame_shape) and a boolean
+    data_h5['shot_data'][<name>]['valid'] dataset marks which shots have been written. The datasets are created on the
+    first call to set_data using the shape of the first frame and grow geometrically (at least doubling, in multiples
+    of MIN_GROWTH shots) so that appending shots does not resize the datasets on every shot. The number of shots
+    covered, one past the largest shot written, is kept in the num_shots attribute of the group. By default every shot
+    is its own chunk; chunk_shape, compression and compression_opts are passed through to h5py. Batches of shots and
+    all shots of a point are read with a single h5py selection. get_point_data returns NaN for the shots of the point
+    which have not been written if the data is read as a float dtype and leaves these shots out otherwise.
+    """
+    SUPPORTS_BATCH_READS = True
+    CACHEABLE = True
+    MIN_GROWTH = 64
+
+    def __init__(self, *, name, chunk_shape=None, compression=None, compression_opts=None,
+                 dtype=DataField.DTYPE_FLOAT64):
+        super(StackedH5ShotDataField, self).__init__(name=name)
+        self.dtype = dtype
+        self.chunk_shape = chunk_shape
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.datafield_group = None
+
+    def reset(self):
+        super(StackedH5ShotDataField, self).reset()
+        if self.name in self.datamodel.data_h5['shot_data']:
+            del self.datamodel.data_h5['shot_data'][self.name]
+        self.datafield_group = self.datamodel.data_h5['shot_data'].create_group(name=self.name)
+
+    def link_within_datamodel(self):
+        super(StackedH5ShotDataField, self).link_within_datamodel()
+        self.datafield_group = self.datamodel.get_data_h5_group('shot_data', self.name)
+
+    def create_datasets(self, frame):
+        chunk_shape = self.chunk_shape
+        if chunk_shape is None:
+            chunk_shape = (1,) + frame.shape
+        self.datafield_group.create_dataset('data', shape=(0,) + frame.shape, maxshape=(None,) + frame.shape,
+                                            dtype=frame.dtype, chunks=chunk_shape, compression=self.compression,
+                                            compression_opts=self.compression_opts)
+        self.datafield_group.create_dataset('valid', shape=(0,), maxshape=(None,), dtype=bool, chunks=(1024,))
+        self.datafield_group.attrs['num_shots'] = 0
+
+    def get_num_stored_shots(self):
+        if 'data' not in self.datafield_group:
+            return 0
+        # Groups written before the datasets were grown geometrically have no num_shots attribute.
+        return int(self.datafield_group.attrs.get('num_shots', self.datafield_group['data'].shape[0]))
+
+    def check_valid(self, shot_array):
+        if len(shot_array) == 0:
+            return
+        num_stored_shots = self.get_num_stored_shots()
+        missing_mask = (shot_array < 0) | (shot_array >= num_stored_shots)
+        if not np.any(missing_mask):
+            # h5py requires increasing, unique indices for point selections
+            unique_shot_array, inverse = np.unique(shot_array, return_inverse=True)
+            missing_mask = ~self.datafield_group['valid'][unique_shot_array][inverse]
+        if np.any(missing_mask):
+            raise KeyError(f'shot_{shot_array[missing_mask][0]:05d}')
+
+    def get_data(self, shot_num, region=None, dtype=None, out=None):
+        if region is None:
+            region = ()
+        if dtype is None:
+            dtype = self.dtype
+        if not 0 <= shot_num < self.get_num_stored_shots() or not self.datafield_group['valid'][shot_num]:
+            raise KeyError(f'shot_{shot_num:05d}')
+        data = read_h5_dataset(self.datafield_group['data'], selection=(shot_num,) + tuple(region),
+                               dtype_policy=dtype, out=out)
+        return data
+
+    def set_data(self, shot_num, data):
+        data = np.asarray(data)
+        if 'data' not in self.datafield_group:
+            self.create_datasets(data)
+        data_dataset = self.datafield_group['data']
+        valid_dataset = self.datafield_group['valid']
+        num_stored_shots = self.get_num_stored_shots()
+        capacity = data_dataset.shape[0]
+        if shot_num >= capacity:
+            new_capacity = max(2 * capacity, shot_num + 1)
+            new_capacity = -(-new_capacity // self.MIN_GROWTH) * self.MIN_GROWTH
+            data_dataset.resize(new_capacity, axis=0)
+            valid_dataset.resize(new_capacity, axis=0)
+        data_dataset[shot_num] = data
+        valid_dataset[shot_num] = True
+        if shot_num >= num_stored_shots or 'num_shots' not in self.datafield_group.attrs:
+            self.datafield_group.attrs['num_shots'] = max(num_stored_shots, shot_num + 1)
+
+    def get_batch_data(self, shot_list):
+        shot_array = np.asarray(shot_list, dtype=int)
+        self.check_valid(shot_array)
+        data_dataset = self.datafield_group['data']
+        dtype = resolve_dtype(self.dtype, data_dataset.dtype)
+        if len(shot_array) == 0:
+            return np.empty((0,) + data_dataset.shape[1:], dtype=dtype)
+        # h5py requires increasing, unique indices for point selections
+        unique_shot_array, inverse = np.unique(shot_array, return_inverse=True)
+        data = read_h5_dataset(data_dataset, selection=unique_shot_array, dtype_policy=dtype)
+        return data[inverse]
+
+    def get_point_data(self, point_num, num_points, num_shots):
+        stop_shot = min(num_shots, self.get_num_stored_shots())
+        data_dataset = self.datafield_group['data']
+        if point_num >= stop_shot:
+            return np.empty((0,) + data_dataset.shape[1:], dtype=resolve_dtype(self.dtype, data_dataset.dtype))
+        point_selection = np.s_[point_num:stop_shot:num_points]
+        data = read_h5_dataset(data_dataset, selection=point_selection, dtype_policy=self.dtype)
+        valid = self.datafield_group['valid'][point_selection]
+        if np.all(valid):
+            return data
+        if data.dtype.kind in 'fc':
+            data[~valid] = np.nan
+            return data
+        return data[valid]
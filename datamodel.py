@@ -1,14 +1,28 @@
 from pathlib import Path
+import os
+import math
 import datetime
 import matplotlib.pyplot as plt
 import pickle
+import threading
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 import h5py
-from .datatool import Rebuildable, DataTool
-from .utils import qprint, get_shot_list_from_point, dict_compare, get_shot_labels
+from .datatool import Rebuildable, DataTool, ShotHandler
+from .datafield import DataField
+from .prefetcher import ShotPrefetcher
+from .shotcache import ShotDataCache
+from .journal import DataModelJournal
+from .sectionfile import dump_section, dump_header, load_header, LazySectionDict
+from .export import export_datamodel, EXPORT_FORMAT_NPY
+from .instrumentation import PerformanceMonitor
+from .reporter.headless import HeadlessSaver
+from .utils import qprint, get_shot_list_from_point, dict_compare, get_shot_labels, shot_to_loop_and_point, RateLimiter
 
 
 def get_datamodel(*, datamodel_path=None, run_name, datamodel_name='datamodel', num_points,
-                  run_doc_string, overwrite_run_doc_string=False):
+                  run_doc_string, overwrite_run_doc_string=False, incremental_save=False):
     try:
         if not datamodel_path:
             datamodel_path = Path.cwd()
@@ -27,15 +41,15 @@ def get_datamodel(*, datamodel_path=None, run_name, datamodel_name='datamodel',
         print(e)
         print('Creating new datamodel')
         datamodel = DataModel(run_name=run_name, num_points=num_points,
-                              run_doc_string=run_doc_string)
+                              run_doc_string=run_doc_string, incremental_save=incremental_save)
         return datamodel
 
 
-def load_datamodel(*, datamodel_path=None, run_name, datamodel_name='datamodel'):
+def load_datamodel(*, datamodel_path=None, run_name, datamodel_name='datamodel', read_only=False):
     if not datamodel_path:
         datamodel_path = Path.cwd()
     datamodel_path = Path(datamodel_path, f'{run_name}-{datamodel_name}.p')
-    datamodel = DataModel.load_datamodel(datamodel_path)
+    datamodel = DataModel.load_datamodel(datamodel_path, read_only=read_only)
     return datamodel
 
 
@@ -61,8 +75,21 @@ class DataModel(Rebuildable):
         is called by determining the number of .h5 files in the master DataStream raw data directory.
     last_handled_shot : int
         The number of the last shot which has been processed by the DataModel.
+    shot_data_cache : e6dataflow.shotcache.ShotDataCache
+        Memoizes reads of the shot currently being run so that several DataTools reading the same raw frame only read
+        it from disk once. Its size is limited to shot_cache_max_bytes. Hit and miss counts are available from
+        shot_data_cache.get_stats().
     datamodel_file_path : pathlib.Path
         Path where the DataModel pickle file will be saved.
+    incremental_save : bool
+        If True, save_datamodel appends only the changes since the previous save to a journal file
+        (<run_name>-<name>.journal) next to the pickle file instead of re-pickling the whole DataModel. The pickle file
+        is rewritten (compacted) once the journal grows larger than compact_ratio times the pickle file.
+    headless_saver : e6dataflow.reporter.headless.HeadlessSaver
+        Created on first use by Reporters with headless_save=True. Renders the figures they save in a pool of
+        headless_workers worker processes with at most headless_queue_size figures queued. Saving never blocks the
+        processing thread, figures are dropped when the queue is full. None until first used. run saves the figures
+        which are still queued and shuts the headless_saver down when it returns.
     datatool_dict : dict
         dictionary of DataTool within the DataModel. DataTool objects are added to the DataModel via the
         add_datatool method. Keys are the DataTool names and values are the DataTools themselves. If one DataTool
@@ -88,39 +115,74 @@ class DataModel(Rebuildable):
     run(quiet=False, handler_quiet=False, save_every_shot=False)
         Run the datamodel. run processors, then aggregators, then shot reporters then point reports. Save the results
         to the DataModel pickle file.
+    get_performance_summary()
+        Return a table of the time spent, number of calls and bytes read by each DataTool and by each stage of run. The
+        raw numbers are collected by performance_monitor (see e6dataflow.instrumentation.PerformanceMonitor).
+    backfill(start_shot, stop_shot, num_processes, chunk_size=None, quiet=False, handler_quiet=False)
+        Run the Processors over a range of shots in a pool of worker processes and merge the results deterministically.
     get_num_shot():
         Query each datastream for its number of saved shots. Set self.num_shots to the minimal value.
+    stop_prefetching():
+        Cancel the read-ahead of raw data started by run when prefetch_depth > 0.
+    close_datastreams(close_shot_watchers=True):
+        Close the raw data .h5 files which are held open in the file pool of each DataStream and the ShotWatcher
+        (e.g. its inotify file descriptor) of each DataStream.
     process_data(shot_num, quiet=False)
         run the process method for each Processor within the DataModel on shot_num
     aggregate_data(shot_num, quiet=False):
         run the aggregate method for each Aggregator within the DataModel on shot_num
     report_single_shot(shot_num, quiet=False):
         run the report method for each ShotReporter within the DataModel on shot_num
+    schedule_shot_report(shot_num, quiet=False):
+        report_single_shot, unless run was given a max_report_rate in which case only the latest scheduled shot is
+        reported once the rate allows it and no report is made while a backlog of shots is being processed.
     report_point_data():
         run the report method for each PointReporter within the DataModel
     add_datatool(datatool, overwrite=False, rebuilding=False, quiet=False):
         Add datatool to the DataModel. Specifically it is added to the datatool_dict. The method has logic to handle
         cases when a datatool already exists with the same name as the DataTool being added. If DataTool is overwritten
-        then it and all of its descendents are reset.
+        then it and all of its descendents are reset. Only reset or newly added ShotHandlers are re-run over the shots
+        which have already been handled, all other ShotHandlers and their stored data are left untouched.
+    get_execution_order():
+        Topologically sort the DataTools according to their parent/child links.
     link_datatools():
         Call the link_within_datamodel method for each DataTool. This should only be called after all DataTools are
         added to the DataModel. Typically the link_within_datamodel method simply establishes parent-child relationships
         between DataTools.
-    get_datum(datafield_name, data_index)
+    get_datum(datafield_name, data_index, region=None, dtype=None, out=None)
         wrapper for the get_data method for the DataField corresponding to datafield name. Note that both shot or point
-        data are accessed via this method.
-    get_data(datafield_name, data_index)
+        data are accessed via this method. region, a tuple of slices, restricts the read of ShotDataFields to a
+        sub-region of the data. dtype overrides the dtype policy of the DataField for this read and out is an optional
+        preallocated array into which the data is read. While run is handling a shot, reads of that shot from
+        CACHEABLE DataFields are memoized in shot_data_cache. The full frame is cached on the first read, regions are
+        sliced out of it, and every reader receives its own writeable copy.
+    get_data(datafield_name, data_index, region=None, dtype=None, out=None)
         generalizes get_datum to select one or more shots. can select all shots by setting data_index='all'
     get_data_by_point(datafield_name, point_num)
         datafield_name refers to a ShotDataField. This method extracts the data for all shots within point_num and
-        returns it as a list.
+        returns it as a list. DataFields supporting batch reads (such as ArrayShotDataField) return an array instead.
     set_data(datafield_name, data_index, data)
-        Write data into DataField at datafield_name at index data_index. Set either shot or point data.
+        Write data into DataField at datafield_name at index data_index. Set either shot or point data. Listeners
+        registered with add_data_listener(listener_name, listener) are notified of every write.
     save_datamodel(datamodel_path)
         The DataModel is a Rebuildable object. This method first prepares the rebuild_dict and then saves the
         rebuild_dict into a pickle file at datamodel_path (if no datamodel_path, saves in current working directory).
-    load_datamodel(datamodel_path)
-        Load the pickle file at datamodel_path and use it to rebuild the DataModel which had been saved.
+        With incremental_save a journal record packaged by package_journal_record is appended instead, unless the
+        journal is due for compaction.
+    load_datamodel(datamodel_path, read_only=False)
+        Load the pickle file at datamodel_path, replay the journal records which belong to it and use the result to
+        rebuild the DataModel which had been saved. The data of each DataField is saved as a separate section of the
+        pickle file. With read_only=True only the DataTools are rebuilt up front and each DataField's data is unpickled
+        when it is first accessed. A read_only DataModel can't be run or saved.
+    get_headless_saver()
+        Return headless_saver, creating it if necessary.
+    wait_for_headless_saves()
+        Block until all figures queued by Reporters with headless_save=True have been saved.
+    shutdown_headless_saver()
+        Save the figures which are still queued and stop the worker processes of headless_saver.
+    export(export_path=None, export_format='npy', datafield_names=None)
+        Write the shot and point data into a portable columnar container (a directory of .npy files or an HDF5 file)
+        which can be memory-mapped with e6dataflow.export.ColumnarRun without unpickling the DataModel.
     package_rebuild_dict()
         Inherited method from Rebuildable parent class. Put num_shots, last_handled_shot, datamodel_file_path into the
         object_data_dict. The rebuild_dict for each DataTool is saved into a dictionary called 'datatools' within the
@@ -132,7 +194,9 @@ class DataModel(Rebuildable):
     """
     # TODO: Fix main_datastream documentation
     # TODO: Reset documentation
-    def __init__(self, *, name='datamodel', datamodel_dir=None, run_name, num_points, run_doc_string):
+    def __init__(self, *, name='datamodel', datamodel_dir=None, run_name, num_points, run_doc_string,
+                 shot_cache_max_bytes=256 * 2 ** 20, incremental_save=False, compact_ratio=1.0, read_only=False,
+                 headless_workers=2, headless_queue_size=16):
 
         self.name = name
         self.datamodel_dir = datamodel_dir
@@ -152,15 +216,68 @@ class DataModel(Rebuildable):
         self.data_dict['shot_data'] = dict()
         self.data_dict['point_data'] = dict()
 
+        self.read_only = read_only
+        self.empty_h5 = None
+        self.data_h5 = self.open_data_h5()
+
+        self.reset_list = []
+        self.execution_order = None
+        self.data_lock = threading.RLock()
+        self.processor_executor = None
+        self.shot_prefetcher = None
+        self.shot_data_cache = ShotDataCache(max_bytes=shot_cache_max_bytes)
+        self.performance_monitor = PerformanceMonitor()
+        self.shot_report_limiter = None
+        self.point_report_limiter = None
+        self.pending_report_shot = None
+        self.point_report_pending = False
+        self.data_listener_dict = dict()
+        self.headless_workers = headless_workers
+        self.headless_queue_size = headless_queue_size
+        self.headless_saver = None
+
+        self.incremental_save = incremental_save
+        self.compact_ratio = compact_ratio
+        self.journal = None
+        self.journal_id = None
+        self.saved_file_size = 0
+        self.saved_handled_shots_dict = dict()
+        self.unsaved_data_dict = dict()
+        self.unsaved_reset_list = []
+
+    def open_data_h5(self):
         data_h5_path = Path(self.datamodel_dir, f'{self.run_name}-{self.name}.h5')
-        if not data_h5_path.exists():
-            self.data_h5 = h5py.File(data_h5_path, 'a')
-            self.data_h5.create_group('shot_data')
-            self.data_h5.create_group('point_data')
+        if self.read_only and data_h5_path.exists():
+            data_h5 = h5py.File(data_h5_path, 'r')
+        elif self.read_only:
+            print(f'WARNING! {data_h5_path} not found, the H5 DataFields of the read_only DataModel are empty.')
+            data_h5 = self.get_empty_h5()
+        elif not data_h5_path.exists():
+            data_h5 = h5py.File(data_h5_path, 'a')
+            data_h5.create_group('shot_data')
+            data_h5.create_group('point_data')
         else:
-            self.data_h5 = h5py.File(data_h5_path, 'a')
+            data_h5 = h5py.File(data_h5_path, 'a')
+        return data_h5
 
-        self.reset_list = []
+    def get_empty_h5(self):
+        """ Return an in-memory .h5 file, which is never written to disk, with empty shot_data and point_data groups."""
+        if self.empty_h5 is None:
+            self.empty_h5 = h5py.File(f'{self.run_name}-{self.name}-{id(self)}-empty.h5', 'w', driver='core',
+                                      backing_store=False)
+            self.empty_h5.create_group('shot_data')
+            self.empty_h5.create_group('point_data')
+        return self.empty_h5
+
+    def get_data_h5_group(self, data_type, datafield_name):
+        """ Return the group of data_h5 holding the data of the H5 DataField datafield_name, data_type is 'shot_data'
+        or 'point_data'. The group is created if it doesn't exist. A read_only DataModel can't create groups, an empty
+        in-memory group is returned instead so that the DataField appears empty."""
+        if data_type in self.data_h5 and datafield_name in self.data_h5[data_type]:
+            return self.data_h5[data_type][datafield_name]
+        if self.read_only:
+            return self.get_empty_h5()[data_type].require_group(datafield_name)
+        return self.data_h5.require_group(data_type).create_group(name=datafield_name)
 
     def get_datatool_of_type(self, datatool_type):
         """ Get all DataTools from datatool_dict matching datatool.datattol_type == datatool_type. Possible
@@ -172,7 +289,8 @@ class DataModel(Rebuildable):
                 datatool_list.append(datatool)
         return datatool_list
 
-    def run_continuously(self, quiet=False, handler_quiet=False, save_every_shot=False, override_datamodel_dir=None):
+    def run_continuously(self, quiet=False, handler_quiet=False, save_every_shot=False, override_datamodel_dir=None,
+                         max_workers=1, performance_log_path=None, trace_path=None, max_report_rate=None):
         """ Repeatedly run the DataModel to keep it up to date with new data as it comes in.
 
         Parameters
@@ -183,28 +301,47 @@ class DataModel(Rebuildable):
             passed through to run(). (default is False)
         save_every_shot : bool
             passed through to run(). (default is False)
+        max_workers : int
+            passed through to run(). (default is 1)
+        performance_log_path : str or pathlib.Path
+            passed through to run(). (default is None)
+        trace_path : str or pathlib.Path
+            passed through to run(). (default is None)
+        max_report_rate : float
+            passed through to run(). Reports which are pending when a call to run() finishes are made by a later call
+            once the report rate allows it. (default is None)
         """
         print('Beginning continuous running of datamodel.')
         waiting_message_is_current = False
-        while True:
-            self.get_num_shots()
-            old_last_handled_shot = self.last_handled_shot
-            # Check if there is new data and if the waiting message for the next shot has already been printed
-            if old_last_handled_shot + 1 == self.num_shots and not waiting_message_is_current:
-                shot_key, loop_key, point_key = get_shot_labels(old_last_handled_shot + 1, self.num_points)
-                time_string = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                print(f'{time_string} -- .. Waiting for data: {shot_key} - {loop_key} - {point_key} ..')
-                waiting_message_is_current = True
-            self.run(quiet=quiet, handler_quiet=handler_quiet, save_every_shot=save_every_shot,
-                     override_datamodel_dir=override_datamodel_dir)
-            # If new shots have been handled then the waiting message is primed to be printed again.
-            if self.last_handled_shot > old_last_handled_shot:
-                waiting_message_is_current = False
-            plt.pause(0.01)
+        try:
+            while True:
+                self.get_num_shots()
+                old_last_handled_shot = self.last_handled_shot
+                # Check if there is new data and if the waiting message for the next shot has already been printed
+                if old_last_handled_shot + 1 == self.num_shots and not waiting_message_is_current:
+                    shot_key, loop_key, point_key = get_shot_labels(old_last_handled_shot + 1, self.num_points)
+                    time_string = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    print(f'{time_string} -- .. Waiting for data: {shot_key} - {loop_key} - {point_key} ..')
+                    waiting_message_is_current = True
+                # The ShotWatchers are kept open between calls to run so that shot discovery stays incremental.
+                self.run(quiet=quiet, handler_quiet=handler_quiet, save_every_shot=save_every_shot,
+                         override_datamodel_dir=override_datamodel_dir, max_workers=max_workers,
+                         performance_log_path=performance_log_path, trace_path=trace_path,
+                         max_report_rate=max_report_rate, flush_reports=False, keep_shot_watchers=True,
+                         keep_headless_saver=True)
+                # If new shots have been handled then the waiting message is primed to be printed again.
+                if self.last_handled_shot > old_last_handled_shot:
+                    waiting_message_is_current = False
+                plt.pause(0.01)
+        finally:
+            self.close_datastreams()
+            self.shutdown_headless_saver()
 
     def run(self, quiet=False, handler_quiet=False, save_every_shot=False, override_datamodel_dir=None,
             save_point_data=True,
-            save_before_reporting=False):
+            save_before_reporting=False, prefetch_depth=0, prefetch_max_bytes=512 * 2 ** 20, max_workers=1,
+            num_processes=1, backfill_chunk_size=None, performance_log_path=None, trace_path=None,
+            max_report_rate=None, flush_reports=True, keep_shot_watchers=False, keep_headless_saver=False):
         """ Run the DataModel to process the raw data through Processors, Aggregators, Reporters.
 
         parameters
@@ -220,32 +357,235 @@ class DataModel(Rebuildable):
             The DataModel can save itself to the pickle file after it handles every shot if this parameter is set to
             True. This can be set to False to suppress this behavior and only save after processing all current data.
             (Default is False)
+        prefetch_depth : int
+            If greater than zero the raw data of DataStreamDataFields for the next prefetch_depth shots is read in a
+            background thread pool while the current shot is processed. (Default is 0)
+        prefetch_max_bytes : int
+            Maximum number of bytes of raw data which may be held by the read-ahead. (Default is 512 MiB)
+        max_workers : int
+            If greater than one, Processors which do not depend on one another are run concurrently on a thread pool
+            with max_workers threads. Writes into DataFields are serialized by data_lock. (Default is 1)
+        num_processes : int
+            If greater than one, the Processors are run on the shots which need processing by a pool of num_processes
+            worker processes. See backfill for details. (Default is 1)
+        backfill_chunk_size : int
+            Number of consecutive shots sent to a worker process at a time. Passed through to backfill.
+        performance_log_path : str or pathlib.Path
+            If given, the timings of every shot are appended as JSON lines to this rolling log file. See
+            e6dataflow.instrumentation.PerformanceMonitor. (Default is None)
+        trace_path : str or pathlib.Path
+            If given, a span for every ShotHandler call, DataStream file open and read, save and point report is written
+            to this file in the Chrome trace event format which can be opened with chrome://tracing or Perfetto. The
+            trace stays open across calls to run with the same trace_path and is appended to after every shot.
+            (Default is None)
+        max_report_rate : float
+            If given, reporting is decoupled from processing. Processing and aggregation run ahead and the ShotReporters
+            report at most max_report_rate times per second, always on the latest handled shot. Shots which were
+            superseded before they could be reported are skipped (and are not saved by ShotReporters with save_data).
+            While run works through a backlog, i.e. more recent shots are already waiting to be processed, no shot
+            reports are made at all so that slow reporters do not hold up the processing. The interval between reports
+            is counted from the end of the previous report. The PointReporters are likewise limited to max_report_rate
+            reports per second. If None every shot is reported. (Default is None)
+        flush_reports : bool
+            If True, reports which are still pending because of max_report_rate are made at the end of run regardless
+            of the report rate. (Default is True)
+        keep_shot_watchers : bool
+            If True the ShotWatchers of DataStreams with discovery_mode=DataStream.DISCOVERY_WATCH are left open when
+            run returns, as done by run_continuously. Otherwise they are closed along with the raw data files.
+            (Default is False)
+        keep_headless_saver : bool
+            If True the headless_saver is left running when run returns, as done by run_continuously. Otherwise run
+            waits for the figures queued by Reporters with headless_save=True to be saved and shuts the headless_saver
+            down. (Default is False)
         """
+        if self.read_only:
+            raise ValueError('Cannot run a DataModel which was loaded with read_only=True.')
         self.get_num_shots()
 
         if self.num_shots == 0:
             self.num_shots = self.last_handled_shot+1
-        if self.last_handled_shot + 1 == self.num_shots:
+        first_shot = min(self.get_first_unhandled_shot(), self.last_handled_shot + 1)
+        if first_shot == self.num_shots:
             print('No new data.')
-        for shot_num in range(self.last_handled_shot + 1, self.num_shots):
-            shot_key, loop_key, point_key = get_shot_labels(self.last_handled_shot + 1, self.num_points)
-            time_string = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            qprint(f'{time_string} -- ** Processing {shot_key} - {loop_key} - {point_key} **', quiet=quiet)
-            self.process_data(shot_num, quiet=handler_quiet)
-            self.aggregate_data(shot_num, quiet=handler_quiet)
-            self.report_single_shot(shot_num, quiet=handler_quiet)
-            self.last_handled_shot = shot_num
-            if save_every_shot:
-                self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
-            if self.last_handled_shot+1 == self.num_shots and save_before_reporting:
+        if performance_log_path is not None:
+            self.performance_monitor.open_log(performance_log_path)
+        if trace_path is not None:
+            self.performance_monitor.open_trace(trace_path, num_points=self.num_points)
+        self.set_max_report_rate(max_report_rate)
+        old_last_handled_shot = self.last_handled_shot
+        if prefetch_depth > 0:
+            self.shot_prefetcher = ShotPrefetcher(datamodel=self, prefetch_depth=prefetch_depth,
+                                                  max_bytes=prefetch_max_bytes)
+        if max_workers > 1:
+            self.processor_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                         thread_name_prefix='e6dataflow-processor')
+        try:
+            try:
+                if num_processes > 1 and first_shot < self.num_shots:
+                    self.backfill(first_shot, self.num_shots, num_processes=num_processes,
+                                  chunk_size=backfill_chunk_size, quiet=quiet, handler_quiet=handler_quiet)
+                    first_shot = self.num_shots
+                for shot_num in range(first_shot, self.num_shots):
+                    shot_key, loop_key, point_key = get_shot_labels(shot_num, self.num_points)
+                    time_string = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    if self.shot_prefetcher is not None:
+                        self.shot_prefetcher.release_before(shot_num)
+                        self.shot_prefetcher.schedule(shot_num, self.num_shots)
+                    self.shot_data_cache.set_shot(shot_num)
+                    self.performance_monitor.start_shot()
+                    loop_num, point_num = shot_to_loop_and_point(shot_num, num_points=self.num_points)
+                    if shot_num <= self.last_handled_shot:
+                        # Only the ShotHandlers which were added or reset since this shot was handled are re-run.
+                        qprint(f'{time_string} -- ** Re-processing {shot_key} - {loop_key} - {point_key} **',
+                               quiet=quiet)
+                        with self.performance_monitor.measure(PerformanceMonitor.STAGE_PROCESS, self.name, shot_num):
+                            self.process_data(shot_num, quiet=handler_quiet, only_unhandled=True)
+                        with self.performance_monitor.measure(PerformanceMonitor.STAGE_AGGREGATE, self.name, shot_num):
+                            self.aggregate_data(shot_num, quiet=handler_quiet, only_unhandled=True)
+                        self.performance_monitor.end_shot(shot_num, loop_num, point_num)
+                        continue
+                    qprint(f'{time_string} -- ** Processing {shot_key} - {loop_key} - {point_key} **', quiet=quiet)
+                    with self.performance_monitor.measure(PerformanceMonitor.STAGE_PROCESS, self.name, shot_num):
+                        self.process_data(shot_num, quiet=handler_quiet)
+                    with self.performance_monitor.measure(PerformanceMonitor.STAGE_AGGREGATE, self.name, shot_num):
+                        self.aggregate_data(shot_num, quiet=handler_quiet)
+                    with self.performance_monitor.measure(PerformanceMonitor.STAGE_REPORT, self.name, shot_num):
+                        self.schedule_shot_report(shot_num, quiet=handler_quiet)
+                    self.last_handled_shot = shot_num
+                    if save_every_shot:
+                        self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
+                    if self.last_handled_shot+1 == self.num_shots and save_before_reporting:
+                        self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
+                    self.performance_monitor.end_shot(shot_num, loop_num, point_num)
+            finally:
+                self.stop_prefetching()
+                self.shot_data_cache.clear()
+                if self.processor_executor is not None:
+                    self.processor_executor.shutdown(wait=True, cancel_futures=True)
+                    self.processor_executor = None
+                self.close_datastreams(close_shot_watchers=not keep_shot_watchers)
+            if self.shot_report_limiter is None:
+                self.report_point_data()
+            else:
+                self.report_pending_shot(quiet=handler_quiet, force=flush_reports)
+                if self.last_handled_shot > old_last_handled_shot:
+                    self.point_report_pending = True
+                if self.point_report_pending and (flush_reports or self.point_report_limiter.is_due()):
+                    self.point_report_limiter.mark()
+                    self.point_report_pending = False
+                    self.report_point_data()
+            if save_point_data:
                 self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
-        self.report_point_data()
-        if save_point_data:
-            self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
+            else:
+                point_data_dict = self.data_dict['point_data']
+                self.data_dict['point_data'] = {}
+                if self.journal is not None:
+                    self.journal.needs_compaction = True
+                print('ALERT: Not saving point data.')
+                try:
+                    self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
+                finally:
+                    self.data_dict['point_data'] = point_data_dict
+            self.performance_monitor.flush_trace()
+        finally:
+            if not keep_headless_saver:
+                # Figures which are still queued are saved before run returns.
+                self.shutdown_headless_saver()
+
+    def backfill(self, start_shot, stop_shot, num_processes, chunk_size=None, quiet=False, handler_quiet=False):
+        """ Run the Processors on shots start_shot to stop_shot - 1 in a pool of worker processes.
+
+        The shot range is split into chunks of chunk_size consecutive shots which are processed by backfill_worker in
+        separate processes. Each worker rebuilds the DataStreams, ShotDataFields and required Processors into a
+        BackfillDataModel and returns the data written by the Processors. Results are merged back in shot order, and
+        the Aggregators and ShotReporters are run in this process in shot order. Only parallelizable Processors (see
+        Processor.PARALLELIZABLE) are sent to the workers, and these are expected to be pure per-shot functions.
+        Processors which are not parallelizable, or which depend on a Processor which is not, are run in this process
+        in shot order while the results are merged. The result therefore matches a serial run. Processor classes must
+        be importable by the worker processes, i.e. scripts defining their own Processors must use an
+        if __name__ == '__main__' guard.
+        """
+        shot_list = list(range(start_shot, stop_shot))
+        target_processor_list = []
+        for processor in self.get_scheduled_datatools(DataTool.PROCESSOR):
+            if any(shot_num not in processor.handled_shots for shot_num in shot_list):
+                target_processor_list.append(processor)
+        parallel_processor_list = []
+        serial_processor_list = []
+        for processor in target_processor_list:
+            processor_name_list = [datatool_name for datatool_name in processor.get_ancestors() + [processor.name]
+                                   if self.datatool_dict[datatool_name].datatool_type == DataTool.PROCESSOR]
+            if all(self.datatool_dict[name].is_parallelizable() for name in processor_name_list):
+                parallel_processor_list.append(processor)
+            else:
+                serial_processor_list.append(processor)
+        worker_processor_name_list = []
+        for processor in parallel_processor_list:
+            for ancestor_name in processor.get_ancestors() + [processor.name]:
+                ancestor = self.datatool_dict[ancestor_name]
+                if ancestor.datatool_type == DataTool.PROCESSOR and ancestor_name not in worker_processor_name_list:
+                    worker_processor_name_list.append(ancestor_name)
+        worker_rebuild_dict = dict()
+        for datatool in self.datatool_dict.values():
+            include_datatool = datatool.datatool_type in [DataTool.DATASTREAM, DataTool.SHOT_DATAFIELD]
+            if include_datatool or datatool.name in worker_processor_name_list:
+                datatool.package_rebuild_dict()
+                object_data_dict = dict(datatool.object_data_dict)
+                if 'handled_shots' in object_data_dict:
+                    # Workers process every shot they are sent, there is no need to ship the handled shots.
+                    object_data_dict['handled_shots'] = []
+                worker_rebuild_dict[datatool.name] = {'input_param_dict': datatool.input_param_dict,
+                                                      'object_data_dict': object_data_dict}
+        datamodel_kwargs = {'name': self.name, 'datamodel_dir': self.datamodel_dir, 'run_name': self.run_name,
+                            'num_points': self.num_points, 'run_doc_string': self.run_doc_string}
+        target_processor_name_list = [processor.name for processor in parallel_processor_list]
+
+        if serial_processor_list:
+            serial_processor_names = ', '.join(processor.name for processor in serial_processor_list)
+            qprint(f'Running {serial_processor_names} in shot order in this process while backfilling.', quiet=quiet)
+        if not parallel_processor_list:
+            for shot_num in shot_list:
+                self.merge_backfill_shot(shot_num, dict(), target_processor_list, quiet=quiet,
+                                         handler_quiet=handler_quiet)
+            return
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(shot_list) / (4 * num_processes)))
+        chunk_list = [shot_list[i:i + chunk_size] for i in range(0, len(shot_list), chunk_size)]
+        print(f'Backfilling shots {start_shot:05d} - {stop_shot - 1:05d} with {num_processes} processes.')
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=num_processes, mp_context=mp_context) as executor:
+            result_iterator = executor.map(backfill_worker,
+                                           [datamodel_kwargs] * len(chunk_list),
+                                           [worker_rebuild_dict] * len(chunk_list),
+                                           [target_processor_name_list] * len(chunk_list),
+                                           chunk_list)
+            for chunk_result_dict in result_iterator:
+                for shot_num in sorted(chunk_result_dict):
+                    self.merge_backfill_shot(shot_num, chunk_result_dict[shot_num], target_processor_list,
+                                             quiet=quiet, handler_quiet=handler_quiet)
+
+    def merge_backfill_shot(self, shot_num, shot_result_dict, processor_list, quiet=False, handler_quiet=False):
+        """ Write the data produced by a backfill worker for shot_num, run the Processors in processor_list which were
+        not run by the worker and then run the Aggregators and ShotReporters."""
+        shot_key, loop_key, point_key = get_shot_labels(shot_num, self.num_points)
+        time_string = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        qprint(f'{time_string} -- ** Merging backfill {shot_key} - {loop_key} - {point_key} **', quiet=quiet)
+        self.shot_data_cache.set_shot(shot_num)
+        for processor in processor_list:
+            if shot_num in processor.handled_shots:
+                continue
+            if processor.name not in shot_result_dict:
+                processor.process(shot_num=shot_num, quiet=handler_quiet)
+                continue
+            for datafield_name, data in shot_result_dict[processor.name].items():
+                self.set_data(datafield_name, shot_num, data)
+            processor.mark_handled(shot_num)
+        if shot_num <= self.last_handled_shot:
+            self.aggregate_data(shot_num, quiet=handler_quiet, only_unhandled=True)
         else:
-            self.data_dict['point_data'] = {}
-            print('ALERT: Not saving point data.')
-            self.save_datamodel(override_datamodel_dir=override_datamodel_dir)
+            self.aggregate_data(shot_num, quiet=handler_quiet)
+            self.schedule_shot_report(shot_num, quiet=handler_quiet)
+            self.last_handled_shot = shot_num
 
     def get_num_shots(self):
         """Query each datastream for its number of saved shots. Set self.num_shots to the minimal value."""
@@ -255,25 +595,161 @@ class DataModel(Rebuildable):
             num_shots_list.append(num_shots)
         self.num_shots = min(num_shots_list)
 
-    def process_data(self, shot_num, quiet=False):
-        """ Run each Processor on shot_num. quiet=True suppresses the ShotHandler messages."""
-        for processor in self.get_datatool_of_type(DataTool.PROCESSOR):
-            processor.process(shot_num=shot_num, quiet=quiet)
+    def stop_prefetching(self):
+        """Cancel any pending read-ahead of raw data and release the prefetched data."""
+        if self.shot_prefetcher is not None:
+            self.shot_prefetcher.cancel()
+            self.shot_prefetcher = None
+
+    def close_datastreams(self, close_shot_watchers=True):
+        """Close all raw data files held open by the DataStreams and, if close_shot_watchers, their ShotWatchers."""
+        for datastream in self.get_datatool_of_type(DataTool.DATASTREAM):
+            datastream.close_shot_files()
+            if close_shot_watchers:
+                datastream.close_shot_watcher()
+
+    def get_execution_order(self):
+        """ Topologically sort all DataTools using the parent/child links established in link_datatools. DataTools
+        which do not depend on one another keep the order in which they were added to the DataModel.
+        """
+        if self.execution_order is not None:
+            return self.execution_order
+        num_unsorted_parents = dict()
+        for datatool_name, datatool in self.datatool_dict.items():
+            num_unsorted_parents[datatool_name] = len(set(datatool.parent_list))
+        insertion_index_dict = {datatool_name: index for index, datatool_name in enumerate(self.datatool_dict)}
+        ready_list = [datatool_name for datatool_name, num_parents in num_unsorted_parents.items() if num_parents == 0]
+        execution_order = []
+        while ready_list:
+            datatool_name = ready_list.pop(0)
+            execution_order.append(datatool_name)
+            for child_name in set(self.datatool_dict[datatool_name].child_list):
+                num_unsorted_parents[child_name] -= 1
+                if num_unsorted_parents[child_name] == 0:
+                    ready_list.append(child_name)
+            ready_list.sort(key=insertion_index_dict.get)
+        if len(execution_order) != len(self.datatool_dict):
+            cycle_names = [name for name in self.datatool_dict if name not in execution_order]
+            raise ValueError(f'DataTool links contain a cycle involving: {cycle_names}')
+        self.execution_order = execution_order
+        return execution_order
+
+    def get_scheduled_datatools(self, datatool_type):
+        """ Get all DataTools of datatool_type in topological order."""
+        datatool_list = []
+        for datatool_name in self.get_execution_order():
+            datatool = self.datatool_dict[datatool_name]
+            if datatool.datatool_type == datatool_type:
+                datatool_list.append(datatool)
+        return datatool_list
+
+    def get_first_unhandled_shot(self):
+        """ Return the first shot which has not been handled by every Processor and Aggregator."""
+        first_unhandled_shot = self.last_handled_shot + 1
+        for datatool_type in [DataTool.PROCESSOR, DataTool.AGGREGATOR]:
+            for shot_handler in self.get_datatool_of_type(datatool_type):
+                first_unhandled_shot = min(first_unhandled_shot, shot_handler.get_first_unhandled_shot())
+        return first_unhandled_shot
+
+    def get_processor_dependencies(self, processor):
+        """ Return the names of the Processors which write to DataFields read by processor."""
+        dependency_list = []
+        for parent_name in processor.parent_list:
+            for grandparent_name in self.datatool_dict[parent_name].parent_list:
+                grandparent = self.datatool_dict[grandparent_name]
+                if grandparent.datatool_type == DataTool.PROCESSOR and grandparent_name not in dependency_list:
+                    dependency_list.append(grandparent_name)
+        return dependency_list
+
+    def process_data(self, shot_num, quiet=False, only_unhandled=False):
+        """ Run each Processor on shot_num in topological order. quiet=True suppresses the ShotHandler messages.
+        only_unhandled=True skips, without messages, the Processors which have already handled shot_num. If run has
+        started a processor_executor, Processors are dispatched to it as soon as the Processors they depend on are
+        done."""
+        processor_list = []
+        for processor in self.get_scheduled_datatools(DataTool.PROCESSOR):
+            if only_unhandled and shot_num in processor.handled_shots:
+                continue
+            processor_list.append(processor)
+        if self.processor_executor is None:
+            for processor in processor_list:
+                processor.process(shot_num=shot_num, quiet=quiet)
+            return
+        processor_name_list = [processor.name for processor in processor_list]
+        pending_dependency_dict = dict()
+        for processor in processor_list:
+            dependency_set = set(self.get_processor_dependencies(processor)).intersection(processor_name_list)
+            pending_dependency_dict[processor.name] = dependency_set
+        future_dict = dict()
+        while pending_dependency_dict or future_dict:
+            for processor in processor_list:
+                pending_dependencies = pending_dependency_dict.get(processor.name)
+                if pending_dependencies is not None and not pending_dependencies:
+                    del pending_dependency_dict[processor.name]
+                    future = self.processor_executor.submit(processor.process, shot_num=shot_num, quiet=quiet)
+                    future_dict[future] = processor.name
+            done_futures, _ = wait(list(future_dict.keys()), return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                finished_name = future_dict.pop(future)
+                if future.exception() is not None:
+                    wait(list(future_dict.keys()))
+                    raise future.exception()
+                for pending_dependencies in pending_dependency_dict.values():
+                    pending_dependencies.discard(finished_name)
 
-    def aggregate_data(self, shot_num, quiet=False):
-        """ Run each Aggregator on shot_num. quiet=True suppresses the ShotHandler messages."""
-        for aggregator in self.get_datatool_of_type(DataTool.AGGREGATOR):
+    def aggregate_data(self, shot_num, quiet=False, only_unhandled=False):
+        """ Run each Aggregator on shot_num in topological order. quiet=True suppresses the ShotHandler messages.
+        only_unhandled=True skips, without messages, the Aggregators which have already handled shot_num."""
+        for aggregator in self.get_scheduled_datatools(DataTool.AGGREGATOR):
+            if only_unhandled and shot_num in aggregator.handled_shots:
+                continue
             aggregator.aggregate(shot_num=shot_num, quiet=quiet)
 
     def report_single_shot(self, shot_num, quiet=False):
         """ Run each ShotReporter on shot_num. quiet=True suppresses the ShotHandler messages."""
-        for reporter in self.get_datatool_of_type(DataTool.SINGLE_SHOT_REPORTER):
+        for reporter in self.get_scheduled_datatools(DataTool.SINGLE_SHOT_REPORTER):
             reporter.report(shot_num=shot_num, quiet=quiet)
 
+    def set_max_report_rate(self, max_report_rate):
+        """ Limit the ShotReporters and PointReporters to max_report_rate reports per second. None disables the limit
+        and makes any pending shot report right away."""
+        if max_report_rate is None:
+            self.shot_report_limiter = None
+            self.point_report_limiter = None
+            self.report_pending_shot(force=True)
+        elif self.shot_report_limiter is None or self.shot_report_limiter.max_rate != max_report_rate:
+            self.shot_report_limiter = RateLimiter(max_report_rate)
+            self.point_report_limiter = RateLimiter(max_report_rate)
+
+    def schedule_shot_report(self, shot_num, quiet=False):
+        """ Report shot_num with the ShotReporters. If a max_report_rate is set the report is coalesced, only the
+        latest scheduled shot is reported once the report rate allows it. Reports are deferred while later shots are
+        waiting to be processed, the pending report is made once processing has caught up."""
+        if self.shot_report_limiter is None:
+            self.report_single_shot(shot_num, quiet=quiet)
+            return
+        self.pending_report_shot = shot_num
+        if shot_num < self.num_shots - 1:
+            return
+        self.report_pending_shot(quiet=quiet)
+
+    def report_pending_shot(self, quiet=False, force=False):
+        if self.pending_report_shot is None:
+            return
+        if not force and not self.shot_report_limiter.is_due():
+            return
+        shot_num = self.pending_report_shot
+        self.pending_report_shot = None
+        self.report_single_shot(shot_num, quiet=quiet)
+        if self.shot_report_limiter is not None:
+            self.shot_report_limiter.mark()
+
     def report_point_data(self):
         """ Run each PointReporter on the data"""
-        for point_reporter in self.get_datatool_of_type(DataTool.POINT_REPORTER):
-            point_reporter.report()
+        with self.performance_monitor.measure(PerformanceMonitor.STAGE_POINT_REPORT, self.name):
+            for point_reporter in self.get_datatool_of_type(DataTool.POINT_REPORTER):
+                with self.performance_monitor.measure(point_reporter.datatool_type, point_reporter.name):
+                    point_reporter.report()
 
     def add_datatool(self, datatool, overwrite=False, rebuilding=False, quiet=False):
         """ Add datatool to the datatool_dict
@@ -286,21 +762,17 @@ class DataModel(Rebuildable):
             If True then, in the event that that the DataModel already contains a DataTool with the same name as
             datatool, the new datatool will overwrite the old. and will be added to self.reset_list (Default is False)
         rebuilding : bool
-            If this DataTool is added outside of a rebuild process the last processed set is set to -1 to ensure the
-            new ShotHandler is re-run. If it is added during the rebuild process then the last_handled shot need not be
-            reset. (Default is False)
+            True if the DataTool is being added during the rebuild process. (Default is False)
         quiet : bool
             Suppresses various warnings and messages if True. (Default is False)
         """
         datatool_name = datatool.name
         datatool_type = datatool.datatool_type
         datatool_exists = datatool_name in self.datatool_dict
+        self.execution_order = None
         if not datatool_exists:
             self.datatool_dict[datatool_name] = datatool
             datatool.set_datamodel(datamodel=self)
-            if not rebuilding:
-                if datatool_type == 'shot_datafield':
-                    self.last_handled_shot = -1
         elif datatool_exists:
             qprint(f'WARNING! {datatool_type} "{datatool_name}" already exists in datamodel.', quiet)
             old_datatool = self.datatool_dict[datatool_name]
@@ -314,43 +786,110 @@ class DataModel(Rebuildable):
                     datatool.set_datamodel(datamodel=self)
                     print(f'Re-running the datamodel may result in overwriting datamodel data. ')
                     self.reset_list.append(datatool_name)
-                    self.last_handled_shot = -1
                 elif not overwrite:
                     qprint(f'Using OLD {datatool_type}.', quiet)
 
     def link_datatools(self):
         for datatool in self.datatool_dict.values():
             datatool.link_within_datamodel()
+        self.execution_order = None
+        self.get_execution_order()
         if self.reset_list:
             print('Resetting the following datatools:')
+        reset_root_list = []
         for datatool_name in self.reset_list:
+            datatool = self.datatool_dict[datatool_name]
+            if datatool.datatool_type in [DataTool.SHOT_DATAFIELD, DataTool.POINT_DATAFIELD]:
+                # The data of a reset DataField must be regenerated by the ShotHandlers which produce it.
+                for parent_name in datatool.parent_list:
+                    if isinstance(self.datatool_dict[parent_name], ShotHandler):
+                        reset_root_list.append(parent_name)
+            reset_root_list.append(datatool_name)
+        reset_name_list = []
+        for datatool_name in reset_root_list:
+            for reset_name in [datatool_name] + self.datatool_dict[datatool_name].get_descendents():
+                if reset_name not in reset_name_list:
+                    reset_name_list.append(reset_name)
+        for datatool_name in reset_name_list:
             datatool = self.datatool_dict[datatool_name]
             datatool.reset()
+            if self.incremental_save and datatool.datatool_type in [DataTool.SHOT_DATAFIELD,
+                                                                    DataTool.POINT_DATAFIELD]:
+                for data_key in [key for key in self.unsaved_data_dict if key[0] == datatool_name]:
+                    self.unsaved_data_dict.pop(data_key)
+                self.unsaved_reset_list.append(datatool_name)
+            if datatool.datatool_type in [DataTool.SHOT_DATAFIELD, DataTool.POINT_DATAFIELD]:
+                self.notify_data_listeners(datatool_name, None)
             print(f'{datatool.datatool_type}: {datatool.name}')
-            for child_datatool_name in datatool.get_descendents():
-                child_datatool = self.datatool_dict[child_datatool_name]
-                child_datatool.reset()
-                print(f'{child_datatool.datatool_type}: {child_datatool.name}')
+        self.reset_list = []
 
-    def get_datum(self, datafield_name, data_index):
+    def get_datum(self, datafield_name, data_index, region=None, dtype=None, out=None):
         datafield = self.datatool_dict[datafield_name]
-        data = datafield.get_data(data_index)
+        use_cache = (datafield.CACHEABLE and datafield.datatool_type == DataTool.SHOT_DATAFIELD
+                     and data_index == self.shot_data_cache.shot_num)
+        if use_cache:
+            return self.get_cached_datum(datafield, data_index, region=region, dtype=dtype, out=out)
+        read_kwargs = dict()
+        if region is not None:
+            read_kwargs['region'] = region
+        if dtype is not None:
+            read_kwargs['dtype'] = dtype
+        if out is not None:
+            read_kwargs['out'] = out
+        data = datafield.get_data(data_index, **read_kwargs)
+        self.performance_monitor.add_bytes(getattr(data, 'nbytes', 0))
         return data
 
-    def get_data(self, datafield_name, data_index):
+    def get_cached_datum(self, datafield, shot_num, region=None, dtype=None, out=None):
+        """ Serve a read of the shot currently being run from shot_data_cache. On a miss the full frame is read, even
+        if only a region was requested, so that every later read of this shot, of any region, is a cache hit."""
+        dtype_key = dtype if dtype is not None else getattr(datafield, 'dtype', None)
+        data = self.shot_data_cache.get(datafield.name, shot_num, region=region, dtype=dtype_key, out=out)
+        if data is not None:
+            return data
+        read_kwargs = dict()
+        if dtype is not None:
+            read_kwargs['dtype'] = dtype
+        full_data = None
+        buffer = self.shot_data_cache.get_buffer(datafield.name, dtype=dtype_key)
+        if buffer is not None:
+            try:
+                full_data = datafield.get_data(shot_num, out=buffer, **read_kwargs)
+            except (TypeError, ValueError):
+                # The data of this shot does not fit the buffer left over from the previous shot.
+                full_data = None
+        if full_data is None:
+            full_data = datafield.get_data(shot_num, **read_kwargs)
+        self.performance_monitor.add_bytes(getattr(full_data, 'nbytes', 0))
+        cached = self.shot_data_cache.put(datafield.name, shot_num, full_data, dtype=dtype_key, copy=False)
+        data = full_data if region is None else full_data[region]
+        if out is not None:
+            out[...] = data
+            return out
+        if cached or region is not None:
+            data = data.copy()
+        return data
+
+    def get_data(self, datafield_name, data_index, region=None, dtype=None, out=None):
         if isinstance(data_index, int):
-            return self.get_datum(datafield_name, data_index)
+            return self.get_datum(datafield_name, data_index, region=region, dtype=dtype, out=out)
         if data_index == 'all':
             shot_list = range(self.num_shots)
         else:
             shot_list = data_index
+        datafield = self.datatool_dict[datafield_name]
+        if region is None and dtype is None and datafield.SUPPORTS_BATCH_READS:
+            return datafield.get_batch_data(list(shot_list))
         data_list = []
         for shot_num in shot_list:
-            data = self.get_datum(datafield_name, shot_num)
+            data = self.get_datum(datafield_name, shot_num, region=region, dtype=dtype)
             data_list.append(data)
         return data_list
 
     def get_data_by_point(self, datafield_name, point_num, shots=None):
+        datafield = self.datatool_dict[datafield_name]
+        if not shots and datafield.SUPPORTS_BATCH_READS:
+            return datafield.get_point_data(point_num, self.num_points, self.num_shots)
         if not shots:
             shot_list, num_loops = get_shot_list_from_point(point_num, self.num_points, self.num_shots)
         else:
@@ -361,27 +900,234 @@ class DataModel(Rebuildable):
 
     def set_data(self, datafield_name, data_index, data):
         shot_datafield = self.datatool_dict[datafield_name]
-        shot_datafield.set_data(data_index, data)
+        with self.data_lock:
+            shot_datafield.set_data(data_index, data)
+            if self.incremental_save:
+                if shot_datafield.datatool_type == DataTool.SHOT_DATAFIELD:
+                    data_type = 'shot_data'
+                else:
+                    data_type = 'point_data'
+                # Only data held in data_dict needs to be journaled, H5 DataFields persist their own data.
+                if datafield_name in self.data_dict[data_type]:
+                    self.unsaved_data_dict[(datafield_name, data_index)] = data
+            self.notify_data_listeners(datafield_name, data_index)
+        if shot_datafield.datatool_type == DataTool.SHOT_DATAFIELD:
+            self.shot_data_cache.invalidate(datafield_name, data_index)
+
+    def add_data_listener(self, listener_name, listener):
+        """ Register listener(datafield_name, data_index) to be called after data is written with set_data.
+        data_index is None if all data of the DataField was reset. A listener replaces any previous listener registered
+        under the same listener_name."""
+        self.data_listener_dict[listener_name] = listener
+
+    def notify_data_listeners(self, datafield_name, data_index):
+        for listener in self.data_listener_dict.values():
+            listener(datafield_name, data_index)
 
     def save_datamodel(self, override_datamodel_dir=None):
-        self.package_rebuild_dict()
+        if self.read_only:
+            raise ValueError('Cannot save a DataModel which was loaded with read_only=True.')
+        with self.performance_monitor.measure(PerformanceMonitor.STAGE_SAVE, self.name):
+            self._save_datamodel(override_datamodel_dir=override_datamodel_dir)
+
+    def _save_datamodel(self, override_datamodel_dir=None):
         if override_datamodel_dir is not None:
             save_dir = override_datamodel_dir
         else:
             save_dir = self.datamodel_dir
         save_name = f'{self.run_name}-{self.name}.p'
         datamodel_path = Path(save_dir, save_name)
+        self.data_h5.flush()
+        if self.incremental_save and self.journal is not None and not self.journal.needs_compaction:
+            journal_path = DataModelJournal.get_journal_path(datamodel_path)
+            if journal_path.resolve() == self.journal.journal_path.resolve():
+                print(f'Appending changes to {journal_path}')
+                self.journal.append(self.package_journal_record())
+                if self.journal.get_size() <= self.compact_ratio * self.saved_file_size:
+                    return
         print(f'Saving datamodel to {datamodel_path}')
         datamodel_path.parent.mkdir(parents=True, exist_ok=True)
-        pickle.dump(self.rebuild_dict, open(datamodel_path, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
+        self.package_rebuild_dict()
+        self.journal_id = DataModelJournal.new_journal_id()
+        self.object_data_dict['journal_id'] = self.journal_id
+        # Write to a temporary file first so that an interrupted save never destroys the previous save.
+        temp_path = datamodel_path.with_suffix('.p.tmp')
+        with open(temp_path, 'wb') as temp_file:
+            self.dump_datamodel_file(temp_file)
+        os.replace(temp_path, datamodel_path)
+        self.saved_file_size = datamodel_path.stat().st_size
+        if self.incremental_save:
+            self.journal = DataModelJournal(journal_path=DataModelJournal.get_journal_path(datamodel_path),
+                                            journal_id=self.journal_id)
+            self.journal.clear()
+            self.mark_saved()
+
+    def dump_datamodel_file(self, datamodel_file):
+        """ Write the packaged rebuild_dict into datamodel_file. The data of each DataField in data_dict is written as
+        its own section so that it can be loaded on demand. The header holds the rebuild_dict with data_dict replaced
+        by the offsets of the sections."""
+        section_offset_dict = {'shot_data': dict(), 'point_data': dict()}
+        for data_type, offset_dict in section_offset_dict.items():
+            for datafield_name, datafield_data in self.data_dict[data_type].items():
+                offset_dict[datafield_name] = dump_section(datamodel_file, datafield_data)
+        object_data_dict = dict(self.object_data_dict)
+        object_data_dict['data_dict'] = None
+        object_data_dict['data_sections'] = section_offset_dict
+        dump_header(datamodel_file, {'input_param_dict': self.input_param_dict, 'object_data_dict': object_data_dict})
+
+    def mark_saved(self):
+        """ Forget the changes which have been tracked for the journal. Called once all data is persisted."""
+        self.unsaved_data_dict = dict()
+        self.unsaved_reset_list = []
+        self.saved_handled_shots_dict = dict()
+        for datatool in self.datatool_dict.values():
+            if isinstance(datatool, ShotHandler):
+                self.saved_handled_shots_dict[datatool.name] = set(datatool.handled_shots)
+
+    def package_journal_record(self):
+        """ Package the changes since the previous save into a journal record. The record contains the data written
+        into data_dict since the previous save, the DataFields which were reset, the shots newly handled by each
+        ShotHandler, and the rebuild_dicts of all DataTools stripped of their handled_shots."""
+        with self.data_lock:
+            record = dict()
+            record['num_shots'] = self.num_shots
+            record['last_handled_shot'] = self.last_handled_shot
+            record['reset_datafields'] = self.unsaved_reset_list
+            record['data'] = [(datafield_name, data_index, data)
+                              for (datafield_name, data_index), data in self.unsaved_data_dict.items()]
+            record['handled_shots'] = dict()
+            record['datatools'] = dict()
+            for datatool in self.datatool_dict.values():
+                datatool.package_rebuild_dict()
+                object_data_dict = dict(datatool.object_data_dict)
+                if isinstance(datatool, ShotHandler):
+                    object_data_dict.pop('handled_shots', None)
+                    saved_handled_shots = self.saved_handled_shots_dict.get(datatool.name)
+                    if saved_handled_shots is not None and saved_handled_shots.issubset(datatool.handled_shots):
+                        new_handled_shots = datatool.handled_shots - saved_handled_shots
+                        record['handled_shots'][datatool.name] = ('update', new_handled_shots)
+                        saved_handled_shots.update(new_handled_shots)
+                    else:
+                        record['handled_shots'][datatool.name] = ('replace', set(datatool.handled_shots))
+                        self.saved_handled_shots_dict[datatool.name] = set(datatool.handled_shots)
+                record['datatools'][datatool.name] = {'input_param_dict': datatool.input_param_dict,
+                                                      'object_data_dict': object_data_dict}
+            self.unsaved_data_dict = dict()
+            self.unsaved_reset_list = []
+        return record
+
+    @staticmethod
+    def apply_journal_record(rebuild_dict, record, journal_data_dict):
+        """ Merge a journal record into the rebuild_dict of a saved DataModel. Data entries are collected into
+        journal_data_dict and are written into the DataFields once the DataModel has been rebuilt."""
+        object_data_dict = rebuild_dict['object_data_dict']
+        object_data_dict['num_shots'] = record['num_shots']
+        object_data_dict['last_handled_shot'] = record['last_handled_shot']
+        data_dict = object_data_dict['data_dict']
+        for datafield_name in record['reset_datafields']:
+            data_dict['shot_data'].pop(datafield_name, None)
+            data_dict['point_data'].pop(datafield_name, None)
+            for data_key in [key for key in journal_data_dict if key[0] == datafield_name]:
+                journal_data_dict.pop(data_key)
+        for datafield_name, data_index, data in record['data']:
+            journal_data_dict[(datafield_name, data_index)] = data
+        for datatool_name, datatool_rebuild_dict in record['datatools'].items():
+            old_rebuild_dict = object_data_dict['datatools'].get(datatool_name)
+            datatool_rebuild_dict = {'input_param_dict': datatool_rebuild_dict['input_param_dict'],
+                                     'object_data_dict': dict(datatool_rebuild_dict['object_data_dict'])}
+            if datatool_name in record['handled_shots']:
+                mode, handled_shots = record['handled_shots'][datatool_name]
+                if mode == 'update' and old_rebuild_dict is not None:
+                    handled_shots = set(old_rebuild_dict['object_data_dict']['handled_shots']) | handled_shots
+                datatool_rebuild_dict['object_data_dict']['handled_shots'] = set(handled_shots)
+            object_data_dict['datatools'][datatool_name] = datatool_rebuild_dict
 
     @staticmethod
-    def load_datamodel(datamodel_path):
+    def load_datamodel(datamodel_path, read_only=False):
+        """ Rebuild the DataModel saved at datamodel_path. If read_only is True the DataModel can neither be run nor
+        saved, and the data of each DataField in data_dict is only read from datamodel_path when it is first accessed.
+        The data_h5 file is then opened read-only from the directory of datamodel_path, H5 DataFields whose data is
+        missing from it (or all of them if the file is missing) are empty."""
         print(f'Loading datamodel from {datamodel_path}')
-        rebuild_dict = pickle.load(open(datamodel_path, 'rb'))
+        with open(datamodel_path, 'rb') as datamodel_file:
+            rebuild_dict = load_header(datamodel_file)
+            if rebuild_dict is None:
+                # DataModels saved before the data was split into sections are a single pickled rebuild_dict.
+                datamodel_file.seek(0)
+                rebuild_dict = pickle.load(datamodel_file)
+            else:
+                object_data_dict = rebuild_dict['object_data_dict']
+                data_dict = dict()
+                for data_type, offset_dict in object_data_dict.pop('data_sections').items():
+                    if read_only:
+                        data_dict[data_type] = LazySectionDict(file_path=datamodel_path,
+                                                               section_offset_dict=offset_dict)
+                    else:
+                        data_dict[data_type] = dict()
+                        for datafield_name, offset in offset_dict.items():
+                            datamodel_file.seek(offset)
+                            data_dict[data_type][datafield_name] = pickle.load(datamodel_file)
+                object_data_dict['data_dict'] = data_dict
+        if read_only:
+            input_param_dict = dict(rebuild_dict['input_param_dict'])
+            # The data_h5 file is looked for next to datamodel_path rather than in the original datamodel_dir, so that
+            # a run can be loaded after it has been copied or moved.
+            input_param_dict['kwargs'] = dict(input_param_dict['kwargs'], read_only=True,
+                                              datamodel_dir=Path(datamodel_path).resolve().parent)
+            rebuild_dict = {'input_param_dict': input_param_dict,
+                            'object_data_dict': rebuild_dict['object_data_dict']}
+        journal_id = rebuild_dict['object_data_dict'].get('journal_id')
+        journal = DataModelJournal(journal_path=DataModelJournal.get_journal_path(datamodel_path),
+                                   journal_id=journal_id)
+        journal_data_dict = dict()
+        record_list = journal.read_records()
+        if record_list:
+            print(f'Replaying {len(record_list)} journal records from {journal.journal_path}')
+        for record in record_list:
+            DataModel.apply_journal_record(rebuild_dict, record, journal_data_dict)
         datamodel = Rebuildable.rebuild(rebuild_dict)
+        for (datafield_name, data_index), data in journal_data_dict.items():
+            datafield = datamodel.datatool_dict[datafield_name]
+            if datafield.datatool_type == DataTool.SHOT_DATAFIELD:
+                datafield_data_dict = datamodel.data_dict['shot_data']
+            else:
+                datafield_data_dict = datamodel.data_dict['point_data']
+            if isinstance(datafield_data_dict, LazySectionDict):
+                datafield_data_dict.defer(datafield_name, functools.partial(datafield.set_data, data_index, data))
+            else:
+                datafield.set_data(data_index, data)
+        datamodel.saved_file_size = Path(datamodel_path).stat().st_size
+        if datamodel.incremental_save and journal_id is not None and not read_only:
+            datamodel.journal = journal
+            datamodel.mark_saved()
         return datamodel
 
+    def get_headless_saver(self):
+        if self.headless_saver is None:
+            self.headless_saver = HeadlessSaver(max_workers=self.headless_workers,
+                                                max_queue_size=self.headless_queue_size)
+        return self.headless_saver
+
+    def wait_for_headless_saves(self):
+        if self.headless_saver is not None:
+            self.headless_saver.wait()
+
+    def shutdown_headless_saver(self):
+        if self.headless_saver is not None:
+            self.headless_saver.shutdown(wait=True)
+            self.headless_saver = None
+
+    def get_performance_summary(self):
+        """ Return a table of the wall time, call count and bytes read per DataTool and per stage."""
+        return self.performance_monitor.get_summary_table()
+
+    def export(self, export_path=None, export_format=EXPORT_FORMAT_NPY, datafield_names=None):
+        """ Export the processed shot and point data, see e6dataflow.export.export_datamodel."""
+        if not self.read_only:
+            self.data_h5.flush()
+        return export_datamodel(self, export_path=export_path, export_format=export_format,
+                                datafield_names=datafield_names)
+
     def package_rebuild_dict(self):
         super(DataModel, self).package_rebuild_dict()
         self.object_data_dict['num_shots'] = self.num_shots
@@ -398,6 +1144,7 @@ class DataModel(Rebuildable):
         super(DataModel, self).rebuild_object_data(object_data_dict)
         self.num_shots = object_data_dict['num_shots']
         self.last_handled_shot = object_data_dict['last_handled_shot']
+        self.journal_id = object_data_dict.get('journal_id')
 
         self.data_dict = object_data_dict['data_dict']
 
@@ -406,3 +1153,51 @@ class DataModel(Rebuildable):
             self.add_datatool(datatool, overwrite=False, rebuilding=True, quiet=True)
 
         self.link_datatools()
+
+
+class BackfillDataModel(DataModel):
+    """ DataModel used within backfill worker processes. Its data_h5 is an in-memory file so that workers never touch
+    the .h5 file of the DataModel being backfilled."""
+    def open_data_h5(self):
+        data_h5 = h5py.File(f'{self.run_name}-{self.name}-backfill-{os.getpid()}.h5', 'w',
+                            driver='core', backing_store=False)
+        data_h5.create_group('shot_data')
+        data_h5.create_group('point_data')
+        return data_h5
+
+
+def backfill_worker(datamodel_kwargs, datatool_rebuild_dict, processor_name_list, shot_list):
+    """ Run in a worker process by DataModel.backfill. Returns a dict keyed by shot number whose values are dicts
+    mapping each Processor in processor_name_list to a dict of the data it wrote into its child ShotDataFields."""
+    worker_datamodel = BackfillDataModel(**datamodel_kwargs)
+    for rebuild_dict in datatool_rebuild_dict.values():
+        datatool = Rebuildable.rebuild(rebuild_dict)
+        worker_datamodel.add_datatool(datatool, rebuilding=True, quiet=True)
+    worker_datamodel.link_datatools()
+    result_dict = dict()
+    try:
+        for shot_num in shot_list:
+            worker_datamodel.shot_data_cache.set_shot(shot_num)
+            worker_datamodel.process_data(shot_num, quiet=True)
+            shot_result_dict = dict()
+            for processor_name in processor_name_list:
+                processor = worker_datamodel.datatool_dict[processor_name]
+                processor_result_dict = dict()
+                for datafield_name in processor.child_list:
+                    datafield = worker_datamodel.datatool_dict[datafield_name]
+                    if datafield.datatool_type != DataTool.SHOT_DATAFIELD:
+                        continue
+                    read_kwargs = dict()
+                    if hasattr(datafield, 'dtype'):
+                        read_kwargs['dtype'] = DataField.DTYPE_NATIVE
+                    try:
+                        processor_result_dict[datafield_name] = datafield.get_data(shot_num, **read_kwargs)
+                    except KeyError:
+                        continue
+                shot_result_dict[processor_name] = processor_result_dict
+            result_dict[shot_num] = shot_result_dict
+    finally:
+        worker_datamodel.shot_data_cache.clear()
+        worker_datamodel.close_datastreams()
+        worker_datamodel.data_h5.close()
+    return result_dict
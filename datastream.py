@@ -1,24 +1,143 @@
 from pathlib import Path
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 import h5py
 from .datatool import DataTool
+from .shotwatcher import get_shot_watcher
 
 
 class DataStream(DataTool):
-    def __init__(self, *, name, daily_path, run_name, file_prefix):
+    """ Pointer to a directory of raw data .h5 files, one file per shot.
+
+    Open shot files are kept in a bounded pool so that several DataStreamDataFields reading from the same shot share a
+    single h5py.File handle. When more than max_open_files files are open the least recently used file is closed. The
+    pool is emptied deterministically with close_shot_files(). num_cache_hits and num_cache_misses count how often
+    load_shot was served from the pool versus how often a file had to be opened. load_shot is a context manager, the
+    file it yields is pinned, i.e. it is not evicted (closed) from the pool while the with block runs even if other
+    readers (for example the ShotPrefetcher or a Processor thread pool) load other shots in the meantime. lock is only
+    held while the file is looked up in the pool, not while it is read.
+
+    With discovery_mode=DataStream.DISCOVERY_GLOB count_shots counts all .h5 files in the data directory. With
+    discovery_mode=DataStream.DISCOVERY_WATCH new shots are discovered incrementally by a ShotWatcher (inotify on Linux
+    with a polling fallback) and only shot files which are no longer being written (see settle_time) are counted.
+    """
+    DISCOVERY_GLOB = 'glob'
+    DISCOVERY_WATCH = 'watch'
+
+    def __init__(self, *, name, daily_path, run_name, file_prefix, max_open_files=8, discovery_mode=DISCOVERY_GLOB,
+                 settle_time=1.0):
         super(DataStream, self).__init__(name=name, datatool_type=DataTool.DATASTREAM)
         self.daily_path = daily_path
         self.run_name = run_name
         self.file_prefix = file_prefix
         self.data_path = Path(self.daily_path, 'data', run_name, self.name)
+        self.max_open_files = max_open_files
+        self.open_file_dict = OrderedDict()
+        self.pin_count_dict = dict()
+        self.lock = threading.RLock()
+        self.num_cache_hits = 0
+        self.num_cache_misses = 0
+        self.discovery_mode = discovery_mode
+        self.settle_time = settle_time
+        self.shot_watcher = None
 
-    def load_shot(self, shot_num):
+    def get_shot_file_path(self, shot_num):
         file_name = f'{self.file_prefix}_{shot_num:05d}.h5'
         file_path = Path(self.data_path, file_name)
-        h5_file = h5py.File(file_path, 'r')
+        return file_path
+
+    def _load_shot(self, shot_num):
+        if shot_num in self.open_file_dict:
+            self.num_cache_hits += 1
+            self.open_file_dict.move_to_end(shot_num)
+            return self.open_file_dict[shot_num]
+        self.num_cache_misses += 1
+        file_path = self.get_shot_file_path(shot_num)
+        if self.datamodel is not None:
+            performance_monitor = self.datamodel.performance_monitor
+            context = performance_monitor.measure(performance_monitor.STAGE_DATASTREAM_OPEN, self.name, shot_num)
+        else:
+            context = nullcontext()
+        with context:
+            h5_file = h5py.File(file_path, 'r')
+        self.open_file_dict[shot_num] = h5_file
+        self._evict_files(keep_shot_num=shot_num)
         return h5_file
 
+    def _evict_files(self, keep_shot_num=None):
+        """ Close the least recently used files which are not pinned (or keep_shot_num) until at most max_open_files
+        are open."""
+        num_excess_files = len(self.open_file_dict) - max(self.max_open_files, 1)
+        for old_shot_num in list(self.open_file_dict):
+            if num_excess_files <= 0:
+                break
+            if old_shot_num in self.pin_count_dict or old_shot_num == keep_shot_num:
+                continue
+            self.open_file_dict.pop(old_shot_num).close()
+            num_excess_files -= 1
+
+    @contextmanager
+    def load_shot(self, shot_num):
+        """ Context manager yielding the open file for shot_num. The file stays open for the duration of the with block
+        even if it falls out of the pool in the meantime. The file must not be used after the with block."""
+        with self.lock:
+            self.pin_count_dict[shot_num] = self.pin_count_dict.get(shot_num, 0) + 1
+            try:
+                h5_file = self._load_shot(shot_num)
+            except BaseException:
+                self._unpin_shot(shot_num)
+                raise
+        try:
+            yield h5_file
+        finally:
+            with self.lock:
+                self._unpin_shot(shot_num)
+                self._evict_files()
+
+    def _unpin_shot(self, shot_num):
+        self.pin_count_dict[shot_num] -= 1
+        if self.pin_count_dict[shot_num] == 0:
+            del self.pin_count_dict[shot_num]
+
+    def close_shot_files(self):
+        with self.lock:
+            while self.open_file_dict:
+                shot_num, h5_file = self.open_file_dict.popitem(last=False)
+                h5_file.close()
+
+    def reset_cache_stats(self):
+        self.num_cache_hits = 0
+        self.num_cache_misses = 0
+
+    def get_cache_stats(self):
+        return {'hits': self.num_cache_hits, 'misses': self.num_cache_misses,
+                'open_files': len(self.open_file_dict)}
+
+    def get_shot_watcher(self):
+        if self.shot_watcher is None:
+            self.shot_watcher = get_shot_watcher(data_path=self.data_path, file_prefix=self.file_prefix,
+                                                 settle_time=self.settle_time)
+        return self.shot_watcher
+
+    def get_new_shots(self):
+        """Return the list of shot numbers which have been discovered since the last call."""
+        return self.get_shot_watcher().poll()
+
     def count_shots(self):
-        # print('Looking for data in', self.data_path)
-        file_list = list(self.data_path.glob('*.h5'))
-        num_shots = len(file_list)
-        return num_shots
+        if self.discovery_mode == DataStream.DISCOVERY_WATCH:
+            shot_watcher = self.get_shot_watcher()
+            shot_watcher.poll()
+            return shot_watcher.num_shots
+        elif self.discovery_mode == DataStream.DISCOVERY_GLOB:
+            # print('Looking for data in', self.data_path)
+            file_list = list(self.data_path.glob('*.h5'))
+            num_shots = len(file_list)
+            return num_shots
+        else:
+            raise ValueError(f'Unknown discovery_mode "{self.discovery_mode}" for datastream "{self.name}".')
+
+    def close_shot_watcher(self):
+        if self.shot_watcher is not None:
+            self.shot_watcher.close()
+            self.shot_watcher = None
@@ -77,21 +77,49 @@ class DataTool(Rebuildable):
             descendent_list += descendent.get_descendents()
         return descendent_list
 
+    def get_ancestors(self):
+        ancestor_list = []
+        for ancestor_name in self.parent_list:
+            ancestor_list.append(ancestor_name)
+            ancestor = self.datamodel.datatool_dict[ancestor_name]
+            ancestor_list += ancestor.get_ancestors()
+        return ancestor_list
+
 
 class ShotHandler(DataTool):
     def __init__(self, *, name, datatool_type):
         super(ShotHandler, self).__init__(name=name, datatool_type=datatool_type)
-        self.handled_shots = []
+        self.handled_shots = set()
+        # Low-water mark: every shot before first_unhandled_shot has been handled.
+        self.first_unhandled_shot = 0
 
     def reset(self):
         super(ShotHandler, self).reset()
-        self.handled_shots = []
+        self.set_handled_shots(set())
+
+    def set_handled_shots(self, handled_shots):
+        self.handled_shots = set(handled_shots)
+        self.first_unhandled_shot = 0
+        self.advance_first_unhandled_shot()
+
+    def mark_handled(self, shot_num):
+        self.handled_shots.add(shot_num)
+        if shot_num == self.first_unhandled_shot:
+            self.advance_first_unhandled_shot()
+
+    def advance_first_unhandled_shot(self):
+        while self.first_unhandled_shot in self.handled_shots:
+            self.first_unhandled_shot += 1
+
+    def get_first_unhandled_shot(self):
+        return self.first_unhandled_shot
 
     def handle(self, shot_num, quiet=False):
         if shot_num not in self.handled_shots:
             qprint(f'handling shot {shot_num:05d} with "{self.name}" {self.datatool_type}', quiet)
-            self._handle(shot_num)
-            self.handled_shots.append(shot_num)
+            with self.datamodel.performance_monitor.measure(self.datatool_type, self.name, shot_num):
+                self._handle(shot_num)
+            self.mark_handled(shot_num)
         else:
             qprint(f'skipping shot {shot_num:05d} with "{self.name}" {self.datatool_type}', quiet)
 
@@ -104,4 +132,4 @@ class ShotHandler(DataTool):
 
     def rebuild_object_data(self, object_data_dict):
         super(ShotHandler, self).rebuild_object_data(object_data_dict)
-        self.handled_shots = object_data_dict['handled_shots']
+        self.set_handled_shots(object_data_dict['handled_shots'])
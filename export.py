@@ -0,0 +1,230 @@
+from pathlib import Path
+import datetime
+import json
+import numpy as np
+import h5py
+from .datatool import DataTool
+from .datafield import DataField, DataStreamDataField
+from .utils import shot_to_loop_and_point
+
+EXPORT_FORMAT_NPY = 'npy'
+EXPORT_FORMAT_H5 = 'h5'
+EXPORT_VERSION = 1
+
+
+def get_export_datafields(datamodel, datafield_names=None):
+    """ Return the shot and point DataFields to export. By default every DataField except the raw data
+    DataStreamDataFields is exported."""
+    shot_datafield_list = []
+    point_datafield_list = []
+    for datafield in datamodel.datatool_dict.values():
+        if datafield_names is not None and datafield.name not in datafield_names:
+            continue
+        if datafield.datatool_type == DataTool.SHOT_DATAFIELD and not isinstance(datafield, DataStreamDataField):
+            shot_datafield_list.append(datafield)
+        elif datafield.datatool_type == DataTool.POINT_DATAFIELD:
+            point_datafield_list.append(datafield)
+    return shot_datafield_list, point_datafield_list
+
+
+def read_export_datum(datafield, data_index):
+    """ Read one entry of datafield in its stored dtype. Returns None if the entry is missing or is not numeric."""
+    read_kwargs = dict()
+    if hasattr(datafield, 'dtype'):
+        read_kwargs['dtype'] = DataField.DTYPE_NATIVE
+    try:
+        data = np.asarray(datafield.get_data(data_index, **read_kwargs))
+    except KeyError:
+        return None
+    if data.dtype.kind not in 'biufc':
+        return None
+    return data
+
+
+class ColumnWriter:
+    """ Writes the entries of one DataField into a single contiguous array of shape (num_rows, *data_shape) together
+    with a boolean valid column. The array is created with the shape and dtype of the first entry. Rows without data
+    hold NaN for float and complex dtypes and 0 otherwise. Entries with a shape differing from the first entry are
+    rejected by write_row, in which case the column should be discarded."""
+    def __init__(self, *, column_name, num_rows, create_array):
+        self.column_name = column_name
+        self.num_rows = num_rows
+        self.create_array = create_array
+        self.column = None
+        self.valid = np.zeros(num_rows, dtype=bool)
+
+    def write_row(self, row_num, data):
+        if self.column is None:
+            self.column = self.create_array(self.column_name, (self.num_rows,) + data.shape, data.dtype)
+            fill_value = np.nan if data.dtype.kind in 'fc' else 0
+            self.column[...] = fill_value
+        if data.shape != self.column.shape[1:]:
+            return False
+        self.column[row_num] = data
+        self.valid[row_num] = True
+        return True
+
+
+def export_datamodel(datamodel, export_path=None, export_format=EXPORT_FORMAT_NPY, datafield_names=None):
+    """ Export the shot and point data of datamodel into a columnar container which can be read without e6dataflow.
+
+    Every exported DataField becomes one contiguous array indexed by shot (or point) number along the first axis with
+    a matching boolean <name>_valid array. The shot_num, loop_num and point_num index columns and the run metadata
+    (metadata.json or the 'metadata' attribute) describe the rows. Non-numeric DataFields and DataFields whose entries
+    differ in shape are skipped. With export_format='npy' export_path is a directory of .npy files, with
+    export_format='h5' it is a single HDF5 file of contiguous, uncompressed datasets. Both can be memory-mapped by
+    ColumnarRun. Returns export_path.
+    """
+    if export_path is None:
+        suffix = '.h5' if export_format == EXPORT_FORMAT_H5 else ''
+        export_path = Path(datamodel.datamodel_dir, f'{datamodel.run_name}-{datamodel.name}-export{suffix}')
+    export_path = Path(export_path)
+    num_shots = datamodel.last_handled_shot + 1
+    num_points = datamodel.num_points
+
+    if export_format == EXPORT_FORMAT_NPY:
+        export_path.mkdir(parents=True, exist_ok=True)
+        Path(export_path, 'shot_data').mkdir(exist_ok=True)
+        Path(export_path, 'point_data').mkdir(exist_ok=True)
+        export_h5 = None
+
+        def save_array(array_name, array):
+            np.save(Path(export_path, f'{array_name}.npy'), array)
+
+        def create_array(array_name, shape, dtype):
+            return np.lib.format.open_memmap(Path(export_path, f'{array_name}.npy'), mode='w+', dtype=dtype,
+                                             shape=shape)
+
+        def discard_array(array_name):
+            Path(export_path, f'{array_name}.npy').unlink(missing_ok=True)
+    elif export_format == EXPORT_FORMAT_H5:
+        export_path.parent.mkdir(parents=True, exist_ok=True)
+        export_h5 = h5py.File(export_path, 'w')
+
+        def save_array(array_name, array):
+            export_h5.create_dataset(array_name, data=array)
+
+        def create_array(array_name, shape, dtype):
+            return export_h5.create_dataset(array_name, shape=shape, dtype=dtype)
+
+        def discard_array(array_name):
+            if array_name in export_h5:
+                del export_h5[array_name]
+    else:
+        raise ValueError(f'Unknown export_format "{export_format}".')
+
+    shot_num_array = np.arange(num_shots)
+    loop_num_array, point_num_array = shot_to_loop_and_point(shot_num_array, num_points=num_points)
+    save_array('shot_num', shot_num_array)
+    save_array('loop_num', loop_num_array)
+    save_array('point_num', point_num_array)
+
+    metadata = {'export_version': EXPORT_VERSION,
+                'export_time': datetime.datetime.now().isoformat(),
+                'run_name': datamodel.run_name,
+                'datamodel_name': datamodel.name,
+                'run_doc_string': datamodel.run_doc_string,
+                'num_points': num_points,
+                'num_shots': num_shots,
+                'shot_data': dict(),
+                'point_data': dict()}
+    shot_datafield_list, point_datafield_list = get_export_datafields(datamodel, datafield_names)
+    try:
+        for data_type, datafield_list, num_rows in [('shot_data', shot_datafield_list, num_shots),
+                                                    ('point_data', point_datafield_list, num_points)]:
+            for datafield in datafield_list:
+                column_name = f'{data_type}/{datafield.name}'
+                column_writer = ColumnWriter(column_name=column_name, num_rows=num_rows, create_array=create_array)
+                column_ok = True
+                for row_num in range(num_rows):
+                    data = read_export_datum(datafield, row_num)
+                    if data is not None and not column_writer.write_row(row_num, data):
+                        column_ok = False
+                        break
+                if column_writer.column is None or not column_ok:
+                    print(f'Skipping export of {data_type} "{datafield.name}", its data is missing, not numeric or '
+                          f'not of a fixed shape.')
+                    if column_writer.column is not None:
+                        del column_writer.column
+                        discard_array(column_name)
+                    continue
+                if isinstance(column_writer.column, np.memmap):
+                    column_writer.column.flush()
+                save_array(f'{column_name}_valid', column_writer.valid)
+                metadata[data_type][datafield.name] = {'dtype': column_writer.column.dtype.str,
+                                                       'shape': list(column_writer.column.shape[1:]),
+                                                       'num_valid': int(column_writer.valid.sum())}
+        if export_h5 is not None:
+            export_h5.attrs['metadata'] = json.dumps(metadata)
+        else:
+            with open(Path(export_path, 'metadata.json'), 'w') as metadata_file:
+                json.dump(metadata, metadata_file, indent=2)
+    finally:
+        if export_h5 is not None:
+            export_h5.close()
+    print(f'Exported {len(metadata["shot_data"])} shot and {len(metadata["point_data"])} point DataFields to '
+          f'{export_path}')
+    return export_path
+
+
+class ColumnarRun:
+    """ Reader for data exported by export_datamodel.
+
+    Arrays are memory-mapped read-only so that opening an export is cheap and only the rows which are accessed are
+    read from disk. HDF5 datasets which are chunked or compressed (for example if the file was modified by other tools)
+    cannot be mapped and are read into memory instead.
+
+    Attributes
+    __________
+    metadata : dict
+        Run metadata and the dtype, shape and number of valid rows of each exported DataField.
+    shot_num, loop_num, point_num : numpy.ndarray
+        Index columns for the rows of the shot data.
+    shot_data, point_data : dict
+        Arrays of the exported DataFields keyed by DataField name.
+    shot_valid, point_valid : dict
+        Boolean arrays marking which rows of the corresponding DataField hold data.
+    """
+    def __init__(self, export_path):
+        self.export_path = Path(export_path)
+        self.shot_data = dict()
+        self.shot_valid = dict()
+        self.point_data = dict()
+        self.point_valid = dict()
+        if self.export_path.is_dir():
+            with open(Path(self.export_path, 'metadata.json'), 'r') as metadata_file:
+                self.metadata = json.load(metadata_file)
+            load_array = self.load_npy_array
+        else:
+            with h5py.File(self.export_path, 'r') as export_h5:
+                self.metadata = json.loads(export_h5.attrs['metadata'])
+            load_array = self.load_h5_array
+        self.shot_num = load_array('shot_num')
+        self.loop_num = load_array('loop_num')
+        self.point_num = load_array('point_num')
+        for datafield_name in self.metadata['shot_data']:
+            self.shot_data[datafield_name] = load_array(f'shot_data/{datafield_name}')
+            self.shot_valid[datafield_name] = load_array(f'shot_data/{datafield_name}_valid')
+        for datafield_name in self.metadata['point_data']:
+            self.point_data[datafield_name] = load_array(f'point_data/{datafield_name}')
+            self.point_valid[datafield_name] = load_array(f'point_data/{datafield_name}_valid')
+
+    def load_npy_array(self, array_name):
+        return np.load(Path(self.export_path, f'{array_name}.npy'), mmap_mode='r')
+
+    def load_h5_array(self, array_name):
+        with h5py.File(self.export_path, 'r') as export_h5:
+            dataset = export_h5[array_name]
+            offset = dataset.id.get_offset()
+            if offset is None or dataset.chunks is not None or dataset.compression is not None:
+                return dataset[()]
+            shape = dataset.shape
+            dtype = dataset.dtype
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.export_path, mode='r', dtype=dtype, offset=offset, shape=shape)
+
+    def get_point_rows(self, datafield_name, point_num):
+        """ Return the rows of shot DataField datafield_name which belong to point_num and hold data."""
+        mask = (self.point_num == point_num) & self.shot_valid[datafield_name]
+        return self.shot_data[datafield_name][mask]
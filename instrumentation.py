@@ -0,0 +1,248 @@
+from pathlib import Path
+import os
+import time
+import json
+import datetime
+import threading
+from .utils import shot_to_loop_and_point
+
+
+class PerformanceStat:
+    __slots__ = ('num_calls', 'total_time', 'max_time', 'num_bytes')
+
+    def __init__(self):
+        self.num_calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.num_bytes = 0
+
+    def add(self, elapsed_time, num_bytes=0):
+        self.num_calls += 1
+        self.total_time += elapsed_time
+        if elapsed_time > self.max_time:
+            self.max_time = elapsed_time
+        self.num_bytes += num_bytes
+
+
+class PerformanceMonitor:
+    """ Wall time, call count and bytes read per DataTool and per pipeline stage.
+
+    Timings are keyed by (stage, name). ShotHandlers are recorded under their datatool_type (processor, aggregator,
+    single_shot_reporter) while the DataModel records its own stages (process, aggregate, report, point_report, save)
+    under its own name. DataStream file opens and DataStreamDataField reads are recorded under datastream_open and
+    datastream_read. Bytes read through DataModel.get_data are attributed to the DataTool which is being measured in
+    the reading thread. Totals since the last reset are available from get_summary and get_summary_table. If a log is
+    opened with open_log, one JSON line per shot holding the timings of that shot is written to a rolling log file
+    which is rotated into log_path.1, log_path.2, ... once it exceeds max_log_bytes. If a trace is opened with
+    open_trace every measurement is also recorded as a span by a TraceRecorder.
+    """
+    STAGE_PROCESS = 'process'
+    STAGE_AGGREGATE = 'aggregate'
+    STAGE_REPORT = 'report'
+    STAGE_POINT_REPORT = 'point_report'
+    STAGE_SAVE = 'save'
+    STAGE_DATASTREAM_OPEN = 'datastream_open'
+    STAGE_DATASTREAM_READ = 'datastream_read'
+
+    def __init__(self):
+        self.stat_dict = dict()
+        self.shot_stat_dict = dict()
+        self.lock = threading.Lock()
+        self.thread_local = threading.local()
+        self.log_path = None
+        self.log_file = None
+        self.max_log_bytes = 0
+        self.num_log_backups = 0
+        self.trace_recorder = None
+
+    def measure(self, stage, name, shot_num=None):
+        return PerformanceMeasurement(self, stage, name, shot_num)
+
+    def record(self, stage, name, elapsed_time, num_bytes=0):
+        key = (stage, name)
+        with self.lock:
+            stat = self.stat_dict.get(key)
+            if stat is None:
+                stat = self.stat_dict[key] = PerformanceStat()
+            stat.add(elapsed_time, num_bytes)
+            shot_stat = self.shot_stat_dict.get(key)
+            if shot_stat is None:
+                shot_stat = self.shot_stat_dict[key] = PerformanceStat()
+            shot_stat.add(elapsed_time, num_bytes)
+
+    def add_bytes(self, num_bytes):
+        """ Attribute num_bytes to the measurement running in the calling thread, if any."""
+        measurement = getattr(self.thread_local, 'measurement', None)
+        if measurement is not None:
+            measurement.num_bytes += num_bytes
+
+    def reset(self):
+        with self.lock:
+            self.stat_dict = dict()
+            self.shot_stat_dict = dict()
+
+    def get_summary(self):
+        """ Return a list of dicts, one per (stage, name), sorted by total time."""
+        with self.lock:
+            stat_items = list(self.stat_dict.items())
+        summary_list = []
+        for (stage, name), stat in stat_items:
+            summary_list.append({'stage': stage, 'name': name, 'calls': stat.num_calls,
+                                 'total_time': stat.total_time, 'mean_time': stat.total_time / stat.num_calls,
+                                 'max_time': stat.max_time, 'bytes_read': stat.num_bytes})
+        summary_list.sort(key=lambda summary: summary['total_time'], reverse=True)
+        return summary_list
+
+    def get_summary_table(self):
+        header = (f'{"stage":<22}{"name":<28}{"calls":>8}'
+                  f'{"total (s)":>12}{"mean (ms)":>12}'
+                  f'{"max (ms)":>12}{"MiB read":>11}')
+        line_list = [header, '-' * len(header)]
+        for summary in self.get_summary():
+            line_list.append(f'{summary["stage"]:<22}{summary["name"]:<28}{summary["calls"]:>8d}'
+                             f'{summary["total_time"]:>12.3f}{summary["mean_time"] * 1e3:>12.2f}'
+                             f'{summary["max_time"] * 1e3:>12.2f}{summary["bytes_read"] / 2 ** 20:>11.2f}')
+        return '\n'.join(line_list)
+
+    def open_log(self, log_path, max_log_bytes=16 * 2 ** 20, num_log_backups=3):
+        if self.log_file is not None and Path(log_path) == self.log_path:
+            return
+        self.close_log()
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_log_bytes = max_log_bytes
+        self.num_log_backups = num_log_backups
+        self.log_file = open(self.log_path, 'a')
+
+    def close_log(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def rotate_log(self):
+        self.log_file.close()
+        for backup_num in range(self.num_log_backups - 1, 0, -1):
+            backup_path = Path(f'{self.log_path}.{backup_num}')
+            if backup_path.exists():
+                os.replace(backup_path, Path(f'{self.log_path}.{backup_num + 1}'))
+        if self.num_log_backups > 0:
+            os.replace(self.log_path, Path(f'{self.log_path}.1'))
+        self.log_file = open(self.log_path, 'w')
+
+    def open_trace(self, trace_path, num_points=1):
+        if self.trace_recorder is not None and Path(trace_path) == self.trace_recorder.trace_path:
+            return
+        self.close_trace()
+        self.trace_recorder = TraceRecorder(trace_path=trace_path, num_points=num_points)
+
+    def close_trace(self):
+        if self.trace_recorder is not None:
+            self.trace_recorder.close()
+            self.trace_recorder = None
+
+    def flush_trace(self):
+        if self.trace_recorder is not None:
+            self.trace_recorder.flush()
+
+    def start_shot(self):
+        with self.lock:
+            self.shot_stat_dict = dict()
+
+    def end_shot(self, shot_num, loop_num, point_num):
+        """ Write the timings collected since start_shot to the log, if a log is open."""
+        with self.lock:
+            shot_stat_dict = self.shot_stat_dict
+            self.shot_stat_dict = dict()
+        self.flush_trace()
+        if self.log_file is None:
+            return
+        timing_list = [[stage, name, stat.num_calls, round(stat.total_time, 6), stat.num_bytes]
+                       for (stage, name), stat in shot_stat_dict.items()]
+        log_entry = {'time': datetime.datetime.now().isoformat(), 'shot': shot_num, 'loop': loop_num,
+                     'point': point_num, 'timings': timing_list}
+        self.log_file.write(json.dumps(log_entry) + '\n')
+        self.log_file.flush()
+        if self.max_log_bytes and self.log_file.tell() > self.max_log_bytes:
+            self.rotate_log()
+
+
+class PerformanceMeasurement:
+    """ Context manager timing one call for a PerformanceMonitor."""
+    __slots__ = ('monitor', 'stage', 'name', 'shot_num', 'start_time', 'num_bytes', 'outer_measurement')
+
+    def __init__(self, monitor, stage, name, shot_num=None):
+        self.monitor = monitor
+        self.stage = stage
+        self.name = name
+        self.shot_num = shot_num
+        self.start_time = 0.0
+        self.num_bytes = 0
+        self.outer_measurement = None
+
+    def __enter__(self):
+        thread_local = self.monitor.thread_local
+        self.outer_measurement = getattr(thread_local, 'measurement', None)
+        thread_local.measurement = self
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed_time = time.perf_counter() - self.start_time
+        self.monitor.thread_local.measurement = self.outer_measurement
+        self.monitor.record(self.stage, self.name, elapsed_time, self.num_bytes)
+        trace_recorder = self.monitor.trace_recorder
+        if trace_recorder is not None:
+            trace_recorder.add_span(self.stage, self.name, self.start_time, elapsed_time, self.shot_num)
+        return False
+
+
+class TraceRecorder:
+    """ Writes spans in the Chrome trace event format (JSON array format) for chrome://tracing or Perfetto.
+
+    Every span is a complete ('X') event named <stage>:<name> on the thread which ran it. Spans belonging to a shot
+    carry the shot, loop and point numbers as args. Events are buffered and appended to the file by flush, the closing
+    bracket is only written by close. The trace format allows the closing bracket to be missing so a trace of a run
+    which is still going or was interrupted can be opened as well.
+    """
+    def __init__(self, *, trace_path, num_points=1):
+        self.trace_path = Path(trace_path)
+        self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+        self.num_points = num_points
+        self.origin_time = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.event_list = []
+        self.thread_id_set = set()
+        self.num_written_events = 0
+        self.trace_file = open(self.trace_path, 'w')
+        self.trace_file.write('[')
+
+    def add_span(self, stage, name, start_time, elapsed_time, shot_num=None):
+        thread_id = threading.get_ident()
+        event = {'name': f'{stage}:{name}', 'cat': stage, 'ph': 'X', 'pid': self.pid, 'tid': thread_id,
+                 'ts': round((start_time - self.origin_time) * 1e6, 3), 'dur': round(elapsed_time * 1e6, 3)}
+        if shot_num is not None:
+            loop_num, point_num = shot_to_loop_and_point(shot_num, num_points=self.num_points)
+            event['args'] = {'shot': shot_num, 'loop': loop_num, 'point': point_num}
+        with self.lock:
+            if thread_id not in self.thread_id_set:
+                self.thread_id_set.add(thread_id)
+                self.event_list.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread_id,
+                                        'args': {'name': threading.current_thread().name}})
+            self.event_list.append(event)
+
+    def flush(self):
+        with self.lock:
+            event_list = self.event_list
+            self.event_list = []
+        for event in event_list:
+            if self.num_written_events > 0:
+                self.trace_file.write(',\n')
+            self.trace_file.write(json.dumps(event))
+            self.num_written_events += 1
+        self.trace_file.flush()
+
+    def close(self):
+        self.flush()
+        self.trace_file.write(']\n')
+        self.trace_file.close()
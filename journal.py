@@ -0,0 +1,73 @@
+import os
+import pickle
+import uuid
+from pathlib import Path
+
+
+class DataModelJournal:
+    """ Append-only log of the changes made to a DataModel since its last full save.
+
+    The journal lives next to the DataModel pickle file and holds a sequence of pickled records. Every record is tagged
+    with journal_id, a random token which is also stored in the pickle file when it is (re)written. Records whose
+    journal_id does not match the pickle file belong to an older save and are ignored when loading, so that rewriting
+    the pickle file and then clearing the journal is safe even if the process dies in between. A record which was only
+    partially written (for example because the process was killed during a save) ends the journal. needs_compaction
+    is then set so that the next save rewrites the pickle file and starts a fresh journal.
+    """
+    def __init__(self, *, journal_path, journal_id):
+        self.journal_path = Path(journal_path)
+        self.journal_id = journal_id
+        self.num_records = 0
+        self.needs_compaction = False
+
+    @staticmethod
+    def get_journal_path(datamodel_path):
+        return Path(datamodel_path).with_suffix('.journal')
+
+    @staticmethod
+    def new_journal_id():
+        return uuid.uuid4().hex
+
+    def clear(self):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_path, 'wb'):
+            pass
+        self.num_records = 0
+        self.needs_compaction = False
+
+    def get_size(self):
+        try:
+            return self.journal_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record):
+        record['journal_id'] = self.journal_id
+        record_bytes = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.journal_path, 'ab') as journal_file:
+            journal_file.write(record_bytes)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self.num_records += 1
+
+    def read_records(self):
+        """ Return the list of records belonging to journal_id. Sets needs_compaction if the journal ends with a
+        partially written record."""
+        record_list = []
+        self.num_records = 0
+        self.needs_compaction = False
+        if self.journal_id is None or not self.journal_path.exists():
+            return record_list
+        journal_size = self.get_size()
+        with open(self.journal_path, 'rb') as journal_file:
+            while journal_file.tell() < journal_size:
+                try:
+                    record = pickle.load(journal_file)
+                except Exception:
+                    print(f'WARNING! Ignoring partially written record at the end of {self.journal_path}.')
+                    self.needs_compaction = True
+                    break
+                if record.get('journal_id') == self.journal_id:
+                    record_list.append(record)
+        self.num_records = len(record_list)
+        return record_list
@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .datatool import DataTool
+from .datafield import DataField, DataStreamDataField
+
+
+class ShotPrefetcher:
+    """ Read-ahead of raw data for upcoming shots.
+
+    While the DataModel processes one shot a thread pool loads the datasets of all DataStreamDataFields for the next
+    prefetch_depth shots. Data is prefetched in the dtype it is stored in and converted by the reader. Prefetched data
+    is served to every reader of a shot via get_data and is kept until release_before is called for a later shot, i.e.
+    until the DataModel advances past the shot. Readers must not modify the returned array in place. No new reads are
+    scheduled while the prefetched (or estimated in-flight) data exceeds max_bytes. cancel() drops all pending reads
+    and shuts down the thread pool.
+    """
+    def __init__(self, *, datamodel, prefetch_depth=4, max_workers=2, max_bytes=512 * 2 ** 20):
+        self.datamodel = datamodel
+        self.prefetch_depth = prefetch_depth
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='e6dataflow-prefetch')
+        self.lock = threading.Lock()
+        self.future_dict = dict()
+        self.nbytes_dict = dict()
+        self.datafield_nbytes_dict = dict()
+        self.num_prefetched_bytes = 0
+        self.cancelled = False
+        self.datafield_list = []
+        for datafield in datamodel.get_datatool_of_type(DataTool.SHOT_DATAFIELD):
+            if isinstance(datafield, DataStreamDataField):
+                self.datafield_list.append(datafield)
+
+    def get_reserved_bytes(self):
+        reserved_bytes = self.num_prefetched_bytes
+        for (datafield_name, shot_num), future in self.future_dict.items():
+            if not future.done():
+                reserved_bytes += self.datafield_nbytes_dict.get(datafield_name, 0)
+        return reserved_bytes
+
+    def schedule(self, shot_num, num_shots):
+        """ Schedule reads for shots following shot_num up to prefetch_depth shots ahead (but before num_shots)."""
+        if self.cancelled:
+            return
+        stop_shot = min(shot_num + 1 + self.prefetch_depth, num_shots)
+        for next_shot_num in range(shot_num + 1, stop_shot):
+            for datafield in self.datafield_list:
+                key = (datafield.name, next_shot_num)
+                with self.lock:
+                    if key in self.future_dict:
+                        continue
+                    if self.get_reserved_bytes() >= self.max_bytes:
+                        return
+                    self.future_dict[key] = self.executor.submit(self._load, datafield, next_shot_num)
+
+    def _load(self, datafield, shot_num):
+        data = datafield.load_data(shot_num, dtype=DataField.DTYPE_NATIVE)
+        with self.lock:
+            key = (datafield.name, shot_num)
+            if key in self.future_dict:
+                self.nbytes_dict[key] = data.nbytes
+                self.num_prefetched_bytes += data.nbytes
+            self.datafield_nbytes_dict[datafield.name] = data.nbytes
+        return data
+
+    def get_data(self, datafield_name, shot_num):
+        """ Return the prefetched data for datafield_name and shot_num or None if it was not prefetched."""
+        key = (datafield_name, shot_num)
+        with self.lock:
+            future = self.future_dict.get(key)
+        if future is None:
+            return None
+        try:
+            data = future.result()
+        except Exception:
+            # Let the caller retry the read synchronously so that the error is raised in the processing thread.
+            data = None
+        return data
+
+    def release_before(self, shot_num):
+        """ Drop prefetched data for shots prior to shot_num which was never requested."""
+        with self.lock:
+            stale_key_list = [key for key in self.future_dict if key[1] < shot_num]
+            for key in stale_key_list:
+                future = self.future_dict.pop(key)
+                future.cancel()
+                self.num_prefetched_bytes -= self.nbytes_dict.pop(key, 0)
+
+    def cancel(self):
+        self.cancelled = True
+        with self.lock:
+            for future in self.future_dict.values():
+                future.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            self.future_dict = dict()
+            self.nbytes_dict = dict()
+            self.num_prefetched_bytes = 0
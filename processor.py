@@ -1,11 +1,27 @@
 import numpy as np
 from .datatool import DataTool, ShotHandler
-from .utils import shot_to_loop_and_point
+from .datafield import DataField
+from .utils import shot_to_loop_and_point, get_roi_bounding_box, shift_roi
+from .tools.smart_gaussian2d_fit import fit_gaussian2d
 
 
 class Processor(ShotHandler):
+    # Processors whose result for a shot depends on the shots processed before it, e.g. because they carry state from
+    # shot to shot, set PARALLELIZABLE to False. DataModel.backfill runs these Processors, and the Processors depending
+    # on them, in shot order in the main process rather than in the worker processes.
+    PARALLELIZABLE = True
+
     def __init__(self, *, name):
         super(Processor, self).__init__(name=name, datatool_type=DataTool.PROCESSOR)
+        # Processors which require their inputs in a particular dtype (e.g. float64 for fitting) set input_dtype so that
+        # the conversion is done once while reading rather than by every consumer. None uses the DataField dtype policy.
+        self.input_dtype = None
+
+    def is_parallelizable(self):
+        return self.PARALLELIZABLE
+
+    def get_input_data(self, datafield_name, shot_num, region=None):
+        return self.datamodel.get_data(datafield_name, shot_num, region=region, dtype=self.input_dtype)
 
     def process(self, shot_num, quiet=False):
         self.handle(shot_num, quiet=quiet)
@@ -17,6 +33,16 @@ class Processor(ShotHandler):
         raise NotImplementedError
 
 
+def determine_roi_mode(roi_slice):
+    if len(roi_slice) == 2 and isinstance(roi_slice[0], slice):
+        mode = 'single_roi'
+    elif isinstance(roi_slice, list) or isinstance(roi_slice, tuple):
+        mode = 'roi_list'
+    else:
+        raise ValueError('roi_slice must be a single roi tuple or a list or tuple or roi tuples.')
+    return mode
+
+
 class CountsProcessor(Processor):
     def __init__(self, *, name, frame_datafield_name, output_datafield_name, roi_slice):
         super(CountsProcessor, self).__init__(name=name)
@@ -26,13 +52,7 @@ class CountsProcessor(Processor):
         self.mode = self.determine_roi_mode()
 
     def determine_roi_mode(self):
-        if len(self.roi_slice) == 2 and isinstance(self.roi_slice[0], slice):
-            mode = 'single_roi'
-        elif isinstance(self.roi_slice, list) or isinstance(self.roi_slice, tuple):
-            mode = 'roi_list'
-        else:
-            raise ValueError('roi_slice must be a single roi tuple or a list or tuple or roi tuples.')
-        return mode
+        return determine_roi_mode(self.roi_slice)
 
     def link_within_datamodel(self):
         super(CountsProcessor, self).link_within_datamodel()
@@ -46,9 +66,8 @@ class CountsProcessor(Processor):
         elif self.mode == 'roi_list':
             loop, point = shot_to_loop_and_point(shot_num, self.datamodel.num_points)
             roi_slice = self.roi_slice[point]
-        frame = self.datamodel.get_data(self.frame_datafield_name, shot_num)
-        roi_frame = frame[roi_slice]
-        counts = np.nansum(roi_frame)
+        roi_frame = self.get_input_data(self.frame_datafield_name, shot_num, region=tuple(roi_slice))
+        counts = np.nansum(roi_frame, dtype=float)
         self.datamodel.set_data(self.result_datafield_name, shot_num, counts)
 
 
@@ -66,12 +85,20 @@ class MultiCountsProcessor(Processor):
         self.add_parent(self.frame_datafield_name)
 
     def _process(self, shot_num):
-        frame = self.datamodel.get_data(self.frame_datafield_name, shot_num)
         loop, point = shot_to_loop_and_point(shot_num, self.datamodel.num_points)
+        roi_list = [tuple(self.roi_slice_array[point, roi_num])
+                    for roi_num in range(len(self.result_datafield_name_list))]
+        bounding_box = get_roi_bounding_box(roi_list)
+        if bounding_box is not None:
+            # Only read the part of the frame which contains the rois.
+            frame = self.get_input_data(self.frame_datafield_name, shot_num, region=bounding_box)
+            roi_list = [shift_roi(roi, bounding_box[0].start, bounding_box[1].start) for roi in roi_list]
+        else:
+            frame = self.get_input_data(self.frame_datafield_name, shot_num)
         for roi_num, result_datafield_name in enumerate(self.result_datafield_name_list):
-            roi_slice = self.roi_slice_array[point, roi_num]
+            roi_slice = roi_list[roi_num]
             roi_frame = frame[roi_slice]
-            counts = np.nansum(roi_frame)
+            counts = np.nansum(roi_frame, dtype=float)
             self.datamodel.set_data(result_datafield_name, shot_num, counts)
 
 
@@ -91,3 +118,98 @@ class ThresholdProcessor(Processor):
         data_value = self.datamodel.get_data(self.input_datafield_name, shot_num)
         verified = data_value > self.threshold_value
         self.datamodel.set_data(self.output_datafield_name, shot_num, verified)
+
+
+class GaussianFitProcessor(Processor):
+    """ Fit a 2D Gaussian (see e6dataflow.tools.smart_gaussian2d_fit.fit_gaussian2d) to a region of interest of a frame.
+
+    roi_slice is either a single roi or a list with one roi per point. Only the roi is read from the frame. The fitted
+    center (in frame coordinates), widths, amplitude and NGauss are written to the output DataFields which are given,
+    outputs whose DataField name is None are not written. With warm_start the fit of a shot starts from the parameters
+    of the last successful fit of the same point, consecutive shots of a point being similar. If that fit fails, or for
+    the first shot of a point, the fit starts from the image moments. A fit is considered failed if the fit did not
+    converge or its center or widths are not within the roi. Since warm_start carries the fit of one shot over to the
+    next shot of the point, the Processor is only parallelizable if warm_start is False. Roi slices may leave out their
+    start (e.g. np.s_[:, 10:20]) but must not have negative starts or steps other than 1.
+    """
+    PARALLELIZABLE = False
+
+    def __init__(self, *, name, frame_datafield_name, roi_slice, output_x0_datafield_name=None,
+                 output_y0_datafield_name=None, output_sx_datafield_name=None, output_sy_datafield_name=None,
+                 output_amp_datafield_name=None, output_ngauss_datafield_name=None, fix_angle=True,
+                 fix_lin_slope=True, warm_start=True, bin_factor=1):
+        super(GaussianFitProcessor, self).__init__(name=name)
+        self.frame_datafield_name = frame_datafield_name
+        self.roi_slice = roi_slice
+        self.output_datafield_name_dict = {'x0': output_x0_datafield_name,
+                                           'y0': output_y0_datafield_name,
+                                           'sx': output_sx_datafield_name,
+                                           'sy': output_sy_datafield_name,
+                                           'amp': output_amp_datafield_name,
+                                           'NGauss': output_ngauss_datafield_name}
+        self.fix_angle = fix_angle
+        self.fix_lin_slope = fix_lin_slope
+        self.warm_start = warm_start
+        self.bin_factor = bin_factor
+        self.mode = determine_roi_mode(self.roi_slice)
+        roi_list = [self.roi_slice] if self.mode == 'single_roi' else self.roi_slice
+        for roi in roi_list:
+            for axis_slice in roi:
+                if (axis_slice.start is not None and axis_slice.start < 0) or axis_slice.step not in [None, 1]:
+                    raise ValueError(f'GaussianFitProcessor rois must have non-negative starts and unit steps, got '
+                                     f'{roi}.')
+        self.input_dtype = DataField.DTYPE_FLOAT64
+        self.warm_start_dict = dict()
+
+    def link_within_datamodel(self):
+        super(GaussianFitProcessor, self).link_within_datamodel()
+        for output_datafield_name in self.output_datafield_name_dict.values():
+            if output_datafield_name is not None:
+                self.add_child(output_datafield_name)
+        self.add_parent(self.frame_datafield_name)
+
+    def is_parallelizable(self):
+        return self.PARALLELIZABLE or not self.warm_start
+
+    def fit(self, roi_frame, guess):
+        return fit_gaussian2d(roi_frame, bin_factor=self.bin_factor, fix_angle=self.fix_angle,
+                              fix_lin_slope=self.fix_lin_slope, show_plot=False, guess=guess, compact=True)
+
+    @staticmethod
+    def fit_succeeded(fit_result, roi_shape):
+        x0, y0, sx, sy = (fit_result.get_val(key) for key in ['x0', 'y0', 'sx', 'sy'])
+        if not fit_result.success or not np.all(np.isfinite(fit_result.popt)):
+            return False
+        return 0 <= x0 < roi_shape[1] and 0 <= y0 < roi_shape[0] and 0 < sx < roi_shape[1] and 0 < sy < roi_shape[0]
+
+    def _process(self, shot_num):
+        loop, point = shot_to_loop_and_point(shot_num, self.datamodel.num_points)
+        if self.mode == 'single_roi':
+            roi_slice = tuple(self.roi_slice)
+        else:
+            roi_slice = tuple(self.roi_slice[point])
+        roi_frame = self.get_input_data(self.frame_datafield_name, shot_num, region=roi_slice)
+
+        fit_result = None
+        warm_start_guess = self.warm_start_dict.get(point) if self.warm_start else None
+        if warm_start_guess is not None:
+            fit_result = self.fit(roi_frame, guess=warm_start_guess)
+            if not self.fit_succeeded(fit_result, roi_frame.shape):
+                fit_result = None
+        if fit_result is None:
+            fit_result = self.fit(roi_frame, guess=None)
+        if self.fit_succeeded(fit_result, roi_frame.shape):
+            self.warm_start_dict[point] = fit_result.popt
+        else:
+            self.warm_start_dict.pop(point, None)
+
+        # The fit is done in roi coordinates, a start of None is the edge of the frame.
+        output_dict = {'x0': fit_result.get_val('x0') + (roi_slice[1].start or 0),
+                       'y0': fit_result.get_val('y0') + (roi_slice[0].start or 0),
+                       'sx': fit_result.get_val('sx'),
+                       'sy': fit_result.get_val('sy'),
+                       'amp': fit_result.get_val('amp'),
+                       'NGauss': fit_result.derived_dict['NGauss']}
+        for key, output_datafield_name in self.output_datafield_name_dict.items():
+            if output_datafield_name is not None:
+                self.datamodel.set_data(output_datafield_name, shot_num, float(output_dict[key]))
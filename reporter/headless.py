@@ -0,0 +1,189 @@
+import os
+import pickle
+import threading
+import weakref
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+
+def init_headless_worker():
+    matplotlib.use('Agg')
+
+
+def render_figure_snapshot(figure_bytes, file_path, save_format, dpi):
+    """ Unpickle a figure snapshot and render it to file_path with the Agg backend. The image is written to a
+    temporary file first so that an archive never holds a partially written image."""
+    import matplotlib.pyplot as plt
+    fig = pickle.loads(figure_bytes)
+    # Artists which are redrawn by blitting are marked as animated, which excludes them from a regular draw.
+    for artist in fig.findobj():
+        artist.set_animated(False)
+    temp_file_path = Path(f'{file_path}.tmp')
+    try:
+        fig.savefig(temp_file_path, bbox_inches='tight', format=save_format, dpi=dpi)
+        os.replace(temp_file_path, file_path)
+    finally:
+        plt.close(fig)
+    return file_path
+
+
+class HeadlessSaver:
+    """ Saves figures off the processing thread by rendering them with the Agg backend in a pool of worker processes.
+
+    submit only queues a save request and never blocks. A dispatcher thread takes a snapshot of the figure by pickling
+    it, including its data, and hands the snapshot to the worker processes. Only the latest request for a figure is
+    kept: a request still waiting for its snapshot is replaced by a newer request for the same figure, and is dropped
+    when the figure is modified again. Code modifying a submitted figure must do so within lock_figure(fig) so that the
+    figure isn't modified while its snapshot is taken. At most max_queue_size snapshots are rendered at a time and at
+    most max_queue_size figures wait for their snapshot, further requests are dropped. Replaced and dropped requests
+    are counted in num_dropped. Worker processes are started with the spawn method on the first snapshot, so scripts
+    using headless saving must use an if __name__ == '__main__' guard.
+    """
+    def __init__(self, *, max_workers=2, max_queue_size=16):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.executor = None
+        self.future_dict = dict()
+        self.pending_dict = OrderedDict()
+        self.num_dispatching = 0
+        self.figure_lock_dict = weakref.WeakKeyDictionary()
+        self.condition = threading.Condition()
+        self.dispatcher_thread = None
+        self.stopping = False
+        self.num_saved = 0
+        self.num_dropped = 0
+        self.num_failed = 0
+
+    def get_figure_lock(self, fig):
+        with self.condition:
+            figure_lock = self.figure_lock_dict.get(fig)
+            if figure_lock is None:
+                figure_lock = threading.Lock()
+                self.figure_lock_dict[fig] = figure_lock
+            return figure_lock
+
+    @contextmanager
+    def lock_figure(self, fig):
+        """ Context within which fig may be modified. A request to save fig which is still waiting for its snapshot is
+        dropped since the snapshot would no longer show the figure as it was submitted."""
+        with self.get_figure_lock(fig):
+            with self.condition:
+                if self.pending_dict.pop(id(fig), None) is not None:
+                    self.num_dropped += 1
+            yield
+
+    def submit(self, fig, file_path, save_format='png', dpi=None):
+        """ Queue fig to be saved to file_path and return immediately. Returns False if the request was dropped
+        because max_queue_size other figures are already waiting for their snapshot."""
+        with self.condition:
+            key = id(fig)
+            if self.pending_dict.pop(key, None) is not None:
+                self.num_dropped += 1
+            elif len(self.pending_dict) >= self.max_queue_size:
+                self.num_dropped += 1
+                print(f'WARNING! Headless save queue is full, dropping {file_path}.')
+                return False
+            self.pending_dict[key] = (fig, str(file_path), save_format, dpi)
+            if self.dispatcher_thread is None:
+                self.stopping = False
+                self.dispatcher_thread = threading.Thread(target=self.dispatch, name='e6dataflow-headless',
+                                                          daemon=True)
+                self.dispatcher_thread.start()
+            self.condition.notify_all()
+        return True
+
+    def dispatch(self):
+        while True:
+            with self.condition:
+                while not self.stopping and (not self.pending_dict or len(self.future_dict) >= self.max_queue_size):
+                    self.condition.wait()
+                    self.collect_finished()
+                if self.stopping:
+                    return
+                key, request = next(iter(self.pending_dict.items()))
+            fig, file_path, save_format, dpi = request
+            # The figure lock is taken before the condition, in the same order as in lock_figure.
+            with self.get_figure_lock(fig):
+                with self.condition:
+                    if self.pending_dict.get(key) is not request:
+                        continue
+                    del self.pending_dict[key]
+                    self.num_dispatching += 1
+                try:
+                    figure_bytes = pickle.dumps(fig, protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception as exception:
+                    figure_bytes = None
+                    print(f'WARNING! Headless save of {file_path} failed: {exception!r}')
+            future = None
+            if figure_bytes is not None:
+                # Only the dispatcher thread starts the worker processes, outside of the condition so that submit is
+                # not held up while they start.
+                try:
+                    if self.executor is None:
+                        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                            mp_context=multiprocessing.get_context('spawn'),
+                                                            initializer=init_headless_worker)
+                    future = self.executor.submit(render_figure_snapshot, figure_bytes, file_path, save_format, dpi)
+                except Exception as exception:
+                    print(f'WARNING! Headless save of {file_path} failed: {exception!r}')
+            with self.condition:
+                self.num_dispatching -= 1
+                if future is None:
+                    self.num_failed += 1
+                else:
+                    self.future_dict[future] = file_path
+                    future.add_done_callback(self.on_future_done)
+                self.condition.notify_all()
+
+    def on_future_done(self, future):
+        with self.condition:
+            self.condition.notify_all()
+
+    def collect_finished(self):
+        with self.condition:
+            for future in [future for future in self.future_dict if future.done()]:
+                file_path = self.future_dict.pop(future)
+                exception = future.exception()
+                if exception is None:
+                    self.num_saved += 1
+                else:
+                    self.num_failed += 1
+                    print(f'WARNING! Headless save of {file_path} failed: {exception!r}')
+
+    def get_num_pending(self):
+        with self.condition:
+            self.collect_finished()
+            return len(self.pending_dict) + self.num_dispatching + len(self.future_dict)
+
+    def wait(self):
+        """ Block until every queued figure has been saved."""
+        with self.condition:
+            self.collect_finished()
+            while self.pending_dict or self.num_dispatching or self.future_dict:
+                self.condition.wait()
+                self.collect_finished()
+
+    def shutdown(self, wait=True):
+        """ Stop the dispatcher thread and the worker processes. With wait the queued figures are saved first,
+        otherwise they are dropped."""
+        if wait:
+            self.wait()
+        with self.condition:
+            self.num_dropped += len(self.pending_dict)
+            self.pending_dict.clear()
+            self.stopping = True
+            self.condition.notify_all()
+            dispatcher_thread = self.dispatcher_thread
+        if dispatcher_thread is not None:
+            dispatcher_thread.join()
+        self.dispatcher_thread = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=not wait)
+            self.executor = None
+        with self.condition:
+            self.collect_finished()
+            self.future_dict = dict()
@@ -1,17 +1,32 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
+from matplotlib.image import AxesImage
+from matplotlib.lines import Line2D
 from pathlib import Path
 from ..datatool import DataTool
-from .reporter import Reporter, get_plot_limits
+from .reporter import Reporter, BlitManager, get_plot_limits
 from ..utils import get_data_min_max
 
 
 class PointReporter(Reporter):
-    def __init__(self, *, name, datafield_name_list, layout, save_data, close_plots=False, min_lim_list=None, max_lim_list=None):
+    """ Reporter which plots the data of each point in its own figure.
+
+    The first report of a point creates its plots. Later reports update the existing artists in place through
+    _update_plot if update_supported returns True for every plot, otherwise all axes of the point are cleared and
+    re-plotted. With BLIT = True the updated artists are redrawn with blitting instead of redrawing the full figure.
+    The reporter listens to writes into its DataFields and report only redraws (and saves) the points whose data
+    changed since the previous report. With save_data the redrawn points are saved with save_dpi and save_format, in a
+    worker process if headless_save is set.
+    """
+    BLIT = False
+
+    def __init__(self, *, name, datafield_name_list, layout, save_data, close_plots=False, min_lim_list=None,
+                 max_lim_list=None, save_dpi=500, save_format='png', headless_save=False):
         super().__init__(name=name, reporter_type=DataTool.POINT_REPORTER,
                          datafield_name_list=datafield_name_list, layout=layout,
-                         save_data=save_data, close_plots=close_plots)
+                         save_data=save_data, close_plots=close_plots, save_dpi=save_dpi, save_format=save_format,
+                         headless_save=headless_save)
         self.min_lim_list = min_lim_list
         self.max_lim_list = max_lim_list
         self.fig_list = []
@@ -19,6 +34,25 @@ class PointReporter(Reporter):
         self.plot_dict = dict()
         self.figs_made = False
         self.fig_made = [False]*100
+        self.suptitle_dict = dict()
+        self.blit_manager_dict = dict()
+        self.dirty_point_set = None
+
+    def link_within_datamodel(self):
+        super(PointReporter, self).link_within_datamodel()
+        self.datamodel.add_data_listener(self.name, self.on_data_written)
+        if self.dirty_point_set is None:
+            self.dirty_point_set = set(range(self.datamodel.num_points))
+
+    def on_data_written(self, datafield_name, data_index):
+        if datafield_name not in self.datafield_name_list:
+            return
+        if data_index is None:
+            self.dirty_point_set.update(range(self.datamodel.num_points))
+        elif self.datamodel.datatool_dict[datafield_name].datatool_type == DataTool.POINT_DATAFIELD:
+            self.dirty_point_set.add(data_index)
+        else:
+            self.dirty_point_set.add(data_index % self.datamodel.num_points)
 
     def make_figs(self):
         for point_num in range(self.datamodel.num_points):
@@ -50,19 +84,68 @@ class PointReporter(Reporter):
     def report(self):
         # if not self.figs_made:
         #     self.make_figs()
-        for point_num in range(self.datamodel.num_points):
+        for point_num in sorted(self.dirty_point_set):
             if not self.fig_made[point_num]:
                 self.make_fig(point_num)
-            self.report_point(point_num)
+            with self.lock_figure(self.fig_list[point_num]):
+                self.report_point(point_num)
+            self.dirty_point_set.discard(point_num)
             if self.save_data:
                 self.save(point_num)
             if self.close_plots:
                 plt.close(self.fig_list[point_num])
 
+    def get_point_plot_data(self, datafield_name, point_num):
+        datafield = self.datamodel.datatool_dict[datafield_name]
+        if datafield.datatool_type == DataTool.POINT_DATAFIELD:
+            data = self.datamodel.get_data(datafield_name, point_num)
+        else:
+            data = self.datamodel.get_data_by_point(datafield_name, point_num)
+        if isinstance(data, dict):
+            data = data['mean']
+        return data
+
     def report_point(self, point_num):
+        point_key = f'point_{point_num:02d}'
+        data_list = [self.get_point_plot_data(datafield_name, point_num)
+                     for datafield_name in self.datafield_name_list]
+        plot_list = self.plot_dict[point_key]
+        if len(plot_list) == self.num_datafields and point_key in self.suptitle_dict and all(
+                self.update_supported(plot, data) for plot, data in zip(plot_list, data_list)):
+            self.update_point_report(point_num, data_list)
+        else:
+            self.full_point_report(point_num, data_list)
+
+    def update_point_report(self, point_num, data_list):
+        point_key = f'point_{point_num:02d}'
+        fig = self.fig_list[point_num]
+        ax_list = self.ax_dict[point_key]
+        plot_list = self.plot_dict[point_key]
+        old_limit_list = [(ax.get_xlim(), ax.get_ylim()) for ax in ax_list]
+        data_min = np.inf
+        data_max = - np .inf
+        for datafield_num, data in enumerate(data_list):
+            self._update_plot(ax_list[datafield_num], plot_list[datafield_num], data)
+            new_min, new_max = get_data_min_max(data)
+            data_min = min(data_min, new_min)
+            data_max = max(data_max, new_max)
+        self.generic_plot_adjustments(point_num, data_min=data_min, data_max=data_max)
+        # The axes (ticks, labels) are part of the blitted background, it must be redrawn if any limits changed.
+        limits_changed = old_limit_list != [(ax.get_xlim(), ax.get_ylim()) for ax in ax_list]
+        blit_manager = self.blit_manager_dict.get(point_key)
+        if blit_manager is not None and not limits_changed:
+            blit_manager.update()
+        else:
+            fig.canvas.draw_idle()
+            fig.canvas.flush_events()
+
+    def full_point_report(self, point_num, data_list):
         point_key = f'point_{point_num:02d}'
         fig = self.fig_list[point_num]
         ax_list = self.ax_dict[point_key]
+        blit_manager = self.blit_manager_dict.pop(point_key, None)
+        if blit_manager is not None:
+            blit_manager.disconnect()
         fig.set_size_inches(3 * self.num_cols, 3 * self.num_rows)
         data_min = np.inf
         data_max = - np .inf
@@ -71,13 +154,9 @@ class PointReporter(Reporter):
             ax = ax_list[datafield_num]
             ax.clear()
             datafield = self.datamodel.datatool_dict[datafield_name]
-            if datafield.datatool_type == DataTool.POINT_DATAFIELD:
-                data = self.datamodel.get_data(datafield_name, point_num)
-            else:
-                data = self.datamodel.get_data_by_point(datafield_name, point_num)
+            if datafield.datatool_type != DataTool.POINT_DATAFIELD:
                 ax.set_xlabel('loop number')
-            if isinstance(data, dict):
-                data = data['mean']
+            data = data_list[datafield_num]
             new_plot = self._plot(ax, data)
             self.specific_plot_adjustments(ax, new_plot, datafield_name, point_num)
             try:
@@ -89,13 +168,21 @@ class PointReporter(Reporter):
             data_max = max(data_max, new_max)
             ax.set_title(datafield_name)
         self.generic_plot_adjustments(point_num, data_min=data_min, data_max=data_max)
-        fig.suptitle(f'{point_key}')
+        self.suptitle_dict[point_key] = fig.suptitle(f'{point_key}')
         fig.set_tight_layout({'rect': [0, 0.03, 1, 0.9]})
+        if self.BLIT:
+            self.blit_manager_dict[point_key] = BlitManager(fig, list(plot_list))
         plt.pause(0.005)
 
     def _plot(self, ax, data):
         raise NotImplementedError
 
+    def update_supported(self, plot, data):
+        return False
+
+    def _update_plot(self, ax, plot, data):
+        raise NotImplementedError
+
     def specific_plot_adjustments(self, ax, new_plot, datafield_name, point_num):
         pass
 
@@ -121,15 +208,99 @@ class PointReporter(Reporter):
 
     def save(self, point_num):
         point_key = f'point_{point_num:02d}'
-        file_name = f'{self.name} - {point_key}.png'
+        file_name = f'{self.name} - {point_key}.{self.save_format}'
         file_path = Path(self.save_path, file_name)
         self.save_path.mkdir(parents=True, exist_ok=True)
-        self.fig_list[point_num].savefig(file_path, bbox_inches='tight',dpi=500)
+        self.save_figure(self.fig_list[point_num], file_path, blit_manager=self.blit_manager_dict.get(point_key))
+
+
+class LoopSeries:
+    """ Growable float array of the values of a shot DataField for the shots of one point, indexed by loop number.
+    Loops which have not been set are NaN."""
+    def __init__(self, data):
+        data = np.asarray(data, dtype=float)
+        self.values = np.full(max(2 * len(data), 16), np.nan)
+        self.values[:len(data)] = data
+        self.num_loops = len(data)
+
+    def set_value(self, loop_num, value):
+        if loop_num >= len(self.values):
+            new_values = np.full(max(2 * len(self.values), loop_num + 1), np.nan)
+            new_values[:len(self.values)] = self.values
+            self.values = new_values
+        self.values[loop_num] = value
+        self.num_loops = max(self.num_loops, loop_num + 1)
+
+    def get_data(self):
+        return self.values[:self.num_loops]
 
 
 class PlotPointReporter(PointReporter):
+    """ Plot the data of each point against the loop number.
+
+    For shot DataFields the values already plotted are kept in a LoopSeries per point and DataField. A report only
+    reads the shots written since the previous report and appends them to the existing line, so the cost of a report
+    does not grow with the number of shots which have already been plotted. The lines are redrawn by blitting, the
+    full figure is only redrawn if the axis limits change. The x limits grow with headroom so that they rarely do.
+    """
+    BLIT = True
+    X_HEADROOM = 1.25
+
+    def __init__(self, *, name, datafield_name_list, layout, save_data, close_plots=False, min_lim_list=None,
+                 max_lim_list=None, save_dpi=500, save_format='png', headless_save=False):
+        super(PlotPointReporter, self).__init__(name=name, datafield_name_list=datafield_name_list, layout=layout,
+                                                save_data=save_data, close_plots=close_plots,
+                                                min_lim_list=min_lim_list, max_lim_list=max_lim_list,
+                                                save_dpi=save_dpi, save_format=save_format,
+                                                headless_save=headless_save)
+        self.series_dict = dict()
+        self.new_shot_dict = dict()
+
+    def on_data_written(self, datafield_name, data_index):
+        super(PlotPointReporter, self).on_data_written(datafield_name, data_index)
+        if datafield_name not in self.datafield_name_list:
+            return
+        if self.datamodel.datatool_dict[datafield_name].datatool_type != DataTool.SHOT_DATAFIELD:
+            return
+        num_points = self.datamodel.num_points
+        if data_index is None:
+            for point_num in range(num_points):
+                self.series_dict.pop((point_num, datafield_name), None)
+                self.new_shot_dict.pop((point_num, datafield_name), None)
+        else:
+            self.new_shot_dict.setdefault((data_index % num_points, datafield_name), set()).add(data_index)
+
+    def get_point_plot_data(self, datafield_name, point_num):
+        datafield = self.datamodel.datatool_dict[datafield_name]
+        if datafield.datatool_type != DataTool.SHOT_DATAFIELD:
+            return super(PlotPointReporter, self).get_point_plot_data(datafield_name, point_num)
+        key = (point_num, datafield_name)
+        new_shot_set = self.new_shot_dict.pop(key, set())
+        series = self.series_dict.get(key)
+        if series is None:
+            data = super(PlotPointReporter, self).get_point_plot_data(datafield_name, point_num)
+            if np.ndim(data) != 1:
+                return data
+            series = LoopSeries(data)
+            self.series_dict[key] = series
+            return series.get_data()
+        for shot_num in sorted(new_shot_set):
+            series.set_value(shot_num // self.datamodel.num_points, self.datamodel.get_data(datafield_name, shot_num))
+        return series.get_data()
+
     def _plot(self, ax, data):
-        ax.plot(data, '.')
+        new_plot, = ax.plot(data, '.')
+        return new_plot
+
+    def update_supported(self, plot, data):
+        return isinstance(plot, Line2D) and np.ndim(data) == 1
+
+    def _update_plot(self, ax, plot, data):
+        num_loops = len(data)
+        plot.set_data(np.arange(num_loops), data)
+        x_min, x_max = ax.get_xlim()
+        if num_loops - 0.5 > x_max:
+            ax.set_xlim(x_min, self.X_HEADROOM * num_loops)
 
     def generic_plot_adjustments_single(self, ax, data_plot, *, data_min, data_max, **kwargs):
         ax.set_ylim([data_min, data_max])
@@ -144,15 +315,25 @@ class HistogramPointReporter(PointReporter):
 
 
 class ImagePointReporter(PointReporter):
-    def __init__(self, *, name, datafield_name_list, layout, save_data, close_plots, roi_slice_array):
+    BLIT = True
+
+    def __init__(self, *, name, datafield_name_list, layout, save_data, close_plots, roi_slice_array, save_dpi=500,
+                 save_format='png', headless_save=False):
         super(ImagePointReporter, self).__init__(name=name, datafield_name_list=datafield_name_list, layout=layout,
-                                                 save_data=save_data, close_plots=close_plots)
+                                                 save_data=save_data, close_plots=close_plots, save_dpi=save_dpi,
+                                                 save_format=save_format, headless_save=headless_save)
         self.roi_array = roi_slice_array
 
     def _plot(self, ax, data):
         new_plot = ax.imshow(data)
         return new_plot
 
+    def update_supported(self, plot, data):
+        return isinstance(plot, AxesImage) and plot.get_array().shape == np.shape(data)
+
+    def _update_plot(self, ax, plot, data):
+        plot.set_data(data)
+
     def generic_plot_adjustments_single(self, ax, data_plot, *, data_min, data_max, **kwargs):
         data_plot.set_clim(vmin=data_min, vmax=data_max)
 
@@ -1,5 +1,6 @@
 import numpy as np
 from pathlib import Path
+from contextlib import contextmanager, nullcontext
 from ..datatool import DataTool
 
 
@@ -8,12 +9,16 @@ class Reporter(DataTool):
     LAYOUT_VERTICAL = 'vertical'
     LAYOUT_GRID = 'grid'
 
-    def __init__(self, *, name, reporter_type, datafield_name_list, layout, save_data, close_plots=False):
+    def __init__(self, *, name, reporter_type, datafield_name_list, layout, save_data, close_plots=False,
+                 save_dpi=None, save_format='png', headless_save=False):
         super(Reporter, self).__init__(name=name, datatool_type=reporter_type)
         self.datafield_name_list = datafield_name_list
         self.layout = layout
         self.save_data = save_data
         self.close_plots = close_plots
+        self.save_dpi = save_dpi
+        self.save_format = save_format
+        self.headless_save = headless_save
 
         self.num_datafields = len(self.datafield_name_list)
         self.num_rows, self.num_cols = get_layout(self.num_datafields, layout)
@@ -23,6 +28,82 @@ class Reporter(DataTool):
         super(Reporter, self).link_within_datamodel()
         self.save_path = Path(Path.cwd(), 'reporters', self.name)
 
+    def lock_figure(self, fig):
+        """ Context within which fig is modified. With headless_save fig is locked so that the HeadlessSaver doesn't
+        take a snapshot of fig while it is modified."""
+        if self.headless_save and self.save_data:
+            return self.datamodel.get_headless_saver().lock_figure(fig)
+        return nullcontext()
+
+    def save_figure(self, fig, file_path, blit_manager=None):
+        """ Save fig to file_path with save_dpi and save_format. With headless_save fig is handed to the HeadlessSaver
+        of the DataModel, which takes a snapshot of fig and renders it in a worker process off the calling thread."""
+        if self.headless_save:
+            self.datamodel.get_headless_saver().submit(fig, file_path, save_format=self.save_format, dpi=self.save_dpi)
+        else:
+            context = blit_manager.static_artists() if blit_manager is not None else nullcontext()
+            with context:
+                fig.savefig(file_path, bbox_inches='tight', format=self.save_format, dpi=self.save_dpi)
+
+
+class BlitManager:
+    """ Redraw a fixed list of artists of a figure on top of a cached background (matplotlib blitting).
+
+    The artists are marked as animated so that they are excluded from regular draws of the figure. After every full draw
+    of the figure (e.g. after a resize) the background is captured and the artists are drawn on top. update() restores
+    the background, draws only the artists and blits the figure area to the screen. Backends without blitting support
+    fall back to an idle redraw of the full figure.
+    """
+    def __init__(self, fig, artist_list):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.background = None
+        self.artist_list = []
+        for artist in artist_list:
+            artist.set_animated(True)
+            self.artist_list.append(artist)
+        self.draw_cid = self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artist_list:
+            self.fig.draw_artist(artist)
+
+    def update(self):
+        if not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+        elif self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    @contextmanager
+    def static_artists(self):
+        """ Temporarily include the artists in regular draws of the figure, e.g. while saving it. The background is
+        captured again on the next update."""
+        self.canvas.mpl_disconnect(self.draw_cid)
+        for artist in self.artist_list:
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in self.artist_list:
+                artist.set_animated(True)
+            self.background = None
+            self.draw_cid = self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self.draw_cid)
+        for artist in self.artist_list:
+            artist.set_animated(False)
+        self.artist_list = []
+
 
 def get_plot_limits(data_min, data_max, expansion_factor=1.1, min_lim=None, max_lim=None):
     range_span = data_max - data_min
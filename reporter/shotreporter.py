@@ -1,23 +1,37 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
+from matplotlib.image import AxesImage
 from pathlib import Path
 from ..datatool import ShotHandler, DataTool
-from .reporter import Reporter, get_plot_limits
+from .reporter import Reporter, BlitManager, get_plot_limits
 from ..utils import get_data_min_max, get_shot_labels
 
 
 class ShotReporter(Reporter, ShotHandler):
-    def __init__(self, *, name, datafield_name_list, layout, save_data, min_lim=None, max_lim=None):
+    """ Reporter which plots the data of a single shot.
+
+    The first report creates the plots. Later reports update the existing artists in place through _update_plot if
+    update_supported returns True for every plot, otherwise all axes are cleared and re-plotted. With BLIT = True the
+    updated artists are redrawn with blitting instead of redrawing the full figure.
+    With save_data every report is saved with save_dpi and save_format, in a worker process if headless_save is set.
+    """
+    BLIT = False
+
+    def __init__(self, *, name, datafield_name_list, layout, save_data, min_lim=None, max_lim=None, save_dpi=None,
+                 save_format='png', headless_save=False):
         super(ShotReporter, self).__init__(name=name, reporter_type=DataTool.SINGLE_SHOT_REPORTER,
                                            datafield_name_list=datafield_name_list, layout=layout,
-                                           save_data=save_data)
+                                           save_data=save_data, save_dpi=save_dpi, save_format=save_format,
+                                           headless_save=headless_save)
         self.min_lim = min_lim
         self.max_lim = max_lim
         self.fig = None
         self.ax_list = []
         self.plot_list = []
         self.figs_made = False
+        self.suptitle = None
+        self.blit_manager = None
 
     def make_figs(self):
         self.fig = plt.figure(self.name, figsize=(3 * self.num_cols, 3 * self.num_rows))
@@ -32,18 +46,48 @@ class ShotReporter(Reporter, ShotHandler):
     def _handle(self, shot_num):
         if not self.figs_made:
             self.make_figs()
-        self._report(shot_num)
+        with self.lock_figure(self.fig):
+            self._report(shot_num)
         if self.save_data:
             self.save(shot_num)
 
     def _report(self, shot_num):
+        data_list = [self.datamodel.get_data(datafield_name, shot_num) for datafield_name in self.datafield_name_list]
+        shot_key, loop_key, point_key = get_shot_labels(shot_num, self.datamodel.num_points)
+        title = f'{shot_key} - {loop_key} - {point_key}'
+        if len(self.plot_list) == self.num_datafields and self.suptitle is not None and all(
+                self.update_supported(plot, data) for plot, data in zip(self.plot_list, data_list)):
+            self.update_report(data_list, title)
+        else:
+            self.full_report(data_list, title)
+
+    def update_report(self, data_list, title):
+        data_min = np.inf
+        data_max = - np .inf
+        for datafield_num, data in enumerate(data_list):
+            self._update_plot(self.ax_list[datafield_num], self.plot_list[datafield_num], data)
+            new_min, new_max = get_data_min_max(data)
+            data_min = min(data_min, new_min)
+            data_max = max(data_max, new_max)
+        self.generic_plot_adjustments(data_min=data_min, data_max=data_max)
+        self.suptitle.set_text(title)
+        if self.blit_manager is not None:
+            self.blit_manager.update()
+        else:
+            self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
+
+    def full_report(self, data_list, title):
+        if self.blit_manager is not None:
+            self.blit_manager.disconnect()
+            self.blit_manager = None
         self.fig.set_size_inches(3 * self.num_cols, 3 * self.num_rows)
         data_min = np.inf
         data_max = - np .inf
         for datafield_num, datafield_name in enumerate(self.datafield_name_list):
             ax = self.ax_list[datafield_num]
             ax.clear()
-            data = self.datamodel.get_data(datafield_name, shot_num)
+            data = data_list[datafield_num]
             new_plot = self._plot(ax, data)
             self.specific_plot_adjustments(ax, new_plot, datafield_name)
             try:
@@ -55,9 +99,10 @@ class ShotReporter(Reporter, ShotHandler):
             data_max = max(data_max, new_max)
             ax.set_title(datafield_name)
         self.generic_plot_adjustments(data_min=data_min, data_max=data_max)
-        shot_key, loop_key, point_key = get_shot_labels(shot_num, self.datamodel.num_points)
-        self.fig.suptitle(f'{shot_key} - {loop_key} - {point_key}')
+        self.suptitle = self.fig.suptitle(title)
         self.fig.set_tight_layout({'rect': [0, 0.03, 1, 0.95]})
+        if self.BLIT:
+            self.blit_manager = BlitManager(self.fig, self.plot_list + [self.suptitle])
         plt.pause(0.005)
 
     def specific_plot_adjustments(self, ax, new_plot, datafield_name):
@@ -66,6 +111,12 @@ class ShotReporter(Reporter, ShotHandler):
     def _plot(self, ax, data):
         raise NotImplementedError
 
+    def update_supported(self, plot, data):
+        return False
+
+    def _update_plot(self, ax, plot, data):
+        raise NotImplementedError
+
     def generic_plot_adjustments(self, *, data_min, data_max, **kwargs):
         plot_min, plot_max = get_plot_limits(data_min, data_max, min_lim=self.min_lim, max_lim=self.max_lim)
         for axis_num, ax in enumerate(self.ax_list):
@@ -77,23 +128,33 @@ class ShotReporter(Reporter, ShotHandler):
 
     def save(self, shot_num):
         shot_key, loop_key, point_key = get_shot_labels(shot_num, self.datamodel.num_points)
-        file_name = f'{self.name} - {loop_key} - {shot_key} - {point_key} .png'
+        file_name = f'{self.name} - {loop_key} - {shot_key} - {point_key} .{self.save_format}'
         shot_save_path = Path(self.save_path, point_key)
         shot_save_path.mkdir(parents=True, exist_ok=True)
         file_path = Path(shot_save_path, file_name)
-        self.fig.savefig(file_path, bbox_inches='tight')
+        self.save_figure(self.fig, file_path, blit_manager=self.blit_manager)
 
 
 class ImageShotReporter(ShotReporter):
-    def __init__(self, *, name, datafield_name_list, layout, save_data, roi_dict):
+    BLIT = True
+
+    def __init__(self, *, name, datafield_name_list, layout, save_data, roi_dict, save_dpi=None, save_format='png',
+                 headless_save=False):
         super(ImageShotReporter, self).__init__(name=name, datafield_name_list=datafield_name_list, layout=layout,
-                                                save_data=save_data)
+                                                save_data=save_data, save_dpi=save_dpi, save_format=save_format,
+                                                headless_save=headless_save)
         self.roi_dict = roi_dict
 
     def _plot(self, ax, data):
         new_plot = ax.imshow(data)
         return new_plot
 
+    def update_supported(self, plot, data):
+        return isinstance(plot, AxesImage) and plot.get_array().shape == np.shape(data)
+
+    def _update_plot(self, ax, plot, data):
+        plot.set_data(data)
+
     def generic_plot_adjustments_single(self, ax, data_plot, *, data_min, data_max, **kwargs):
         data_plot.set_clim(vmin=data_min, vmax=data_max)
 
@@ -0,0 +1,101 @@
+import pickle
+import struct
+import threading
+from collections.abc import MutableMapping
+
+SECTION_FILE_MAGIC = b'E6DFSEC1'
+SECTION_FILE_TRAILER = struct.Struct('<Q8s')
+
+
+def dump_section(data_file, data):
+    """ Pickle data into data_file as its own section and return the offset of the section."""
+    offset = data_file.tell()
+    pickle.dump(data, data_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return offset
+
+
+def dump_header(data_file, header):
+    """ Pickle header and append the trailer which points to it. Must be the last write to data_file."""
+    header_offset = dump_section(data_file, header)
+    data_file.write(SECTION_FILE_TRAILER.pack(header_offset, SECTION_FILE_MAGIC))
+
+
+def load_header(data_file):
+    """ Return the header of a sectioned file or None if data_file is a plain pickle file."""
+    data_file.seek(0, 2)
+    file_size = data_file.tell()
+    if file_size < SECTION_FILE_TRAILER.size:
+        return None
+    data_file.seek(file_size - SECTION_FILE_TRAILER.size)
+    header_offset, magic = SECTION_FILE_TRAILER.unpack(data_file.read(SECTION_FILE_TRAILER.size))
+    if magic != SECTION_FILE_MAGIC:
+        return None
+    data_file.seek(header_offset)
+    return pickle.load(data_file)
+
+
+def load_section(file_path, offset):
+    with open(file_path, 'rb') as data_file:
+        data_file.seek(offset)
+        return pickle.load(data_file)
+
+
+class LazySectionDict(MutableMapping):
+    """ dict whose values are sections of a sectioned file which are only unpickled on first access.
+
+    section_offset_dict maps keys to the offset of their section in file_path. Once loaded a value is held like in a
+    regular dict. Functions registered with defer(key, func) are called after the value of key has been loaded, this
+    is used to apply changes to the loaded value, such as journaled data, without loading it up front. Replacing or
+    deleting a key never reads its section.
+    """
+    def __init__(self, *, file_path, section_offset_dict):
+        self.file_path = file_path
+        self.section_offset_dict = dict(section_offset_dict)
+        self.loaded_dict = dict()
+        self.deferred_dict = dict()
+        self.lock = threading.RLock()
+
+    def is_loaded(self, key):
+        return key in self.loaded_dict
+
+    def defer(self, key, func):
+        with self.lock:
+            if key in self.section_offset_dict:
+                self.deferred_dict.setdefault(key, []).append(func)
+            else:
+                func()
+
+    def __getitem__(self, key):
+        if key in self.loaded_dict:
+            return self.loaded_dict[key]
+        with self.lock:
+            if key not in self.loaded_dict:
+                self.loaded_dict[key] = load_section(self.file_path, self.section_offset_dict[key])
+                del self.section_offset_dict[key]
+                for func in self.deferred_dict.pop(key, []):
+                    func()
+        return self.loaded_dict[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.section_offset_dict.pop(key, None)
+            self.deferred_dict.pop(key, None)
+            self.loaded_dict[key] = value
+
+    def __delitem__(self, key):
+        with self.lock:
+            if key in self.section_offset_dict:
+                del self.section_offset_dict[key]
+                self.deferred_dict.pop(key, None)
+            else:
+                del self.loaded_dict[key]
+
+    def __contains__(self, key):
+        return key in self.loaded_dict or key in self.section_offset_dict
+
+    def __iter__(self):
+        yield from list(self.loaded_dict)
+        yield from list(self.section_offset_dict)
+
+    def __len__(self):
+        return len(self.loaded_dict) + len(self.section_offset_dict)
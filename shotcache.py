@@ -0,0 +1,101 @@
+import threading
+import numpy as np
+
+
+class ShotDataCache:
+    """ Memoization of DataField reads for the shot currently being handled by the DataModel.
+
+    The cache only holds data for shot_num, the shot which the DataModel is currently running. set_shot drops all
+    cached data when the DataModel advances to the next shot. The cache holds full frames only, a region of a shot is
+    sliced out of the cached full frame. Cached arrays are private to the cache and read-only, get always returns a
+    writeable copy (or copies into out) so that consumers may modify the data they receive in place. Data is not
+    cached once the cached data would exceed max_bytes.
+
+    When set_shot advances to the next shot the cached frames of the previous shot are kept as per-datafield buffers.
+    get_buffer hands them out so that the next shot can be read into them with out= rather than into newly allocated
+    arrays. clear drops the cached data and the buffers.
+    """
+    def __init__(self, *, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.shot_num = None
+        self.cache_dict = dict()
+        self.buffer_dict = dict()
+        self.num_cached_bytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.lock = threading.Lock()
+
+    def set_shot(self, shot_num):
+        with self.lock:
+            self.shot_num = shot_num
+            self.buffer_dict = dict()
+            for key, data in self.cache_dict.items():
+                # Only arrays owning their memory can be made writeable again.
+                if data.base is None:
+                    data.flags.writeable = True
+                    self.buffer_dict[key] = data
+            self.cache_dict = dict()
+            self.num_cached_bytes = 0
+
+    def clear(self):
+        self.set_shot(None)
+        with self.lock:
+            self.buffer_dict = dict()
+
+    def get_buffer(self, datafield_name, dtype=None):
+        """ Return an array, previously used to cache the data of datafield_name, to read new data into or None."""
+        dtype_key = None if dtype is None else str(dtype)
+        with self.lock:
+            return self.buffer_dict.pop((datafield_name, dtype_key), None)
+
+    def get(self, datafield_name, shot_num, region=None, dtype=None, out=None):
+        """ Return a copy of the cached data (restricted to region) or None if the data is not cached. If out is given
+        the cached data is copied into out and out is returned."""
+        if shot_num != self.shot_num:
+            return None
+        dtype_key = None if dtype is None else str(dtype)
+        with self.lock:
+            data = self.cache_dict.get((datafield_name, dtype_key))
+            if data is None:
+                self.num_misses += 1
+                return None
+            self.num_hits += 1
+        if region is not None:
+            data = data[region]
+        if out is not None:
+            out[...] = data
+            return out
+        return data.copy()
+
+    def put(self, datafield_name, shot_num, data, dtype=None, copy=True):
+        """ Cache data, the full frame of datafield_name for shot_num. If copy is False the cache takes ownership of
+        data which must then not be modified by the caller. Returns True if the data was cached."""
+        if shot_num != self.shot_num or not isinstance(data, np.ndarray):
+            return False
+        dtype_key = None if dtype is None else str(dtype)
+        with self.lock:
+            if self.num_cached_bytes + data.nbytes > self.max_bytes:
+                return False
+            if copy:
+                data = data.copy()
+            data.flags.writeable = False
+            old_data = self.cache_dict.pop((datafield_name, dtype_key), None)
+            if old_data is not None:
+                self.num_cached_bytes -= old_data.nbytes
+            self.cache_dict[(datafield_name, dtype_key)] = data
+            self.num_cached_bytes += data.nbytes
+        return True
+
+    def invalidate(self, datafield_name, shot_num):
+        if shot_num != self.shot_num:
+            return
+        with self.lock:
+            for key in [key for key in self.cache_dict if key[0] == datafield_name]:
+                self.num_cached_bytes -= self.cache_dict.pop(key).nbytes
+
+    def get_stats(self):
+        return {'hits': self.num_hits, 'misses': self.num_misses, 'cached_bytes': self.num_cached_bytes}
+
+    def reset_stats(self):
+        self.num_hits = 0
+        self.num_misses = 0
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+
+class ShotWatcher:
+    """ Incrementally discover new shot files in a raw data directory.
+
+    Rather than listing the whole directory on every poll the watcher remembers num_shots, the number of contiguous
+    shots (starting at shot 0) which have been found so far, and only checks whether the next expected shot file
+    exists. A shot file is only reported once its modification time is at least settle_time seconds in the past so
+    that files which are still being written are never reported.
+    """
+    def __init__(self, *, data_path, file_prefix, settle_time=1.0):
+        self.data_path = Path(data_path)
+        self.file_prefix = file_prefix
+        self.settle_time = settle_time
+        self.num_shots = 0
+
+    def get_shot_file_path(self, shot_num):
+        return Path(self.data_path, f'{self.file_prefix}_{shot_num:05d}.h5')
+
+    def get_shot_num(self, file_name):
+        stem, suffix = os.path.splitext(file_name)
+        prefix, _, shot_string = stem.rpartition('_')
+        if suffix != '.h5' or prefix != self.file_prefix or not shot_string.isdigit():
+            return None
+        return int(shot_string)
+
+    def is_shot_ready(self, shot_num):
+        try:
+            file_stat = self.get_shot_file_path(shot_num).stat()
+        except FileNotFoundError:
+            return False
+        return time.time() - file_stat.st_mtime >= self.settle_time
+
+    def poll(self):
+        """ Return a list of shot numbers which have become ready since the last poll."""
+        new_shot_list = []
+        while self.is_shot_ready(self.num_shots):
+            new_shot_list.append(self.num_shots)
+            self.num_shots += 1
+        return new_shot_list
+
+    def close(self):
+        pass
+
+
+class InotifyShotWatcher(ShotWatcher):
+    """ ShotWatcher which uses Linux inotify events to detect when shot files are created and closed by the writer.
+
+    Files which are created while the watcher is active are reported as soon as the writer closes them. Files which
+    were already present when the watch was started fall back to the settle_time check of ShotWatcher.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, *, data_path, file_prefix, settle_time=1.0):
+        super(InotifyShotWatcher, self).__init__(data_path=data_path, file_prefix=file_prefix,
+                                                 settle_time=settle_time)
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError('Unable to locate libc for inotify.')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.inotify_fd = None
+        self.closed_shots = set()
+        self.writing_shots = set()
+        self.start_watch()
+
+    def start_watch(self):
+        # The data directory may not exist until the first shot is written.
+        if self.inotify_fd is not None or not self.data_path.is_dir():
+            return
+        inotify_fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if inotify_fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        watch_descriptor = self.libc.inotify_add_watch(inotify_fd, os.fsencode(self.data_path), mask)
+        if watch_descriptor < 0:
+            errno = ctypes.get_errno()
+            os.close(inotify_fd)
+            raise OSError(errno, os.strerror(errno))
+        self.inotify_fd = inotify_fd
+
+    def read_events(self):
+        if self.inotify_fd is None:
+            return
+        while True:
+            try:
+                buffer = os.read(self.inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, name_length = self.EVENT_HEADER.unpack_from(buffer, offset)
+                offset += self.EVENT_HEADER.size
+                file_name = buffer[offset:offset + name_length].rstrip(b'\0').decode(errors='replace')
+                offset += name_length
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost, fall back on the settle_time check for any file still marked as writing.
+                    self.writing_shots.clear()
+                    continue
+                shot_num = self.get_shot_num(file_name)
+                if shot_num is None or shot_num < self.num_shots:
+                    continue
+                if mask & self.IN_CREATE:
+                    self.writing_shots.add(shot_num)
+                if mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                    self.writing_shots.discard(shot_num)
+                    self.closed_shots.add(shot_num)
+
+    def is_shot_ready(self, shot_num):
+        if shot_num in self.closed_shots:
+            return True
+        if shot_num in self.writing_shots:
+            return False
+        return super(InotifyShotWatcher, self).is_shot_ready(shot_num)
+
+    def poll(self):
+        self.start_watch()
+        self.read_events()
+        new_shot_list = super(InotifyShotWatcher, self).poll()
+        for shot_num in new_shot_list:
+            self.closed_shots.discard(shot_num)
+            self.writing_shots.discard(shot_num)
+        return new_shot_list
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+
+def get_shot_watcher(*, data_path, file_prefix, settle_time=1.0):
+    """ Return an InotifyShotWatcher on Linux if inotify is available, otherwise a polling ShotWatcher."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyShotWatcher(data_path=data_path, file_prefix=file_prefix, settle_time=settle_time)
+        except (OSError, AttributeError) as e:
+            print(f'Unable to start inotify watcher ({e}), falling back to polling.')
+    return ShotWatcher(data_path=data_path, file_prefix=file_prefix, settle_time=settle_time)
@@ -0,0 +1,66 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import h5py
+import pytest
+import matplotlib
+
+matplotlib.use('Agg')
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+try:
+    import e6dataflow  # noqa: F401
+except ImportError:
+    # The repository root is the e6dataflow package itself. When it is not installed, make it importable under its
+    # package name through a symlink. sys.path is inherited by the spawned worker processes used by backfill and
+    # headless saving, so they can import it as well.
+    package_parent_dir = tempfile.mkdtemp(prefix='e6dataflow-tests-')
+    atexit.register(shutil.rmtree, package_parent_dir, ignore_errors=True)
+    os.symlink(REPO_ROOT, Path(package_parent_dir, 'e6dataflow'))
+    sys.path.insert(0, package_parent_dir)
+
+from e6dataflow.datamodel import DataModel  # noqa: E402
+from e6dataflow.datastream import DataStream  # noqa: E402
+from e6dataflow.datafield import DataStreamDataField, DataDictShotDataField  # noqa: E402
+
+RUN_NAME = 'run0'
+NUM_POINTS = 3
+FRAME_SHAPE = (32, 40)
+FILE_PREFIX = 'jkam_capture'
+
+
+def make_frame(shot_num):
+    rng = np.random.default_rng(shot_num)
+    y, x = np.indices(FRAME_SHAPE)
+    frame = 100 + 500 * np.exp(-((x - 20) ** 2 + (y - 12) ** 2) / (2 * 3 ** 2)) + rng.normal(0, 5, FRAME_SHAPE)
+    return frame.astype(np.uint16)
+
+
+def write_shots(daily_path, num_shots, start_shot=0):
+    data_path = Path(daily_path, 'data', RUN_NAME, 'cam')
+    data_path.mkdir(parents=True, exist_ok=True)
+    for shot_num in range(start_shot, num_shots):
+        with h5py.File(Path(data_path, f'{FILE_PREFIX}_{shot_num:05d}.h5'), 'w') as h5_file:
+            h5_file['frame-00'] = make_frame(shot_num)
+
+
+def build_datamodel(root, **datamodel_kwargs):
+    datamodel = DataModel(run_name=RUN_NAME, num_points=NUM_POINTS, run_doc_string='test run', datamodel_dir=root,
+                          **datamodel_kwargs)
+    datamodel.add_datatool(DataStream(name='cam', daily_path=Path(root, 'daily'), run_name=RUN_NAME,
+                                      file_prefix=FILE_PREFIX), quiet=True)
+    datamodel.add_datatool(DataStreamDataField(name='frame', datastream_name='cam', h5_subpath=None,
+                                               h5_dataset_name='frame-00'), quiet=True)
+    return datamodel
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_shots(Path(tmp_path, 'daily'), 9)
+    return tmp_path
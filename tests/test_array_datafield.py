@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from e6dataflow.datafield import ArrayShotDataField
+from conftest import build_datamodel, NUM_POINTS
+
+NUM_SHOTS = 9
+
+
+@pytest.fixture
+def datamodel(run_dir):
+    datamodel = build_datamodel(run_dir)
+    datamodel.add_datatool(ArrayShotDataField(name='counts', initial_capacity=4), quiet=True)
+    datamodel.add_datatool(ArrayShotDataField(name='num_atoms', dtype=int), quiet=True)
+    datamodel.add_datatool(ArrayShotDataField(name='vector', shape=(3,)), quiet=True)
+    datamodel.link_datatools()
+    datamodel.num_shots = NUM_SHOTS
+    for shot_num in range(NUM_SHOTS):
+        datamodel.set_data('counts', shot_num, 10.0 * shot_num)
+        datamodel.set_data('vector', shot_num, np.arange(3) + shot_num)
+        # Shot 4 (point 1) is missing.
+        if shot_num != 4:
+            datamodel.set_data('num_atoms', shot_num, shot_num)
+    return datamodel
+
+
+def test_point_data_is_read_only_view(datamodel):
+    point_data = datamodel.get_data_by_point('counts', 1)
+    np.testing.assert_array_equal(point_data, [10, 40, 70])
+    assert not point_data.flags.writeable
+    with pytest.raises(ValueError):
+        point_data[0] = -1
+    assert datamodel.get_data('counts', 1) == 10
+
+
+def test_missing_shots_are_not_zeros(datamodel):
+    datamodel.set_data('counts', 11, 110.0)
+    datamodel.num_shots = 12
+    # Shot 9 (point 0) was never set and is NaN, not 0.
+    np.testing.assert_array_equal(datamodel.get_data_by_point('counts', 0), [0, 30, 60, np.nan])
+    np.testing.assert_array_equal(datamodel.get_data_by_point('counts', 2), [20, 50, 80, 110])
+    datamodel.num_shots = NUM_SHOTS
+    datamodel.datatool_dict['counts'].datafield_dict['valid'][5] = False
+    np.testing.assert_array_equal(datamodel.get_data_by_point('counts', 2), [20, np.nan, 80])
+    # Integer data has no NaN, the missing shot is left out.
+    np.testing.assert_array_equal(datamodel.get_data_by_point('num_atoms', 1), [1, 7])
+    np.testing.assert_array_equal(datamodel.get_data_by_point('num_atoms', 0), [0, 3, 6])
+    with pytest.raises(KeyError):
+        datamodel.get_data('num_atoms', 4)
+
+
+def test_get_data_returns_copy(datamodel):
+    vector = datamodel.get_data('vector', 2)
+    vector[:] = -1
+    np.testing.assert_array_equal(datamodel.get_data('vector', 2), [2, 3, 4])
+    assert datamodel.get_data_by_point('vector', 0).shape == (NUM_SHOTS // NUM_POINTS, 3)
@@ -0,0 +1,66 @@
+from pathlib import Path
+import numpy as np
+from e6dataflow.processor import CountsProcessor, ThresholdProcessor, GaussianFitProcessor
+from e6dataflow.aggregator import AvgStdAggregator
+from e6dataflow.datafield import DataDictShotDataField, DataDictPointDataField
+from conftest import build_datamodel, write_shots, NUM_POINTS
+
+SHOT_DATAFIELD_NAMES = ['counts', 'verified', 'x0', 'sx']
+
+
+def build_pipeline(root, warm_start=True):
+    write_shots(Path(root, 'daily'), 12)
+    datamodel = build_datamodel(root)
+    for datafield_name in SHOT_DATAFIELD_NAMES:
+        datamodel.add_datatool(DataDictShotDataField(name=datafield_name), quiet=True)
+    for datafield_name in ['mean', 'std']:
+        datamodel.add_datatool(DataDictPointDataField(name=datafield_name), quiet=True)
+    roi_slice = (slice(4, 20), slice(12, 28))
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts', roi_slice=[roi_slice] * NUM_POINTS),
+                           quiet=True)
+    datamodel.add_datatool(ThresholdProcessor(name='threshold_processor', input_datafield_name='counts',
+                                              output_datafield_name='verified', threshold_value=0), quiet=True)
+    datamodel.add_datatool(GaussianFitProcessor(name='fit_processor', frame_datafield_name='frame',
+                                                roi_slice=roi_slice, output_x0_datafield_name='x0',
+                                                output_sx_datafield_name='sx', warm_start=warm_start), quiet=True)
+    datamodel.add_datatool(AvgStdAggregator(name='aggregator', verifier_datafield_names=['verified'],
+                                            input_datafield_name='counts', output_mean_datafield_name='mean',
+                                            output_std_datafield_name='std'), quiet=True)
+    datamodel.link_datatools()
+    return datamodel
+
+
+def run_pipeline(root, **run_kwargs):
+    datamodel = build_pipeline(root)
+    datamodel.run(quiet=True, handler_quiet=True, **run_kwargs)
+    return datamodel
+
+
+def test_warm_start_fit_is_not_parallelizable():
+    fit_processor_kwargs = dict(name='fit_processor', frame_datafield_name='frame',
+                                roi_slice=(slice(0, 8), slice(0, 8)))
+    assert CountsProcessor.PARALLELIZABLE
+    assert not GaussianFitProcessor(**fit_processor_kwargs).is_parallelizable()
+    assert GaussianFitProcessor(warm_start=False, **fit_processor_kwargs).is_parallelizable()
+
+
+def test_backfill_matches_serial_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    serial_datamodel = run_pipeline(Path(tmp_path, 'serial'))
+    backfill_datamodel = run_pipeline(Path(tmp_path, 'backfill'), num_processes=2, backfill_chunk_size=2)
+
+    num_shots = serial_datamodel.num_shots
+    assert backfill_datamodel.num_shots == num_shots
+    assert backfill_datamodel.last_handled_shot == num_shots - 1
+    for datafield_name in SHOT_DATAFIELD_NAMES:
+        serial_data = np.array(serial_datamodel.get_data(datafield_name, list(range(num_shots))), dtype=float)
+        backfill_data = np.array(backfill_datamodel.get_data(datafield_name, list(range(num_shots))), dtype=float)
+        np.testing.assert_array_equal(backfill_data, serial_data, err_msg=datafield_name)
+    for datafield_name in ['mean', 'std']:
+        for point_num in range(NUM_POINTS):
+            assert (backfill_datamodel.get_data(datafield_name, point_num)
+                    == serial_datamodel.get_data(datafield_name, point_num))
+    fit_processor = backfill_datamodel.datatool_dict['fit_processor']
+    assert fit_processor.handled_shots == set(range(num_shots))
+    assert set(fit_processor.warm_start_dict) == set(range(NUM_POINTS))
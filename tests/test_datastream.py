@@ -0,0 +1,52 @@
+from pathlib import Path
+import numpy as np
+from e6dataflow.datamodel import DataModel
+from e6dataflow.datastream import DataStream
+from conftest import RUN_NAME, NUM_POINTS, FILE_PREFIX, make_frame
+
+
+def build_watching_datamodel(root):
+    datamodel = DataModel(run_name=RUN_NAME, num_points=NUM_POINTS, run_doc_string='test run', datamodel_dir=root)
+    datamodel.add_datatool(DataStream(name='cam', daily_path=Path(root, 'daily'), run_name=RUN_NAME,
+                                      file_prefix=FILE_PREFIX, discovery_mode=DataStream.DISCOVERY_WATCH,
+                                      settle_time=0), quiet=True)
+    datamodel.link_datatools()
+    return datamodel
+
+
+def test_run_closes_shot_watchers(run_dir):
+    datamodel = build_watching_datamodel(run_dir)
+    datastream = datamodel.datatool_dict['cam']
+    datamodel.run(quiet=True, handler_quiet=True, keep_shot_watchers=True)
+    assert datamodel.num_shots == 9
+    shot_watcher = datastream.shot_watcher
+    assert shot_watcher is not None
+    datamodel.run(quiet=True, handler_quiet=True, keep_shot_watchers=True)
+    assert datastream.shot_watcher is shot_watcher
+    datamodel.run(quiet=True, handler_quiet=True)
+    assert datastream.shot_watcher is None
+    assert getattr(shot_watcher, 'inotify_fd', None) is None
+    assert datastream.open_file_dict == {}
+
+
+def test_close_datastreams_closes_shot_watchers(run_dir):
+    datamodel = build_watching_datamodel(run_dir)
+    datastream = datamodel.datatool_dict['cam']
+    datamodel.get_num_shots()
+    assert datastream.shot_watcher is not None
+    datamodel.close_datastreams(close_shot_watchers=False)
+    assert datastream.shot_watcher is not None
+    datamodel.close_datastreams()
+    assert datastream.shot_watcher is None
+
+
+def test_standalone_datastream_loads_shots(run_dir):
+    datastream = DataStream(name='cam', daily_path=Path(run_dir, 'daily'), run_name=RUN_NAME, file_prefix=FILE_PREFIX,
+                            max_open_files=2)
+    assert datastream.count_shots() == 9
+    for shot_num in [0, 1, 2, 0]:
+        with datastream.load_shot(shot_num) as h5_file:
+            np.testing.assert_array_equal(h5_file['frame-00'][()], make_frame(shot_num))
+    assert datastream.get_cache_stats() == {'hits': 0, 'misses': 4, 'open_files': 2}
+    datastream.close_shot_files()
+    assert datastream.open_file_dict == {}
@@ -0,0 +1,77 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from e6dataflow.datafield import DataDictShotDataField, DataDictPointDataField
+from e6dataflow.processor import CountsProcessor, ThresholdProcessor
+from e6dataflow.aggregator import AvgStdAggregator
+from e6dataflow.export import ColumnarRun, EXPORT_FORMAT_NPY, EXPORT_FORMAT_H5
+from conftest import build_datamodel, NUM_POINTS
+
+
+@pytest.fixture
+def datamodel(run_dir):
+    datamodel = build_datamodel(run_dir)
+    for datafield_name in ['counts', 'verified', 'sparse', 'vector', 'ragged', 'label']:
+        datamodel.add_datatool(DataDictShotDataField(name=datafield_name), quiet=True)
+    for datafield_name in ['mean', 'std']:
+        datamodel.add_datatool(DataDictPointDataField(name=datafield_name), quiet=True)
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts',
+                                           roi_slice=[(slice(4, 20), slice(12, 28))] * NUM_POINTS), quiet=True)
+    datamodel.add_datatool(ThresholdProcessor(name='threshold_processor', input_datafield_name='counts',
+                                              output_datafield_name='verified', threshold_value=0), quiet=True)
+    datamodel.add_datatool(AvgStdAggregator(name='aggregator', verifier_datafield_names=['verified'],
+                                            input_datafield_name='counts', output_mean_datafield_name='mean',
+                                            output_std_datafield_name='std'), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    for shot_num in range(datamodel.num_shots):
+        if shot_num % 2 == 0:
+            datamodel.set_data('sparse', shot_num, np.int32(shot_num))
+        datamodel.set_data('vector', shot_num, np.arange(3, dtype=np.float32) * shot_num)
+        datamodel.set_data('ragged', shot_num, np.zeros(shot_num % 2 + 1))
+        datamodel.set_data('label', shot_num, f'shot {shot_num}')
+    return datamodel
+
+
+@pytest.mark.parametrize('export_format', [EXPORT_FORMAT_NPY, EXPORT_FORMAT_H5])
+def test_export_round_trip(datamodel, export_format):
+    export_path = datamodel.export(export_format=export_format)
+    columnar_run = ColumnarRun(export_path)
+    num_shots = datamodel.num_shots
+
+    assert columnar_run.metadata['num_shots'] == num_shots
+    assert columnar_run.metadata['num_points'] == NUM_POINTS
+    np.testing.assert_array_equal(columnar_run.shot_num, np.arange(num_shots))
+    np.testing.assert_array_equal(columnar_run.point_num, np.arange(num_shots) % NUM_POINTS)
+    np.testing.assert_array_equal(columnar_run.loop_num, np.arange(num_shots) // NUM_POINTS)
+    # Non-numeric DataFields and DataFields of varying shape are skipped, as is the raw frame.
+    assert set(columnar_run.shot_data) == {'counts', 'verified', 'sparse', 'vector'}
+    assert set(columnar_run.point_data) == {'mean', 'std'}
+
+    for datafield_name in ['counts', 'verified', 'vector']:
+        expected = np.array([datamodel.get_data(datafield_name, shot_num) for shot_num in range(num_shots)])
+        assert columnar_run.shot_valid[datafield_name].all()
+        assert columnar_run.shot_data[datafield_name].dtype == expected.dtype
+        np.testing.assert_array_equal(columnar_run.shot_data[datafield_name], expected)
+    for datafield_name in ['mean', 'std']:
+        expected = np.array([datamodel.get_data(datafield_name, point_num) for point_num in range(NUM_POINTS)])
+        np.testing.assert_array_equal(columnar_run.point_data[datafield_name], expected)
+
+    sparse_valid = np.arange(num_shots) % 2 == 0
+    np.testing.assert_array_equal(columnar_run.shot_valid['sparse'], sparse_valid)
+    np.testing.assert_array_equal(columnar_run.shot_data['sparse'][sparse_valid], np.arange(0, num_shots, 2))
+    assert columnar_run.shot_data['sparse'].dtype == np.int32
+    np.testing.assert_array_equal(columnar_run.shot_data['sparse'][~sparse_valid], 0)
+    np.testing.assert_array_equal(columnar_run.get_point_rows('counts', 1),
+                                  [datamodel.get_data('counts', shot_num) for shot_num in range(1, num_shots, 3)])
+
+
+def test_export_is_memory_mapped(datamodel):
+    npy_run = ColumnarRun(datamodel.export(export_format=EXPORT_FORMAT_NPY))
+    h5_run = ColumnarRun(datamodel.export(export_format=EXPORT_FORMAT_H5))
+    for columnar_run in [npy_run, h5_run]:
+        assert isinstance(columnar_run.shot_data['counts'], np.memmap)
+        assert not columnar_run.shot_data['counts'].flags.writeable
+    assert Path(npy_run.export_path, 'shot_data', 'counts.npy').exists()
+    assert not Path(npy_run.export_path, 'shot_data', 'ragged.npy').exists()
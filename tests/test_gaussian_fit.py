@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from e6dataflow.tools.smart_gaussian2d_fit import fit_gaussian2d, resolve_bin_factor
+from e6dataflow.processor import GaussianFitProcessor
+from e6dataflow.datafield import DataDictShotDataField
+from conftest import make_frame, build_datamodel
+
+
+@pytest.mark.parametrize('bin_factor', [0, 0.5, 1.5, 2.5, -2])
+def test_invalid_bin_factor_raises(bin_factor):
+    with pytest.raises(ValueError):
+        resolve_bin_factor(bin_factor=bin_factor)
+    with pytest.raises(ValueError):
+        fit_gaussian2d(make_frame(0).astype(float), bin_factor=bin_factor, show_plot=False)
+
+
+def test_integral_bin_factor_accepted():
+    assert resolve_bin_factor() == 1
+    assert resolve_bin_factor(bin_factor=2.0) == 2
+    assert resolve_bin_factor(bin_factor=np.int64(3)) == 3
+
+
+def test_zoom_and_bin_factor_conflict():
+    with pytest.raises(ValueError):
+        resolve_bin_factor(bin_factor=2, zoom=2)
+
+
+def test_zoom_is_deprecated_alias_of_bin_factor():
+    frame = make_frame(0).astype(float)
+    with pytest.warns(DeprecationWarning):
+        zoom_result = fit_gaussian2d(frame, zoom=2, show_plot=False, fix_angle=True, compact=True)
+    bin_result = fit_gaussian2d(frame, bin_factor=2, show_plot=False, fix_angle=True, compact=True)
+    np.testing.assert_array_equal(zoom_result.popt, bin_result.popt)
+    with pytest.warns(DeprecationWarning):
+        with pytest.raises(ValueError):
+            fit_gaussian2d(frame, zoom=0.5, show_plot=False)
+
+
+@pytest.mark.parametrize('bin_factor', [1, 2, 4])
+def test_coarse_to_fine_fit_recovers_center(bin_factor):
+    fit_result = fit_gaussian2d(make_frame(0).astype(float), bin_factor=bin_factor, show_plot=False, fix_angle=True,
+                                fix_lin_slope=True, compact=True)
+    assert fit_result.success
+    assert fit_result.get_val('x0') == pytest.approx(20, abs=0.2)
+    assert fit_result.get_val('y0') == pytest.approx(12, abs=0.2)
+    assert fit_result.get_val('sx') == pytest.approx(3, abs=0.2)
+
+
+@pytest.mark.parametrize('roi_slice', [np.s_[:, 10:30], np.s_[4:20, :], np.s_[:, :]])
+def test_fit_processor_roi_without_start(run_dir, roi_slice):
+    datamodel = build_datamodel(run_dir)
+    for datafield_name in ['x0', 'y0']:
+        datamodel.add_datatool(DataDictShotDataField(name=datafield_name), quiet=True)
+    datamodel.add_datatool(GaussianFitProcessor(name='fit_processor', frame_datafield_name='frame', roi_slice=roi_slice,
+                                                output_x0_datafield_name='x0', output_y0_datafield_name='y0'),
+                           quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    for shot_num in range(datamodel.num_shots):
+        assert datamodel.get_data('x0', shot_num) == pytest.approx(20, abs=0.2)
+        assert datamodel.get_data('y0', shot_num) == pytest.approx(12, abs=0.2)
+
+
+@pytest.mark.parametrize('roi_slice', [np.s_[-20:, 10:30], np.s_[0:20:2, 10:30]])
+def test_fit_processor_rejects_unsupported_roi(roi_slice):
+    with pytest.raises(ValueError):
+        GaussianFitProcessor(name='fit_processor', frame_datafield_name='frame', roi_slice=roi_slice)
@@ -0,0 +1,121 @@
+import pickle
+import threading
+import types
+import matplotlib.pyplot as plt
+import pytest
+import e6dataflow.reporter.headless as headless
+from e6dataflow.reporter.headless import HeadlessSaver
+from e6dataflow.reporter.shotreporter import ImageShotReporter
+from conftest import build_datamodel
+
+
+def make_fig():
+    fig, ax = plt.subplots()
+    ax.plot([0, 1, 2], [1, 3, 2])
+    return fig
+
+
+@pytest.fixture
+def fig():
+    fig = make_fig()
+    yield fig
+    plt.close(fig)
+
+
+def assert_png(file_path):
+    assert file_path.read_bytes().startswith(b'\x89PNG')
+
+
+def test_figures_are_saved(tmp_path):
+    fig_list = [make_fig() for _ in range(3)]
+    headless_saver = HeadlessSaver(max_workers=1, max_queue_size=4)
+    try:
+        for fig_num, fig in enumerate(fig_list):
+            assert headless_saver.submit(fig, tmp_path / f'figure_{fig_num}.png')
+        headless_saver.wait()
+    finally:
+        headless_saver.shutdown()
+        for fig in fig_list:
+            plt.close(fig)
+    assert headless_saver.num_saved == 3
+    assert headless_saver.num_dropped == 0
+    assert headless_saver.num_failed == 0
+    for fig_num in range(3):
+        assert_png(tmp_path / f'figure_{fig_num}.png')
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_snapshot_is_taken_off_the_calling_thread(tmp_path, fig, monkeypatch):
+    pickling_thread_list = []
+
+    def dumps(obj, protocol=None):
+        pickling_thread_list.append(threading.current_thread())
+        return pickle.dumps(obj, protocol=protocol)
+
+    monkeypatch.setattr(headless, 'pickle', types.SimpleNamespace(dumps=dumps, loads=pickle.loads,
+                                                                  HIGHEST_PROTOCOL=pickle.HIGHEST_PROTOCOL))
+    headless_saver = HeadlessSaver(max_workers=1)
+    try:
+        headless_saver.submit(fig, tmp_path / 'figure.png')
+        headless_saver.wait()
+    finally:
+        headless_saver.shutdown()
+    assert len(pickling_thread_list) == 1
+    assert pickling_thread_list[0] is not threading.current_thread()
+    assert_png(tmp_path / 'figure.png')
+
+
+def test_newer_request_replaces_waiting_request(tmp_path, fig):
+    headless_saver = HeadlessSaver(max_workers=1)
+    try:
+        # Holding the figure lock keeps the dispatcher from taking the snapshot.
+        with headless_saver.get_figure_lock(fig):
+            assert headless_saver.submit(fig, tmp_path / 'replaced.png')
+            assert headless_saver.submit(fig, tmp_path / 'kept.png')
+        headless_saver.wait()
+    finally:
+        headless_saver.shutdown()
+    assert headless_saver.num_saved == 1
+    assert headless_saver.num_dropped == 1
+    assert_png(tmp_path / 'kept.png')
+    assert not (tmp_path / 'replaced.png').exists()
+
+
+def test_full_queue_drops_without_blocking(tmp_path):
+    fig_list = [make_fig() for _ in range(3)]
+    headless_saver = HeadlessSaver(max_workers=1, max_queue_size=2)
+    try:
+        with headless_saver.get_figure_lock(fig_list[0]):
+            assert headless_saver.submit(fig_list[0], tmp_path / 'first.png')
+            assert headless_saver.submit(fig_list[1], tmp_path / 'second.png')
+            # Both requests still wait for their snapshot, so the queue is full.
+            assert not headless_saver.submit(fig_list[2], tmp_path / 'dropped.png')
+            # Modifying a figure drops its request which is still waiting for a snapshot.
+            with headless_saver.lock_figure(fig_list[1]):
+                fig_list[1].axes[0].set_title('modified')
+        headless_saver.wait()
+    finally:
+        headless_saver.shutdown()
+        for fig in fig_list:
+            plt.close(fig)
+    assert headless_saver.num_saved == 1
+    assert headless_saver.num_dropped == 2
+    assert_png(tmp_path / 'first.png')
+    assert not (tmp_path / 'second.png').exists()
+    assert not (tmp_path / 'dropped.png').exists()
+
+
+def test_run_saves_queued_figures_before_returning(run_dir):
+    datamodel = build_datamodel(run_dir)
+    datamodel.add_datatool(ImageShotReporter(name='image_reporter', datafield_name_list=['frame'],
+                                             layout='horizontal', save_data=True, roi_dict=dict(),
+                                             headless_save=True), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    assert datamodel.headless_saver is None
+    saved_file_list = list((run_dir / 'reporters' / 'image_reporter').rglob('*.png'))
+    assert saved_file_list
+    # Requests are only ever replaced by newer ones, so the last shot is always saved.
+    assert any('shot_00008' in file_path.name for file_path in saved_file_list)
+    assert not list(run_dir.rglob('*.tmp'))
+    plt.close('all')
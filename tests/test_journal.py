@@ -0,0 +1,79 @@
+from pathlib import Path
+import numpy as np
+from e6dataflow.datamodel import DataModel
+from e6dataflow.datafield import DataDictShotDataField
+from e6dataflow.processor import CountsProcessor
+from e6dataflow.journal import DataModelJournal
+from conftest import build_datamodel, write_shots, RUN_NAME, NUM_POINTS
+
+
+def build_counts_datamodel(root, **datamodel_kwargs):
+    datamodel = build_datamodel(root, incremental_save=True, **datamodel_kwargs)
+    datamodel.add_datatool(DataDictShotDataField(name='counts'), quiet=True)
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts',
+                                           roi_slice=[(slice(4, 20), slice(12, 28))] * NUM_POINTS), quiet=True)
+    datamodel.link_datatools()
+    return datamodel
+
+
+def get_paths(root):
+    datamodel_path = Path(root, f'{RUN_NAME}-datamodel.p')
+    return datamodel_path, DataModelJournal.get_journal_path(datamodel_path)
+
+
+def get_counts(datamodel, num_shots):
+    return np.array([datamodel.get_data('counts', shot_num) for shot_num in range(num_shots)])
+
+
+def test_journal_replay_matches_run(run_dir):
+    datamodel = build_counts_datamodel(run_dir, compact_ratio=100.0)
+    datamodel.run(quiet=True, handler_quiet=True, save_every_shot=True)
+    datamodel_path, journal_path = get_paths(run_dir)
+    assert journal_path.stat().st_size > 0
+    assert datamodel.journal.num_records > 0
+
+    loaded_datamodel = DataModel.load_datamodel(datamodel_path)
+    assert loaded_datamodel.num_shots == 9
+    np.testing.assert_array_equal(get_counts(loaded_datamodel, 9), get_counts(datamodel, 9))
+    assert loaded_datamodel.datatool_dict['counts_processor'].handled_shots == set(range(9))
+
+
+def test_journal_compaction(run_dir):
+    datamodel = build_counts_datamodel(run_dir, compact_ratio=0.0)
+    datamodel.run(quiet=True, handler_quiet=True, save_every_shot=True)
+    datamodel_path, journal_path = get_paths(run_dir)
+    # With compact_ratio=0 every appended record triggers a rewrite of the pickle file and a fresh journal.
+    assert journal_path.stat().st_size == 0
+    assert datamodel.journal.num_records == 0
+
+    loaded_datamodel = DataModel.load_datamodel(datamodel_path)
+    np.testing.assert_array_equal(get_counts(loaded_datamodel, 9), get_counts(datamodel, 9))
+
+
+def test_truncated_journal_record_is_recovered(run_dir):
+    datamodel = build_counts_datamodel(run_dir, compact_ratio=100.0)
+    datamodel.run(quiet=True, handler_quiet=True, save_every_shot=True)
+    datamodel_path, journal_path = get_paths(run_dir)
+    expected_counts = get_counts(datamodel, 9)
+    num_records = datamodel.journal.num_records
+
+    write_shots(Path(run_dir, 'daily'), 10, start_shot=9)
+    datamodel.run(quiet=True, handler_quiet=True)
+    # Cut off the end of the record of shot 9, as if the process was killed while appending it.
+    journal_bytes = journal_path.read_bytes()
+    with open(journal_path, 'wb') as journal_file:
+        journal_file.write(journal_bytes[:-10])
+
+    loaded_datamodel = DataModel.load_datamodel(datamodel_path)
+    assert loaded_datamodel.journal.needs_compaction
+    assert loaded_datamodel.journal.num_records == num_records
+    assert loaded_datamodel.num_shots == 9
+    np.testing.assert_array_equal(get_counts(loaded_datamodel, 9), expected_counts)
+
+    # The next save rewrites the pickle file instead of appending after the partial record.
+    loaded_datamodel.run(quiet=True, handler_quiet=True)
+    assert journal_path.stat().st_size == 0
+    reloaded_datamodel = DataModel.load_datamodel(datamodel_path)
+    assert reloaded_datamodel.num_shots == 10
+    np.testing.assert_array_equal(get_counts(reloaded_datamodel, 10), get_counts(loaded_datamodel, 10))
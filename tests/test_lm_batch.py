@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from scipy.optimize import least_squares
+from e6dataflow.tools.smart_gaussian2d_fit import levenberg_marquardt_batch, fit_gaussian2d_batch, fit_gaussian2d
+
+T = np.linspace(0, 5, 40)
+
+
+def decay_model(params, t):
+    amp, rate, offset = params[..., 0, None], params[..., 1, None], params[..., 2, None]
+    return amp * np.exp(-rate * t) + offset
+
+
+def decay_jacobian(params, t):
+    amp, rate = params[..., 0, None], params[..., 1, None]
+    exp_term = np.exp(-rate * t)
+    return np.stack([exp_term, -amp * t * exp_term, np.ones_like(exp_term)], axis=-1)
+
+
+def make_decay_data(num_fits):
+    rng = np.random.default_rng(1)
+    p_true = np.column_stack([rng.uniform(1, 5, num_fits), rng.uniform(0.3, 3, num_fits),
+                              rng.uniform(-1, 1, num_fits)])
+    data = decay_model(p_true, T) + rng.normal(0, 0.05, (num_fits, T.size))
+    return p_true, data
+
+
+def test_lm_batch_matches_scipy():
+    p_true, data = make_decay_data(8)
+    p_init = np.tile([1.0, 1.0, 0.0], (8, 1))
+    popt, jac, cost, success, num_iterations = levenberg_marquardt_batch(
+        lambda params, index: decay_model(params, T) - data[index],
+        lambda params, index: decay_jacobian(params, T), p_init)
+    assert success.all()
+    assert np.all(num_iterations < 100)
+    for fit_num in range(len(p_true)):
+        scipy_result = least_squares(lambda p: decay_model(p, T) - data[fit_num], p_init[fit_num],
+                                     jac=lambda p: decay_jacobian(p, T), method='lm', xtol=1e-12, ftol=1e-12)
+        np.testing.assert_allclose(popt[fit_num], scipy_result.x, rtol=1e-4, atol=1e-6)
+        assert cost[fit_num] == pytest.approx(scipy_result.cost, rel=1e-6)
+        np.testing.assert_allclose(jac[fit_num], decay_jacobian(popt[fit_num], T))
+
+
+def test_fits_are_independent_of_batch():
+    p_true, data = make_decay_data(8)
+    p_init = np.tile([1.0, 1.0, 0.0], (8, 1))
+
+    def fit(index):
+        return levenberg_marquardt_batch(lambda params, sub_index: decay_model(params, T) - data[index][sub_index],
+                                         lambda params, sub_index: decay_jacobian(params, T), p_init[index])[0]
+
+    np.testing.assert_allclose(fit(np.arange(8))[[2]], fit(np.array([2])), rtol=1e-12)
+
+
+@pytest.mark.parametrize('fix_angle', [True, False])
+def test_gaussian_batch_matches_single_fits(fix_angle):
+    rng = np.random.default_rng(2)
+    y, x = np.indices((20, 24))
+    img_list = []
+    for img_num in range(6):
+        x0, y0, sx, sy = rng.uniform(9, 14), rng.uniform(8, 11), rng.uniform(2, 3), rng.uniform(1.5, 2.5)
+        img_list.append(10 + 200 * np.exp(-(x - x0) ** 2 / (2 * sx ** 2) - (y - y0) ** 2 / (2 * sy ** 2))
+                        + rng.normal(0, 2, x.shape))
+    batch_result = fit_gaussian2d_batch(np.array(img_list), fix_angle=fix_angle, fix_lin_slope=True,
+                                        return_arrays=True)
+    assert batch_result['success'].all()
+    for img_num, img in enumerate(img_list):
+        fit_result = fit_gaussian2d(img, fix_angle=fix_angle, fix_lin_slope=True, show_plot=False, compact=True)
+        for param_num, key in enumerate(batch_result['param_keys']):
+            assert batch_result['popt'][img_num, param_num] == pytest.approx(fit_result.get_val(key), rel=1e-4,
+                                                                             abs=1e-4)
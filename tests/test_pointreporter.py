@@ -0,0 +1,50 @@
+from pathlib import Path
+import numpy as np
+from e6dataflow.processor import CountsProcessor
+from e6dataflow.datafield import DataDictShotDataField
+from e6dataflow.reporter.pointreporter import PlotPointReporter, LoopSeries
+from conftest import build_datamodel, write_shots, NUM_POINTS
+
+
+def test_loop_series_grows_and_fills_gaps():
+    series = LoopSeries([1.0, 2.0])
+    series.set_value(2, 3.0)
+    series.set_value(40, 4.0)
+    data = series.get_data()
+    assert len(data) == 41
+    np.testing.assert_array_equal(data[:3], [1, 2, 3])
+    assert np.all(np.isnan(data[3:40]))
+    assert data[40] == 4.0
+
+
+def test_plot_point_reporter_reads_only_new_shots(run_dir, monkeypatch):
+    datamodel = build_datamodel(run_dir)
+    datamodel.add_datatool(DataDictShotDataField(name='counts'), quiet=True)
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts',
+                                           roi_slice=[(slice(8, 16), slice(16, 24))] * NUM_POINTS), quiet=True)
+    datamodel.add_datatool(PlotPointReporter(name='counts_reporter', datafield_name_list=['counts'],
+                                             layout='horizontal', save_data=False), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    reporter = datamodel.datatool_dict['counts_reporter']
+
+    def check_lines():
+        for point_num in range(NUM_POINTS):
+            line = reporter.plot_dict[f'point_{point_num:02d}'][0]
+            expected_counts = datamodel.get_data_by_point('counts', point_num)
+            np.testing.assert_array_equal(line.get_ydata(), expected_counts)
+            np.testing.assert_array_equal(line.get_xdata(), np.arange(len(expected_counts)))
+            assert line.axes.get_xlim()[1] >= len(expected_counts) - 1
+
+    check_lines()
+    full_read_list = []
+    get_data_by_point = datamodel.get_data_by_point
+    monkeypatch.setattr(datamodel, 'get_data_by_point',
+                        lambda *args, **kwargs: full_read_list.append(args) or get_data_by_point(*args, **kwargs))
+    write_shots(Path(run_dir, 'daily'), 15, start_shot=9)
+    datamodel.run(quiet=True, handler_quiet=True)
+    assert datamodel.num_shots == 15
+    assert full_read_list == []
+    monkeypatch.undo()
+    check_lines()
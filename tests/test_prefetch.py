@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from e6dataflow.processor import CountsProcessor
+from e6dataflow.prefetcher import ShotPrefetcher
+from e6dataflow.datafield import DataField, DataStreamDataField, DataDictShotDataField
+from conftest import build_datamodel, make_frame, NUM_POINTS
+
+
+def test_prefetched_frame_serves_every_reader(run_dir, monkeypatch):
+    datamodel = build_datamodel(run_dir, shot_cache_max_bytes=0)
+    roi_slice_list = [(slice(8, 16), slice(16, 24)), (slice(0, 8), slice(0, 40))]
+    for num, roi_slice in enumerate(roi_slice_list):
+        datamodel.add_datatool(DataDictShotDataField(name=f'counts_{num}'), quiet=True)
+        datamodel.add_datatool(CountsProcessor(name=f'counts_processor_{num}', frame_datafield_name='frame',
+                                               output_datafield_name=f'counts_{num}',
+                                               roi_slice=[roi_slice] * NUM_POINTS), quiet=True)
+    datamodel.link_datatools()
+    load_shot_list = []
+    load_data = DataStreamDataField.load_data
+
+    def counting_load_data(datafield, shot_num, **kwargs):
+        load_shot_list.append(shot_num)
+        return load_data(datafield, shot_num, **kwargs)
+
+    monkeypatch.setattr(DataStreamDataField, 'load_data', counting_load_data)
+    datamodel.run(quiet=True, handler_quiet=True, prefetch_depth=2)
+
+    num_shots = datamodel.num_shots
+    # Shot 0 is read before any read-ahead was scheduled, every later shot is read from disk exactly once.
+    assert sorted(set(load_shot_list)) == list(range(num_shots))
+    assert len(load_shot_list) <= num_shots + 1
+    for shot_num in range(num_shots):
+        frame = make_frame(shot_num).astype(float)
+        for num, roi_slice in enumerate(roi_slice_list):
+            assert datamodel.get_data(f'counts_{num}', shot_num) == pytest.approx(frame[roi_slice].sum())
+
+
+def test_pinned_shot_is_not_evicted(run_dir):
+    datamodel = build_datamodel(run_dir)
+    datamodel.link_datatools()
+    datastream = datamodel.datatool_dict['cam']
+    datastream.max_open_files = 1
+    with datastream.load_shot(0) as h5_file:
+        with datastream.load_shot(1):
+            pass
+        with datastream.load_shot(2):
+            pass
+        assert h5_file.id.valid
+        assert h5_file['frame-00'].shape == make_frame(0).shape
+    assert list(datastream.open_file_dict) == [0]
+    # Once unpinned the file can be evicted again.
+    with datastream.load_shot(1):
+        pass
+    assert not h5_file.id.valid
+    assert list(datastream.open_file_dict) == [1]
+    datastream.close_shot_files()
+
+
+def test_prefetched_frame_follows_dtype_policy(run_dir):
+    datamodel = build_datamodel(run_dir, shot_cache_max_bytes=0)
+    datamodel.link_datatools()
+    datamodel.get_num_shots()
+    datamodel.shot_prefetcher = ShotPrefetcher(datamodel=datamodel, prefetch_depth=2)
+    try:
+        datamodel.shot_prefetcher.schedule(0, datamodel.num_shots)
+        native_frame = datamodel.get_data('frame', 1, dtype=DataField.DTYPE_NATIVE)
+        default_frame = datamodel.get_data('frame', 1)
+        float32_frame = datamodel.get_data('frame', 1, dtype=DataField.DTYPE_FLOAT32)
+    finally:
+        datamodel.stop_prefetching()
+    assert native_frame.dtype == np.uint16
+    assert default_frame.dtype == np.float64
+    assert float32_frame.dtype == np.float32
+    np.testing.assert_array_equal(native_frame, make_frame(1))
+    np.testing.assert_array_equal(default_frame, make_frame(1))
@@ -0,0 +1,76 @@
+import shutil
+from pathlib import Path
+import h5py
+import numpy as np
+import pytest
+from e6dataflow.datamodel import DataModel
+from e6dataflow.datafield import H5ShotDataField, H5PointDataField, StackedH5ShotDataField, DataDictShotDataField
+from e6dataflow.processor import CountsProcessor
+from conftest import build_datamodel, RUN_NAME, NUM_POINTS
+
+
+def save_run(root):
+    datamodel = build_datamodel(root)
+    datamodel.add_datatool(DataDictShotDataField(name='counts'), quiet=True)
+    datamodel.add_datatool(H5ShotDataField(name='h5_counts'), quiet=True)
+    datamodel.add_datatool(StackedH5ShotDataField(name='stacked_frames'), quiet=True)
+    datamodel.add_datatool(H5PointDataField(name='h5_point'), quiet=True)
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts',
+                                           roi_slice=[(slice(4, 20), slice(12, 28))] * NUM_POINTS), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    for shot_num in range(datamodel.num_shots):
+        datamodel.set_data('h5_counts', shot_num, datamodel.get_data('counts', shot_num))
+        datamodel.set_data('stacked_frames', shot_num, np.full((2, 2), shot_num))
+    datamodel.set_data('h5_point', 1, 42.0)
+    datamodel.save_datamodel()
+    datamodel.data_h5.close()
+    return datamodel
+
+
+def test_read_only_load_from_another_directory(run_dir, tmp_path_factory, monkeypatch):
+    datamodel = save_run(run_dir)
+    expected_counts = [datamodel.get_data('counts', shot_num) for shot_num in range(datamodel.num_shots)]
+    moved_dir = tmp_path_factory.mktemp('moved')
+    for suffix in ['.p', '.h5']:
+        shutil.move(Path(run_dir, f'{RUN_NAME}-datamodel{suffix}'), moved_dir)
+    other_dir = tmp_path_factory.mktemp('other')
+    monkeypatch.chdir(other_dir)
+
+    loaded_datamodel = DataModel.load_datamodel(Path(moved_dir, f'{RUN_NAME}-datamodel.p'), read_only=True)
+    assert Path(loaded_datamodel.data_h5.filename) == Path(moved_dir, f'{RUN_NAME}-datamodel.h5').resolve()
+    for shot_num, counts in enumerate(expected_counts):
+        assert loaded_datamodel.get_data('counts', shot_num) == counts
+        assert loaded_datamodel.get_data('h5_counts', shot_num) == counts
+        np.testing.assert_array_equal(loaded_datamodel.get_data('stacked_frames', shot_num), np.full((2, 2), shot_num))
+    assert loaded_datamodel.get_data('h5_point', 1) == 42.0
+    assert not list(other_dir.iterdir())
+    assert not list(run_dir.glob('*.h5'))
+
+
+def test_read_only_load_with_missing_groups(run_dir):
+    save_run(run_dir)
+    data_h5_path = Path(run_dir, f'{RUN_NAME}-datamodel.h5')
+    with h5py.File(data_h5_path, 'a') as data_h5:
+        del data_h5['shot_data/h5_counts']
+        del data_h5['shot_data/stacked_frames']
+    modified_time = data_h5_path.stat().st_mtime_ns
+
+    loaded_datamodel = DataModel.load_datamodel(Path(run_dir, f'{RUN_NAME}-datamodel.p'), read_only=True)
+    with pytest.raises(KeyError):
+        loaded_datamodel.get_data('h5_counts', 0)
+    with pytest.raises(KeyError):
+        loaded_datamodel.get_data('stacked_frames', 0)
+    assert loaded_datamodel.get_data('h5_point', 1) == 42.0
+    loaded_datamodel.data_h5.close()
+    assert data_h5_path.stat().st_mtime_ns == modified_time
+    with h5py.File(data_h5_path, 'r') as data_h5:
+        assert 'h5_counts' not in data_h5['shot_data']
+
+    data_h5_path.unlink()
+    loaded_datamodel = DataModel.load_datamodel(Path(run_dir, f'{RUN_NAME}-datamodel.p'), read_only=True)
+    with pytest.raises(KeyError):
+        loaded_datamodel.get_data('h5_point', 1)
+    assert loaded_datamodel.get_data('counts', 0) is not None
+    assert not data_h5_path.exists()
@@ -0,0 +1,49 @@
+import time
+from e6dataflow.datatool import DataTool
+from e6dataflow.reporter.shotreporter import ShotReporter
+from conftest import build_datamodel, write_shots
+
+REPORT_DURATION = 0.2
+
+
+class SlowShotReporter(ShotReporter):
+    """ Stands in for a reporter drawing and saving a large figure."""
+    def __init__(self, *, name):
+        super(SlowShotReporter, self).__init__(name=name, datafield_name_list=['frame'], layout='horizontal',
+                                               save_data=False)
+        self.reported_shot_list = []
+
+    def _handle(self, shot_num):
+        time.sleep(REPORT_DURATION)
+        self.reported_shot_list.append(shot_num)
+
+
+def run_with_reporter(run_dir, add_reporter, **run_kwargs):
+    datamodel = build_datamodel(run_dir)
+    if add_reporter:
+        datamodel.add_datatool(SlowShotReporter(name='slow_reporter'), quiet=True)
+    datamodel.link_datatools()
+    start_time = time.perf_counter()
+    datamodel.run(quiet=True, handler_quiet=True, **run_kwargs)
+    return datamodel, time.perf_counter() - start_time
+
+
+def test_slow_reporter_does_not_hold_up_backlog(run_dir):
+    datamodel, run_time = run_with_reporter(run_dir, add_reporter=True, max_report_rate=1000)
+    num_shots = datamodel.num_shots
+    assert num_shots > 2
+    reporter = datamodel.get_datatool_of_type(DataTool.SINGLE_SHOT_REPORTER)[0]
+    # Only the latest shot is reported, once the backlog has been worked through.
+    assert reporter.reported_shot_list == [num_shots - 1]
+    assert datamodel.last_handled_shot == num_shots - 1
+    reference_dir = run_dir / 'reference'
+    write_shots(reference_dir / 'daily', num_shots)
+    _, reference_run_time = run_with_reporter(reference_dir, add_reporter=False, max_report_rate=1000)
+    assert run_time < reference_run_time + 2 * REPORT_DURATION
+    assert run_time < num_shots * REPORT_DURATION
+
+
+def test_every_shot_reported_without_rate_limit(run_dir):
+    datamodel, _ = run_with_reporter(run_dir, add_reporter=True)
+    reporter = datamodel.datatool_dict['slow_reporter']
+    assert reporter.reported_shot_list == list(range(datamodel.num_shots))
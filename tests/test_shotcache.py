@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from e6dataflow.shotcache import ShotDataCache
+from e6dataflow.processor import Processor, CountsProcessor, MultiCountsProcessor
+from e6dataflow.datafield import DataDictShotDataField
+from e6dataflow.utils import shot_to_loop_and_point
+from conftest import build_datamodel, make_frame, NUM_POINTS
+
+
+class InPlaceBackgroundProcessor(Processor):
+    """ Subtracts the frame median in place, as processors working on their input array do."""
+    def __init__(self, *, name, frame_datafield_name, output_datafield_name):
+        super(InPlaceBackgroundProcessor, self).__init__(name=name)
+        self.frame_datafield_name = frame_datafield_name
+        self.output_datafield_name = output_datafield_name
+
+    def link_within_datamodel(self):
+        super(InPlaceBackgroundProcessor, self).link_within_datamodel()
+        self.add_child(self.output_datafield_name)
+        self.add_parent(self.frame_datafield_name)
+
+    def _process(self, shot_num):
+        frame = self.get_input_data(self.frame_datafield_name, shot_num)
+        frame -= np.median(frame)
+        self.datamodel.set_data(self.output_datafield_name, shot_num, float(frame.sum()))
+
+
+def test_get_returns_writeable_copy():
+    shot_data_cache = ShotDataCache()
+    shot_data_cache.set_shot(3)
+    data = np.arange(12.0).reshape(3, 4)
+    assert shot_data_cache.put('frame', 3, data)
+    data[0, 0] = -1
+    cached_data = shot_data_cache.get('frame', 3)
+    assert cached_data.flags.writeable
+    assert cached_data[0, 0] == 0
+    cached_data[...] = 7
+    np.testing.assert_array_equal(shot_data_cache.get('frame', 3), np.arange(12.0).reshape(3, 4))
+    region_data = shot_data_cache.get('frame', 3, region=(slice(1, 3), slice(0, 2)))
+    np.testing.assert_array_equal(region_data, [[4, 5], [8, 9]])
+    assert region_data.flags.writeable
+    out = np.zeros((2, 2), dtype=np.float32)
+    assert shot_data_cache.get('frame', 3, region=(slice(1, 3), slice(0, 2)), out=out) is out
+    np.testing.assert_array_equal(out, [[4, 5], [8, 9]])
+    assert shot_data_cache.get_stats()['hits'] == 4
+
+
+def test_put_respects_shot_and_max_bytes():
+    shot_data_cache = ShotDataCache(max_bytes=100)
+    shot_data_cache.set_shot(0)
+    assert not shot_data_cache.put('frame', 1, np.zeros(4))
+    assert not shot_data_cache.put('frame', 0, np.zeros(100))
+    assert shot_data_cache.put('frame', 0, np.zeros(4))
+    shot_data_cache.invalidate('frame', 0)
+    assert shot_data_cache.get('frame', 0) is None
+    assert shot_data_cache.get_stats()['cached_bytes'] == 0
+
+
+def test_previous_shot_frames_are_recycled_as_buffers():
+    shot_data_cache = ShotDataCache()
+    shot_data_cache.set_shot(0)
+    data = np.arange(6.0)
+    shot_data_cache.put('frame', 0, data, dtype='float64', copy=False)
+    shot_data_cache.set_shot(1)
+    assert shot_data_cache.get('frame', 1, dtype='float64') is None
+    assert shot_data_cache.get_buffer('frame', dtype='float32') is None
+    buffer = shot_data_cache.get_buffer('frame', dtype='float64')
+    assert buffer is data
+    assert buffer.flags.writeable
+    assert shot_data_cache.get_buffer('frame', dtype='float64') is None
+    shot_data_cache.put('frame', 1, buffer, dtype='float64', copy=False)
+    shot_data_cache.clear()
+    assert shot_data_cache.get_buffer('frame', dtype='float64') is None
+
+
+def test_region_reads_hit_cache_in_pipeline(run_dir):
+    datamodel = build_datamodel(run_dir)
+    for datafield_name in ['counts', 'c0', 'c1', 'background_sum']:
+        datamodel.add_datatool(DataDictShotDataField(name=datafield_name), quiet=True)
+    roi_slice = (slice(8, 16), slice(16, 24))
+    other_roi_slice = (slice(20, 28), slice(30, 38))
+    roi_slice_array = np.empty((NUM_POINTS, 2), dtype=object)
+    for point in range(NUM_POINTS):
+        roi_slice_array[point, 0] = roi_slice
+        roi_slice_array[point, 1] = other_roi_slice
+    datamodel.add_datatool(InPlaceBackgroundProcessor(name='background', frame_datafield_name='frame',
+                                                      output_datafield_name='background_sum'), quiet=True)
+    datamodel.add_datatool(CountsProcessor(name='counts_processor', frame_datafield_name='frame',
+                                           output_datafield_name='counts', roi_slice=[roi_slice] * NUM_POINTS),
+                           quiet=True)
+    datamodel.add_datatool(MultiCountsProcessor(name='multi_counts_processor', frame_datafield_name='frame',
+                                                result_datafield_name_list=['c0', 'c1'],
+                                                roi_slice_array=roi_slice_array), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True, save_before_reporting=False)
+
+    num_shots = datamodel.num_shots
+    stats = datamodel.shot_data_cache.get_stats()
+    assert stats['misses'] == num_shots
+    assert stats['hits'] > 0
+    assert stats['hits'] >= 2 * num_shots
+    for shot_num in range(num_shots):
+        frame = make_frame(shot_num).astype(float)
+        assert datamodel.get_data('counts', shot_num) == pytest.approx(frame[roi_slice].sum())
+        assert datamodel.get_data('c0', shot_num) == pytest.approx(frame[roi_slice].sum())
+        assert datamodel.get_data('c1', shot_num) == pytest.approx(frame[other_roi_slice].sum())
+        assert datamodel.get_data('background_sum', shot_num) == pytest.approx((frame - np.median(frame)).sum())
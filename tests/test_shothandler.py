@@ -0,0 +1,51 @@
+from e6dataflow.datatool import ShotHandler, DataTool, Rebuildable
+from e6dataflow.datafield import DataDictShotDataField
+from e6dataflow.processor import CountsProcessor
+from conftest import build_datamodel, NUM_POINTS
+
+
+class RecordingShotHandler(ShotHandler):
+    def __init__(self, *, name):
+        super(RecordingShotHandler, self).__init__(name=name, datatool_type=DataTool.PROCESSOR)
+
+    def _handle(self, shot_num):
+        pass
+
+
+def test_first_unhandled_shot_low_water_mark():
+    shot_handler = RecordingShotHandler(name='handler')
+    assert shot_handler.get_first_unhandled_shot() == 0
+    for shot_num in [1, 2, 4]:
+        shot_handler.mark_handled(shot_num)
+    assert shot_handler.get_first_unhandled_shot() == 0
+    shot_handler.mark_handled(0)
+    assert shot_handler.get_first_unhandled_shot() == 3
+    shot_handler.mark_handled(3)
+    assert shot_handler.get_first_unhandled_shot() == 5
+
+    shot_handler.package_rebuild_dict()
+    rebuilt_shot_handler = Rebuildable.rebuild(shot_handler.rebuild_dict)
+    assert rebuilt_shot_handler.get_first_unhandled_shot() == 5
+
+    shot_handler.reset()
+    assert shot_handler.get_first_unhandled_shot() == 0
+    shot_handler.set_handled_shots({0, 1, 3})
+    assert shot_handler.get_first_unhandled_shot() == 2
+
+
+def test_datamodel_first_unhandled_shot(run_dir):
+    datamodel = build_datamodel(run_dir)
+    datamodel.add_datatool(DataDictShotDataField(name='counts'), quiet=True)
+    counts_processor_kwargs = dict(name='counts_processor', frame_datafield_name='frame',
+                                   output_datafield_name='counts', roi_slice=[(slice(0, 8), slice(0, 8))] * NUM_POINTS)
+    datamodel.add_datatool(CountsProcessor(**counts_processor_kwargs), quiet=True)
+    datamodel.link_datatools()
+    datamodel.run(quiet=True, handler_quiet=True)
+    assert datamodel.get_first_unhandled_shot() == 9
+
+    counts_processor_kwargs['roi_slice'] = [(slice(0, 16), slice(0, 16))] * NUM_POINTS
+    datamodel.add_datatool(CountsProcessor(**counts_processor_kwargs), overwrite=True, quiet=True)
+    datamodel.link_datatools()
+    assert datamodel.get_first_unhandled_shot() == 0
+    datamodel.run(quiet=True, handler_quiet=True)
+    assert datamodel.get_first_unhandled_shot() == 9
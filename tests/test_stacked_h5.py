@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from e6dataflow.datafield import DataField, StackedH5ShotDataField
+from conftest import build_datamodel, NUM_POINTS
+
+
+@pytest.fixture
+def datamodel(run_dir):
+    datamodel = build_datamodel(run_dir)
+    yield datamodel
+    datamodel.data_h5.close()
+
+
+def add_stacked_datafield(datamodel, **datafield_kwargs):
+    datafield = StackedH5ShotDataField(name='stacked', **datafield_kwargs)
+    datamodel.add_datatool(datafield, quiet=True)
+    datamodel.link_datatools()
+    return datafield
+
+
+def test_datasets_grow_geometrically(datamodel):
+    datafield = add_stacked_datafield(datamodel)
+    for shot_num in range(100):
+        datafield.set_data(shot_num, np.full((2, 3), shot_num))
+    capacity = datafield.datafield_group['data'].shape[0]
+    assert capacity == 128
+    assert datafield.datafield_group['valid'].shape[0] == capacity
+    assert datafield.get_num_stored_shots() == 100
+    with pytest.raises(KeyError):
+        datafield.get_data(100)
+    np.testing.assert_array_equal(datafield.get_batch_data([99, 3, 3]),
+                                  [np.full((2, 3), 99), np.full((2, 3), 3), np.full((2, 3), 3)])
+
+
+def test_missing_shots_raise_key_error(datamodel):
+    datafield = add_stacked_datafield(datamodel)
+    for shot_num in [0, 1, 3, 4]:
+        datafield.set_data(shot_num, float(shot_num))
+    assert datafield.get_data(3) == 3.0
+    with pytest.raises(KeyError, match='shot_00002'):
+        datafield.get_data(2)
+    with pytest.raises(KeyError, match='shot_00002'):
+        datafield.get_batch_data([4, 0, 2])
+    with pytest.raises(KeyError, match='shot_00007'):
+        datafield.get_batch_data([0, 7])
+    with pytest.raises(KeyError):
+        datafield.get_batch_data([-1])
+    datafield.check_valid(np.array([4, 1, 0, 4]))
+    datafield.check_valid(np.array([], dtype=int))
+
+
+def test_point_data_nan_fills_missing_float_shots(datamodel):
+    datafield = add_stacked_datafield(datamodel)
+    num_shots = 4 * NUM_POINTS
+    for shot_num in range(num_shots):
+        if shot_num != 4:
+            datafield.set_data(shot_num, np.array([shot_num, -shot_num], dtype=np.int32))
+    point_data = datafield.get_point_data(1, NUM_POINTS, num_shots)
+    assert point_data.shape == (4, 2)
+    np.testing.assert_array_equal(point_data, [[1, -1], [np.nan, np.nan], [7, -7], [10, -10]])
+    np.testing.assert_array_equal(datafield.get_point_data(0, NUM_POINTS, num_shots)[:, 0], [0, 3, 6, 9])
+
+
+def test_point_data_drops_missing_integer_shots(datamodel):
+    datafield = add_stacked_datafield(datamodel, dtype=DataField.DTYPE_NATIVE)
+    num_shots = 4 * NUM_POINTS
+    for shot_num in range(num_shots):
+        if shot_num != 4:
+            datafield.set_data(shot_num, np.int32(shot_num))
+    point_data = datafield.get_point_data(1, NUM_POINTS, num_shots)
+    assert point_data.dtype == np.int32
+    np.testing.assert_array_equal(point_data, [1, 7, 10])
+
+
+def test_legacy_exactly_sized_datasets(datamodel):
+    datafield = add_stacked_datafield(datamodel)
+    datafield.datafield_group.create_dataset('data', data=np.arange(5.0), maxshape=(None,), chunks=(1,))
+    datafield.datafield_group.create_dataset('valid', data=np.ones(5, dtype=bool), maxshape=(None,), chunks=(1024,))
+    assert datafield.get_num_stored_shots() == 5
+    datafield.set_data(5, 5.0)
+    assert datafield.get_num_stored_shots() == 6
+    np.testing.assert_array_equal(datafield.get_batch_data(range(6)), np.arange(6.0))
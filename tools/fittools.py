@@ -1,15 +1,22 @@
+import functools
 import numpy as np
 from scipy.optimize import least_squares
 from scipy.special import erf
 import scipy.stats
 
 
+@functools.lru_cache(maxsize=256)
+def get_tcrit(conf_level, dof=None):
+    """ Critical value of the confidence interval at conf_level. Student's t distribution with dof degrees of freedom,
+    or the normal distribution if dof is None."""
+    if dof is None:  # Assume normal distribution if dof not specified
+        return float(scipy.stats.norm.ppf((1 + conf_level) / 2))
+    return float(scipy.stats.t.ppf((1 + conf_level) / 2, dof))
+
+
 def make_fit_param_dict(name, val, std, conf_level=erf(1 / np.sqrt(2)), dof=None):
     pdict = {'name': name, 'val': val, 'std': std, 'conf_level': conf_level}
-    if dof is None:  # Assume normal distribution if dof not specified
-        tcrit = scipy.stats.norm.ppf((1 + conf_level) / 2)
-    else:
-        tcrit = scipy.stats.t.ppf((1 + conf_level) / 2, dof)
+    tcrit = get_tcrit(conf_level, dof)
     pdict['err_half_range'] = tcrit * std
     pdict['err_full_range'] = 2 * pdict['err_half_range']
     pdict['val_lb'] = val - pdict['err_half_range']
@@ -17,6 +24,108 @@ def make_fit_param_dict(name, val, std, conf_level=erf(1 / np.sqrt(2)), dof=None
     return pdict
 
 
+class FitResult:
+    """
+    Compact result of a least squares fit, an alternative to the fit_struct dictionaries.
+
+    Only the parameter names, the optimal parameters, the covariance matrix and a few scalars are stored. Standard
+    deviations and confidence intervals are computed on access, the critical value is cached per (conf_level, dof) by
+    get_tcrit. Additional scalar results of the fit, such as NGauss for Gaussian fits, are held in derived_dict. For
+    code written against fit_structs, fit_result[param_key] returns the fit_param_dict of a parameter and
+    fit_result[derived_key] a derived value. Lists of FitResults with the same parameters can be stacked into a NumPy
+    structured array with stack_fit_results.
+    """
+    __slots__ = ('param_keys', 'popt', 'cov', 'conf_level', 'dof', 'success', 'derived_dict')
+
+    def __init__(self, *, param_keys, popt, cov, conf_level=erf(1 / np.sqrt(2)), dof=None, success=True,
+                 derived_dict=None):
+        self.param_keys = tuple(param_keys)
+        self.popt = np.asarray(popt, dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        self.conf_level = conf_level
+        self.dof = None if dof is None else int(dof)
+        self.success = bool(success)
+        self.derived_dict = dict() if derived_dict is None else derived_dict
+
+    @property
+    def std(self):
+        return np.sqrt(np.diagonal(self.cov))
+
+    @property
+    def err_half_range(self):
+        return get_tcrit(self.conf_level, self.dof) * self.std
+
+    @property
+    def val_lb(self):
+        return self.popt - self.err_half_range
+
+    @property
+    def val_ub(self):
+        return self.popt + self.err_half_range
+
+    @property
+    def kwargs(self):
+        return dict(zip(self.param_keys, self.popt))
+
+    def get_val(self, param_key):
+        return self.popt[self.param_keys.index(param_key)]
+
+    def get_fit_param_dict(self, param_key):
+        param_num = self.param_keys.index(param_key)
+        return make_fit_param_dict(param_key, self.popt[param_num], np.sqrt(self.cov[param_num, param_num]),
+                                   self.conf_level, self.dof)
+
+    def __getitem__(self, key):
+        if key in self.param_keys:
+            return self.get_fit_param_dict(key)
+        if key in self.derived_dict:
+            return self.derived_dict[key]
+        if key in ('param_keys', 'cov', 'success', 'kwargs'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __repr__(self):
+        param_string = ', '.join(f'{key}={val:.4g}' for key, val in zip(self.param_keys, self.popt))
+        return f'FitResult({param_string}, success={self.success})'
+
+    def to_fit_struct(self):
+        fit_struct = {key: self.get_fit_param_dict(key) for key in self.param_keys}
+        fit_struct['param_keys'] = list(self.param_keys)
+        fit_struct['cov'] = self.cov
+        fit_struct['success'] = self.success
+        fit_struct.update(self.derived_dict)
+        return fit_struct
+
+
+def stack_fit_results(fit_result_list):
+    """
+    Stack FitResults with identical param_keys and derived values into a NumPy structured array with one record per
+    FitResult. Each record holds success and dof, the value and standard deviation of every parameter (fields <key> and
+    <key>_std) and every derived value.
+    """
+    first_result = fit_result_list[0]
+    param_keys = first_result.param_keys
+    derived_keys = tuple(first_result.derived_dict)
+    dtype = ([('success', bool), ('dof', np.int64)] + [(key, float) for key in param_keys]
+             + [(f'{key}_std', float) for key in param_keys] + [(key, float) for key in derived_keys])
+    record_array = np.empty(len(fit_result_list), dtype=dtype)
+    popt_array = np.empty((len(fit_result_list), len(param_keys)))
+    std_array = np.empty((len(fit_result_list), len(param_keys)))
+    for result_num, fit_result in enumerate(fit_result_list):
+        if fit_result.param_keys != param_keys or tuple(fit_result.derived_dict) != derived_keys:
+            raise ValueError('Only FitResults with identical param_keys and derived values can be stacked.')
+        popt_array[result_num] = fit_result.popt
+        std_array[result_num] = fit_result.std
+        record_array['success'][result_num] = fit_result.success
+        record_array['dof'][result_num] = -1 if fit_result.dof is None else fit_result.dof
+        for key in derived_keys:
+            record_array[key][result_num] = fit_result.derived_dict[key]
+    for param_num, key in enumerate(param_keys):
+        record_array[key] = popt_array[:, param_num]
+        record_array[f'{key}_std'] = std_array[:, param_num]
+    return record_array
+
+
 def create_fit_struct(fit_func, input_data, output_data, popt_dict, pcov, conf_level, dof, lightweight=False):
     popt = list(popt_dict.values())
     model_data = fit_func(input_data, *popt)
@@ -45,7 +154,7 @@ def create_fit_struct(fit_func, input_data, output_data, popt_dict, pcov, conf_l
 
 
 def e6_fit(output_data, fit_func, param_guess, input_data=None, param_keys=None, conf_level=erf(1 / np.sqrt(2)),
-           lightweight=False, *args, **kwargs):
+           lightweight=False, *args, compact=False, **kwargs):
     if param_keys is None:
         param_keys = []
         for idx, param in enumerate(param_guess):
@@ -74,8 +183,11 @@ def e6_fit(output_data, fit_func, param_guess, input_data=None, param_keys=None,
         cov = sigma_squared * np.linalg.inv(np.matmul(jac.T, jac))
     except np.linalg.LinAlgError as e:
         print(e)
-        cov = 0 * jac
+        cov = np.zeros((n_fit_parameters, n_fit_parameters))
 
+    if compact:
+        return FitResult(param_keys=param_keys, popt=popt, cov=cov, conf_level=conf_level, dof=dof,
+                         success=lsq_struct['success'])
     fit_struct = create_fit_struct(fit_func, input_data, output_data, popt_dict, cov, conf_level, dof,
                                    lightweight=lightweight)
     return fit_struct
@@ -1,11 +1,12 @@
+import functools
+import warnings
 import numpy as np
-import scipy.ndimage
-import scipy.stats
 from scipy.optimize import least_squares
 from scipy.special import erf
 import time
 from uncertainties import ufloat
 import matplotlib.pyplot as plt
+from .fittools import get_tcrit, FitResult
 
 
 def gaussian_2d(x, y, x0=0, y0=0, sx=1, sy=1, amp=1, offset=0, angle=0, x_slope=0, y_slope=0):
@@ -16,8 +17,56 @@ def gaussian_2d(x, y, x0=0, y0=0, sx=1, sy=1, amp=1, offset=0, angle=0, x_slope=
             + offset + x_slope * (x - x0) + y_slope * (y - y0))
 
 
+def gaussian_2d_jacobian(x, y, x0=0, y0=0, sx=1, sy=1, amp=1, offset=0, angle=0, x_slope=0, y_slope=0,
+                         fit_angle=True, fit_lin_slope=True):
+    """
+    Partial derivatives of gaussian_2d with respect to its parameters, evaluated at the flattened coordinates x, y.
+    Columns are ordered as the fit parameters of fit_gaussian2d: x0, y0, sx, sy, amp, offset, followed by angle if
+    fit_angle and by x_slope, y_slope if fit_lin_slope. The angle derivative is per degree. Parameters may be arrays of
+    shape (num_fits, 1) to evaluate the Jacobians of several fits at once, the result then has shape
+    (num_fits, num_pixels, num_params).
+    """
+    angle_rad = np.radians(angle)
+    cos_angle = np.cos(angle_rad)
+    sin_angle = np.sin(angle_rad)
+    dx = np.ravel(x) - x0
+    dy = np.ravel(y) - y0
+    rx = cos_angle * dx + sin_angle * dy
+    ry = -sin_angle * dx + cos_angle * dy
+    rx_sx2 = rx / sx ** 2
+    ry_sy2 = ry / sy ** 2
+    gauss_unit = np.exp(-(1 / 2) * (rx * rx_sx2 + ry * ry_sy2))
+    gauss = amp * gauss_unit
+
+    num_params = 6 + int(fit_angle) + 2 * int(fit_lin_slope)
+    jac = np.empty(dx.shape + (num_params,))
+    jac[..., 0] = gauss * (cos_angle * rx_sx2 - sin_angle * ry_sy2) - x_slope
+    jac[..., 1] = gauss * (sin_angle * rx_sx2 + cos_angle * ry_sy2) - y_slope
+    jac[..., 2] = gauss * rx * rx_sx2 / sx
+    jac[..., 3] = gauss * ry * ry_sy2 / sy
+    jac[..., 4] = gauss_unit
+    jac[..., 5] = 1
+    param_num = 6
+    if fit_angle:
+        jac[..., param_num] = -gauss * rx * ry * (1 / sx ** 2 - 1 / sy ** 2) * np.pi / 180
+        param_num += 1
+    if fit_lin_slope:
+        jac[..., param_num] = dx
+        jac[..., param_num + 1] = dy
+    return jac
+
+
+@functools.lru_cache(maxsize=64)
+def get_coordinate_grids(shape):
+    """ Cached, read-only equivalent of np.indices(shape) for 2D images. Returns y_coords, x_coords."""
+    y_coords, x_coords = np.indices(shape)
+    y_coords.setflags(write=False)
+    x_coords.setflags(write=False)
+    return y_coords, x_coords
+
+
 def img_moments(img):
-    y_inds, x_inds = np.indices(img.shape)
+    y_inds, x_inds = get_coordinate_grids(img.shape)
     tot = np.nansum(img)
     if tot <= 0:
         raise ValueError('Integrated image intensity is negative, image may be too noisy. '
@@ -55,12 +104,69 @@ def get_guess_values(img, quiet=True):
     return p_guess
 
 
+def bin_image(img, bin_factor):
+    """ Average img over blocks of bin_factor x bin_factor pixels. Rows and columns which don't fill a block are
+    dropped."""
+    num_rows = img.shape[0] // bin_factor
+    num_cols = img.shape[1] // bin_factor
+    img = img[:num_rows * bin_factor, :num_cols * bin_factor]
+    return img.reshape(num_rows, bin_factor, num_cols, bin_factor).mean(axis=(1, 3))
+
+
+@functools.lru_cache(maxsize=64)
+def get_binned_coordinate_grids(shape, bin_factor):
+    """ Full resolution coordinates of the block centers of an image binned by bin_image. Returns y_coords, x_coords."""
+    y_coords, x_coords = np.indices(shape) * bin_factor + (bin_factor - 1) / 2
+    y_coords.setflags(write=False)
+    x_coords.setflags(write=False)
+    return y_coords, x_coords
+
+
+def unbin_gaussian2d_params(popt, bin_factor):
+    """
+    Convert parameters fitted to an image binned by bin_factor into guess values for the full resolution image.
+    Block averaging widens the Gaussian by the variance (bin_factor ** 2 - 1) / 12 of the block and lowers its amplitude
+    accordingly, both are undone here. Position, offset, angle and slopes are unchanged as the binned fit uses full
+    resolution coordinates.
+    """
+    p_guess = np.array(popt, dtype=float)
+    sx_binned = np.abs(p_guess[2])
+    sy_binned = np.abs(p_guess[3])
+    block_var = (bin_factor ** 2 - 1) / 12
+    p_guess[2] = np.sqrt(max(sx_binned ** 2 - block_var, sx_binned ** 2 / 4))
+    p_guess[3] = np.sqrt(max(sy_binned ** 2 - block_var, sy_binned ** 2 / 4))
+    p_guess[4] = p_guess[4] * sx_binned * sy_binned / (p_guess[2] * p_guess[3])
+    return p_guess
+
+
+def get_guess_values_batch(img_stack):
+    """
+    Vectorized get_guess_values for a stack of images of shape (num_imgs, num_rows, num_cols). Returns an array of
+    shape (num_imgs, 6). Images whose moments cannot be calculated get the default guess values.
+    """
+    num_imgs, y_range, x_range = img_stack.shape
+    y_coords, x_coords = get_coordinate_grids(img_stack.shape[1:])
+    img_min = np.nanmin(img_stack, axis=(1, 2))
+    tot = np.nansum(img_stack, axis=(1, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x0 = np.nansum(img_stack * x_coords, axis=(1, 2)) / tot
+        y0 = np.nansum(img_stack * y_coords, axis=(1, 2)) / tot
+        varx = np.nansum(img_stack * (x_coords - x0[:, None, None]) ** 2, axis=(1, 2)) / tot
+        vary = np.nansum(img_stack * (y_coords - y0[:, None, None]) ** 2, axis=(1, 2)) / tot
+    valid = (tot > 0) & (varx > 0) & (vary > 0)
+    p_guess = np.empty((num_imgs, 6))
+    p_guess[:, 0] = np.where(valid, x0, x_range / 2)
+    p_guess[:, 1] = np.where(valid, y0, y_range / 2)
+    p_guess[:, 2] = np.where(valid, np.sqrt(np.abs(varx)), x_range / 2)
+    p_guess[:, 3] = np.where(valid, np.sqrt(np.abs(vary)), y_range / 2)
+    p_guess[:, 4] = np.nanmax(img_stack, axis=(1, 2)) - img_min
+    p_guess[:, 5] = img_min
+    return p_guess
+
+
 def make_fit_param_dict(name, val, std, conf_level=erf(1 / np.sqrt(2)), dof=None):
     pdict = {'name': name, 'val': val, 'std': std, 'conf_level': conf_level}
-    if dof is None:  # Assume normal distribution if dof not specified
-        tcrit = scipy.stats.norm.ppf((1 + conf_level) / 2)
-    else:
-        tcrit = scipy.stats.t.ppf((1 + conf_level) / 2, dof)
+    tcrit = get_tcrit(conf_level, dof)
     pdict['err_half_range'] = tcrit * std
     pdict['err_full_range'] = 2 * pdict['err_half_range']
     pdict['val_lb'] = val - pdict['err_half_range']
@@ -152,7 +258,7 @@ def make_visualization_figure(fit_struct, show_plot=True, save_name=None):
 
 
 def create_fit_struct(img, popt_dict, pcov, conf_level, dof, success, lightweight=False):
-    y_coords, x_coords = np.indices(img.shape)
+    y_coords, x_coords = get_coordinate_grids(img.shape)
     model_img = gaussian_2d(x_coords, y_coords, **popt_dict)
     fit_struct = dict()
     fit_struct_param_keys = []
@@ -173,10 +279,48 @@ def create_fit_struct(img, popt_dict, pcov, conf_level, dof, success, lightweigh
     return fit_struct
 
 
+def create_fit_result(img, popt_dict, pcov, conf_level, dof, success):
+    """ Compact counterpart of create_fit_struct returning a FitResult which holds NGauss, NSum and NSum_BGsubtract as
+    derived values."""
+    derived_dict = {'NGauss': popt_dict['amp'] * 2 * np.pi * popt_dict['sx'] * popt_dict['sy'],
+                    'NSum': np.sum(img),
+                    'NSum_BGsubtract': np.sum(img) - img.size * popt_dict['offset']}
+    return FitResult(param_keys=popt_dict.keys(), popt=list(popt_dict.values()), cov=pcov, conf_level=conf_level,
+                     dof=dof, success=success, derived_dict={key: float(val) for key, val in derived_dict.items()})
+
+
+def least_squares_gaussian2d(img, x_coords, y_coords, p_guess, param_keys, lock_params, fix_angle, fix_lin_slope):
+    """ Least squares fit of gaussian_2d evaluated at x_coords, y_coords to img using the analytic Jacobian."""
+    def img_cost_func(x):
+        return np.nan_to_num(np.ravel(gaussian_2d(x_coords, y_coords,
+                                                  **dict(zip(param_keys, x)), **lock_params)
+                             - img))
+
+    def img_jac_func(x):
+        return np.nan_to_num(gaussian_2d_jacobian(x_coords, y_coords, **dict(zip(param_keys, x)), **lock_params,
+                                                  fit_angle=not fix_angle, fit_lin_slope=not fix_lin_slope))
+    return least_squares(img_cost_func, p_guess, jac=img_jac_func, verbose=0)
+
+
+def resolve_bin_factor(bin_factor=None, zoom=None):
+    """ Validate bin_factor, an integer >= 1, accepting the deprecated zoom argument of fit_gaussian2d as an alias."""
+    if zoom is not None:
+        if bin_factor is not None:
+            raise ValueError('Pass either bin_factor or the deprecated zoom, not both.')
+        warnings.warn('The zoom argument of fit_gaussian2d is deprecated, use bin_factor instead.', DeprecationWarning,
+                      stacklevel=3)
+        bin_factor = zoom
+    if bin_factor is None:
+        return 1
+    if not np.isscalar(bin_factor) or bin_factor < 1 or bin_factor != int(bin_factor):
+        raise ValueError(f'bin_factor must be an integer >= 1, got {bin_factor!r}.')
+    return int(bin_factor)
+
+
 # noinspection PyTypeChecker
-def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_angle=False,
+def fit_gaussian2d(img, zoom=None, angle_offset=0.0, fix_lin_slope=False, fix_angle=False,
                    show_plot=True, save_name=None, conf_level=erf(1 / np.sqrt(2)), quiet=True, lightweight=False,
-                   guess=None):
+                   guess=None, compact=False, bin_factor=None):
     """
     2D Gaussian fit to an image
     Guassian fitting algorithm operates by taking an input image img, extracting a guess for initial fit parameters
@@ -185,7 +329,13 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
     Returns a fit_struct dictionary object which contains some detailed information about the fit including the
     fit value, standard deviation, and confidence intervals for all fit parameters.
     :param img: 2D Image to fit
-    :param zoom: Decimate rate to speed up fitting if downsample is selected
+    :param zoom: Deprecated alias of bin_factor. Before the coarse-to-fine fit it was the factor by which the image was
+                 interpolated down.
+    :param bin_factor: Integer binning factor >= 1 for a coarse-to-fine fit. If bin_factor is larger than 1 the image
+                       is first fitted after binning it by bin_factor x bin_factor pixel blocks, the result is then
+                       refined on the full resolution image. Images smaller than 2 * bin_factor pixels along an axis
+                       are fitted at full resolution only. Parameters, covariance and dof always refer to the full
+                       resolution image. A ValueError is raised for non-integer values or values smaller than 1.
     :param angle_offset: (degrees) Central value about which tilt angle is expected to scatter. Output values for
                          angle will be +- 45 deg. Fits with tilt angle near the edge of this range may swap sx and sy
                          for similar looking images
@@ -197,7 +347,10 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
     :param quiet: Squelch variable
     :param lightweight: If False then the data image and model fit image are saved into the fit_struct.
                         For large images this might make the fit_struct have a large size in memory.
-    :param guess: Optional guess values for parameters
+    :param guess: Optional guess values for x0, y0, sx, sy, amp, offset, optionally followed by guesses for the fitted
+                  angle and slopes, i.e. in the order of the param_keys of the returned fit_struct
+    :param compact: If True return a FitResult instead of a fit_struct. The FitResult holds the parameters, covariance,
+                    NGauss, NSum and NSum_BGsubtract but no images, confidence intervals are computed on access.
     :return fit_struct: Returns a struct containing relevant data output of the fit routine
     :rtype dict
     Returns
@@ -257,38 +410,48 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
         Upper limit of confidence interval
     """
 
-    img_downsampled = scipy.ndimage.interpolation.zoom(img, 1 / zoom)
-    # zoom = 1.0
-    img_downsampled = np.nan_to_num(img)
     img = np.nan_to_num(img)
-    if not quiet:
-        print(f'Image downsampled by factor: {zoom:.1f}')
-    y_coords, x_coords = np.indices(img_downsampled.shape)
+    y_coords, x_coords = get_coordinate_grids(img.shape)
+    bin_factor = resolve_bin_factor(bin_factor=bin_factor, zoom=zoom)
+    coarse_to_fine = bin_factor > 1 and min(img.shape) >= 2 * bin_factor
+    if coarse_to_fine:
+        img_binned = bin_image(img, bin_factor)
+        y_binned_coords, x_binned_coords = get_binned_coordinate_grids(img_binned.shape, bin_factor)
+        if not quiet:
+            print(f'Image binned by factor: {bin_factor:d}')
 
-    if guess is None:
-        p_guess = get_guess_values(img, quiet=quiet)
-    else:
+    if guess is not None:
         p_guess = guess
+    elif coarse_to_fine:
+        p_guess = get_guess_values(img_binned, quiet=quiet)
+        p_guess[:2] = p_guess[:2] * bin_factor + (bin_factor - 1) / 2
+        p_guess[2:4] = p_guess[2:4] * bin_factor
+    else:
+        p_guess = get_guess_values(img, quiet=quiet)
     param_keys = ['x0', 'y0', 'sx', 'sy', 'amp', 'offset']
     lock_params = dict()
     if fix_angle:
         lock_params['angle'] = 0
     else:
         param_keys.append('angle')
-        p_guess = np.append(p_guess, 0)
     if fix_lin_slope:
         lock_params['x_slope'] = 0
         lock_params['y_slope'] = 0
     else:
         param_keys.extend(['x_slope', 'y_slope'])
-        p_guess = np.append(p_guess, [0, 0])
+    if len(p_guess) < len(param_keys):
+        # angle and slopes start at zero unless they are guessed as well
+        p_guess = np.append(p_guess, np.zeros(len(param_keys) - len(p_guess)))
 
-    def img_cost_func(x):
-        return np.nan_to_num(np.ravel(gaussian_2d(x_coords * zoom, y_coords * zoom,
-                                                  *x, **lock_params)
-                             - img_downsampled))
     t_fit_start = time.time()
-    lsq_struct = least_squares(img_cost_func, p_guess, verbose=0)
+    if coarse_to_fine:
+        lsq_struct = least_squares_gaussian2d(img_binned, x_binned_coords, y_binned_coords, p_guess, param_keys,
+                                              lock_params, fix_angle=fix_angle, fix_lin_slope=fix_lin_slope)
+        p_guess = unbin_gaussian2d_params(lsq_struct['x'], bin_factor)
+        if not quiet:
+            print(f'coarse fit time = {time.time() - t_fit_start:.2f} s')
+    lsq_struct = least_squares_gaussian2d(img, x_coords, y_coords, p_guess, param_keys, lock_params,
+                                          fix_angle=fix_angle, fix_lin_slope=fix_lin_slope)
     t_fit_stop = time.time()
     if not quiet:
         print(f'fit time = {t_fit_stop - t_fit_start:.2f} s')
@@ -321,7 +484,7 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
             angle = angle_offset + angle_diff - 360
         popt_dict['angle'] = angle
 
-    n_data_points = img_downsampled.shape[0]*img_downsampled.shape[1]
+    n_data_points = img.shape[0]*img.shape[1]
     n_fit_parameters = len(popt_dict)
     dof = n_data_points - n_fit_parameters
     sigma_squared = 2 * cost / dof
@@ -329,8 +492,12 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
         cov = sigma_squared * np.linalg.inv(np.matmul(jac.T, jac))
     except np.linalg.LinAlgError as e:
         print(e)
-        cov = 0 * jac
+        cov = np.zeros((n_fit_parameters, n_fit_parameters))
 
+    if compact:
+        if show_plot or (save_name is not None):
+            print('Cannot visualize data with compact fit result')
+        return create_fit_result(img, popt_dict, cov, conf_level, dof, success)
     fit_struct = create_fit_struct(img, popt_dict, cov, conf_level, dof, success, lightweight=lightweight)
     if show_plot or (save_name is not None):
         if not lightweight:
@@ -339,3 +506,176 @@ def fit_gaussian2d(img, zoom=1.0, angle_offset=0.0, fix_lin_slope=False, fix_ang
             print('Cannot visualize data with lightweight fit_struct')
 
     return fit_struct
+
+
+def levenberg_marquardt_batch(residual_func, jac_func, p_init, max_iterations=100, ftol=1e-8, xtol=1e-8):
+    """
+    Minimize 0.5 * sum(residual_func(params, index) ** 2) independently for each row of p_init with a
+    Levenberg-Marquardt iteration which is vectorized over the rows. residual_func(params, index) must return the
+    residuals of the fits selected by index, an array of shape (len(index), num_residuals), for their parameters
+    params, of shape (len(index), num_params). jac_func(params, index) must return the corresponding Jacobians of shape
+    (len(index), num_residuals, num_params). Fits which have converged are dropped from the following iterations.
+    A fit converges when an accepted step reduces the cost by less than a fraction ftol or when the step is smaller
+    than xtol relative to the parameters. Returns the optimal parameters, the Jacobians and costs at the optimal
+    parameters, a boolean success array and the number of iterations of each fit.
+    """
+    params = np.array(p_init, dtype=float)
+    num_fits, num_params = params.shape
+    all_index = np.arange(num_fits)
+    diag_index = np.arange(num_params)
+    residuals = residual_func(params, all_index)
+    cost = 0.5 * np.sum(residuals ** 2, axis=1)
+    damping = np.full(num_fits, 1e-3)
+    damping_factor = np.full(num_fits, 2.0)
+    scale = np.zeros((num_fits, num_params))
+    active = np.ones(num_fits, dtype=bool)
+    success = np.zeros(num_fits, dtype=bool)
+    num_iterations = np.zeros(num_fits, dtype=int)
+    for iteration in range(max_iterations):
+        index = np.flatnonzero(active)
+        if index.size == 0:
+            break
+        p = params[index]
+        jac = jac_func(p, index)
+        jac_t = jac.transpose(0, 2, 1)
+        jtj = np.matmul(jac_t, jac)
+        gradient = np.matmul(jac_t, residuals[index][..., None])
+        # As in MINPACK the damping is scaled by the largest diagonal of jtj seen so far for each parameter, so that a
+        # parameter whose curvature collapses during the fit (e.g. sx of a vanishing Gaussian) can't run away.
+        scale[index] = np.maximum(scale[index], jtj[:, diag_index, diag_index])
+        lhs = jtj.copy()
+        lhs[:, diag_index, diag_index] += damping[index, None] * np.maximum(scale[index], 1e-12)
+        try:
+            step = -np.linalg.solve(lhs, gradient)[..., 0]
+        except np.linalg.LinAlgError:
+            step = -np.matmul(np.linalg.pinv(lhs), gradient)[..., 0]
+        new_p = p + step
+        new_residuals = residual_func(new_p, index)
+        new_cost = 0.5 * np.sum(new_residuals ** 2, axis=1)
+        old_cost = cost[index]
+        improved = new_cost < old_cost
+        predicted_decrease = -(np.sum(step * gradient[..., 0], axis=1)
+                               + 0.5 * np.sum(step * np.matmul(jtj, step[..., None])[..., 0], axis=1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative_decrease = np.where(old_cost > 0, (old_cost - new_cost) / old_cost, 0)
+            gain_ratio = (old_cost - new_cost) / predicted_decrease
+        improved_index = index[improved]
+        params[improved_index] = new_p[improved]
+        residuals[improved_index] = new_residuals[improved]
+        cost[improved_index] = new_cost[improved]
+        # Damping update of Nielsen (1999): shrink the damping according to how well the quadratic model predicted the
+        # decrease of the cost, grow it ever faster on consecutive rejected steps.
+        damping[improved_index] *= np.maximum(1 / 3, 1 - (2 * np.nan_to_num(gain_ratio[improved]) - 1) ** 3)
+        damping_factor[improved_index] = 2
+        rejected_index = index[~improved]
+        damping[rejected_index] *= damping_factor[rejected_index]
+        damping_factor[rejected_index] *= 2
+        num_iterations[index] += 1
+
+        step_norm = np.linalg.norm(step, axis=1)
+        small_step = step_norm <= xtol * (xtol + np.linalg.norm(p, axis=1))
+        converged = (improved & (relative_decrease <= ftol)) | small_step | (cost[index] == 0)
+        success[index[converged]] = True
+        active[index[converged]] = False
+    jac = jac_func(params, all_index)
+    return params, jac, cost, success, num_iterations
+
+
+def fit_gaussian2d_batch(img_stack, angle_offset=0.0, fix_lin_slope=False, fix_angle=False,
+                         conf_level=erf(1 / np.sqrt(2)), lightweight=False, guess=None, max_iterations=100,
+                         return_arrays=False, compact=False):
+    """
+    2D Gaussian fits to a stack of same-shape images, for example the ROI cutouts of an array of tweezers.
+    All fits are performed at once by levenberg_marquardt_batch with the residuals and analytic Jacobians of all images
+    evaluated together, which avoids the per-call overhead of calling fit_gaussian2d for each image. The fit model, the
+    guess values and the post-processing of the fit parameters are the same as in fit_gaussian2d.
+    :param img_stack: Array of shape (num_imgs, num_rows, num_cols) holding the images to fit
+    :param angle_offset: See fit_gaussian2d
+    :param fix_lin_slope: See fit_gaussian2d
+    :param fix_angle: See fit_gaussian2d
+    :param conf_level: Confidence level for confidence intervals
+    :param lightweight: See fit_gaussian2d
+    :param guess: Optional guess values for x0, y0, sx, sy, amp, offset. Either one list of 6 values used for all images
+                  or an array of shape (num_imgs, 6)
+    :param max_iterations: Maximum number of Levenberg-Marquardt iterations
+    :param return_arrays: If True return the results as a dict of arrays instead of a list of fit_structs
+    :param compact: If True return a list of FitResults instead of a list of fit_structs
+    :return: List of fit_struct dictionaries, one per image, as returned by fit_gaussian2d. If return_arrays is True a
+             dict with keys param_keys, popt (num_imgs, num_params), cov (num_imgs, num_params, num_params),
+             success (num_imgs,), dof, num_iterations (num_imgs,) and NGauss (num_imgs,) instead.
+    """
+    img_stack = np.nan_to_num(np.asarray(img_stack, dtype=float))
+    num_imgs = img_stack.shape[0]
+    y_coords, x_coords = get_coordinate_grids(img_stack.shape[1:])
+    x_coords = x_coords.ravel()
+    y_coords = y_coords.ravel()
+    data = img_stack.reshape(num_imgs, -1)
+
+    if guess is None:
+        p_guess = get_guess_values_batch(img_stack)
+    else:
+        p_guess = np.broadcast_to(np.asarray(guess, dtype=float), (num_imgs, 6))
+    param_keys = ['x0', 'y0', 'sx', 'sy', 'amp', 'offset']
+    lock_params = dict()
+    if fix_angle:
+        lock_params['angle'] = 0
+    else:
+        param_keys.append('angle')
+    if fix_lin_slope:
+        lock_params['x_slope'] = 0
+        lock_params['y_slope'] = 0
+    else:
+        param_keys.extend(['x_slope', 'y_slope'])
+    num_params = len(param_keys)
+    p_init = np.zeros((num_imgs, num_params))
+    p_init[:, :6] = p_guess
+
+    def batch_residual_func(params, index):
+        param_dict = {key: params[:, [param_num]] for param_num, key in enumerate(param_keys)}
+        return np.nan_to_num(gaussian_2d(x_coords, y_coords, **param_dict, **lock_params) - data[index])
+
+    def batch_jac_func(params, index):
+        param_dict = {key: params[:, [param_num]] for param_num, key in enumerate(param_keys)}
+        return np.nan_to_num(gaussian_2d_jacobian(x_coords, y_coords, **param_dict, **lock_params,
+                                                  fit_angle=not fix_angle, fit_lin_slope=not fix_lin_slope))
+
+    popt, jac, cost, success, num_iterations = levenberg_marquardt_batch(batch_residual_func, batch_jac_func, p_init,
+                                                                         max_iterations=max_iterations)
+
+    popt[:, 2] = np.abs(popt[:, 2])
+    popt[:, 3] = np.abs(popt[:, 3])
+    if not fix_angle:
+        angle_diff = (popt[:, 6] - angle_offset) % 360
+        quarter_turns = np.floor((angle_diff + 45) / 90)
+        popt[:, 6] = angle_offset + angle_diff - 90 * quarter_turns
+        swap = quarter_turns % 2 == 1
+        popt[swap, 2:4] = popt[swap][:, [3, 2]]
+        jac[swap, :, 2:4] = jac[swap][:, :, [3, 2]]
+
+    n_data_points = data.shape[1]
+    dof = n_data_points - num_params
+    sigma_squared = 2 * cost / dof
+    jtj = np.matmul(jac.transpose(0, 2, 1), jac)
+    try:
+        cov = sigma_squared[:, None, None] * np.linalg.inv(jtj)
+    except np.linalg.LinAlgError:
+        cov = np.zeros_like(jtj)
+        for img_num in range(num_imgs):
+            try:
+                cov[img_num] = sigma_squared[img_num] * np.linalg.inv(jtj[img_num])
+            except np.linalg.LinAlgError as e:
+                print(e)
+
+    if return_arrays:
+        return {'param_keys': param_keys, 'popt': popt, 'cov': cov, 'success': success, 'dof': dof,
+                'num_iterations': num_iterations, 'NGauss': popt[:, 4] * 2 * np.pi * popt[:, 2] * popt[:, 3]}
+    if compact:
+        return [create_fit_result(img_stack[img_num], dict(zip(param_keys, popt[img_num])), cov[img_num], conf_level,
+                                  dof, bool(success[img_num]))
+                for img_num in range(num_imgs)]
+    fit_struct_list = []
+    for img_num in range(num_imgs):
+        popt_dict = dict(zip(param_keys, popt[img_num]))
+        fit_struct_list.append(create_fit_struct(img_stack[img_num], popt_dict, cov[img_num], conf_level, dof,
+                                                 bool(success[img_num]), lightweight=lightweight))
+    return fit_struct_list
@@ -4,7 +4,7 @@ import matplotlib.patches as patches
 from pathlib import Path
 import h5py
 
-from e6dataflow.tools.smart_gaussian2d_fit import fit_gaussian2d
+from e6dataflow.tools.smart_gaussian2d_fit import fit_gaussian2d, fit_gaussian2d_batch
 from e6dataflow.utils import make_centered_roi, get_shot_list_from_point
 
 
@@ -24,19 +24,15 @@ def interpolate_tweezer_positions(first_tweezer_vert, first_tweezer_horiz,
     return vert_center_list, horiz_center_list
 
 
-def fit_for_roi(img, vert_center_guess, horiz_center_guess, vert_search_span, horiz_search_span,
-                lock_span=True, span_output_factor=3.0):
+def get_search_bounds(center_guess, search_span):
+    halfspan = np.ceil(search_span / 2)
+    return int(center_guess - halfspan), int(center_guess + halfspan)
 
-    horiz_halfspan = np.ceil(horiz_search_span / 2)
-    lower_horiz = int(horiz_center_guess - horiz_halfspan)
-    upper_horiz = int(horiz_center_guess + horiz_halfspan)
 
-    vert_halfspan = np.ceil(vert_search_span / 2)
-    lower_vert = int(vert_center_guess - vert_halfspan)
-    upper_vert = int(vert_center_guess + vert_halfspan)
-
-    fit_img = img[lower_vert:upper_vert, lower_horiz:upper_horiz]
-    fit_dict = fit_gaussian2d(fit_img, show_plot=False, lightweight=True)
+def evaluate_roi_fit(fit_dict, vert_center_guess, horiz_center_guess, vert_search_span, horiz_search_span,
+                     lock_span=True, span_output_factor=3.0):
+    lower_horiz, upper_horiz = get_search_bounds(horiz_center_guess, horiz_search_span)
+    lower_vert, upper_vert = get_search_bounds(vert_center_guess, vert_search_span)
 
     horiz_center_fit = fit_dict['x0']['val'] + lower_horiz
     vert_center_fit = fit_dict['y0']['val'] + lower_vert
@@ -73,6 +69,39 @@ def fit_for_roi(img, vert_center_guess, horiz_center_guess, vert_search_span, ho
     return vert_slice, horiz_slice, success
 
 
+def fit_for_roi(img, vert_center_guess, horiz_center_guess, vert_search_span, horiz_search_span,
+                lock_span=True, span_output_factor=3.0):
+    lower_horiz, upper_horiz = get_search_bounds(horiz_center_guess, horiz_search_span)
+    lower_vert, upper_vert = get_search_bounds(vert_center_guess, vert_search_span)
+    fit_img = img[lower_vert:upper_vert, lower_horiz:upper_horiz]
+    fit_dict = fit_gaussian2d(fit_img, show_plot=False, compact=True)
+    return evaluate_roi_fit(fit_dict, vert_center_guess, horiz_center_guess, vert_search_span, horiz_search_span,
+                            lock_span=lock_span, span_output_factor=span_output_factor)
+
+
+def fit_for_rois(img, vert_center_list, horiz_center_list, vert_search_span, horiz_search_span,
+                 lock_span=True, span_output_factor=3.0):
+    """ fit_for_roi for a list of tweezers. Search regions of the same shape are fitted together in a single batched
+    fit. Returns a list of (vert_slice, horiz_slice, success) tuples, one per tweezer."""
+    shape_dict = dict()
+    fit_img_list = []
+    for vert_center_guess, horiz_center_guess in zip(vert_center_list, horiz_center_list):
+        lower_horiz, upper_horiz = get_search_bounds(horiz_center_guess, horiz_search_span)
+        lower_vert, upper_vert = get_search_bounds(vert_center_guess, vert_search_span)
+        fit_img = img[lower_vert:upper_vert, lower_horiz:upper_horiz]
+        shape_dict.setdefault(fit_img.shape, []).append(len(fit_img_list))
+        fit_img_list.append(fit_img)
+    fit_dict_list = [None] * len(fit_img_list)
+    for tweezer_num_list in shape_dict.values():
+        img_stack = np.stack([fit_img_list[tweezer_num] for tweezer_num in tweezer_num_list])
+        for tweezer_num, fit_dict in zip(tweezer_num_list, fit_gaussian2d_batch(img_stack, compact=True)):
+            fit_dict_list[tweezer_num] = fit_dict
+    return [evaluate_roi_fit(fit_dict, vert_center_guess, horiz_center_guess, vert_search_span, horiz_search_span,
+                             lock_span=lock_span, span_output_factor=span_output_factor)
+            for fit_dict, vert_center_guess, horiz_center_guess
+            in zip(fit_dict_list, vert_center_list, horiz_center_list)]
+
+
 def generate_pzt_point_frame_dict(num_pzt, num_points, frame_list, mode='single',
                                   num_inner_point_loop=None, num_outer_point_loop=None):
     pzt_point_frame_dict = dict()
@@ -187,15 +216,15 @@ def get_roi_dict(data_dir, data_prefix, num_points, pzt_point_frame_dict,
         fig = plt.figure()
         ax = fig.add_subplot(1, 1, 1)
         ax.imshow(tot_avg_frame)
+        roi_fit_list = fit_for_rois(tot_avg_frame, vert_center_list, horiz_center_list,
+                                    vert_search_span=vert_search_span,
+                                    horiz_search_span=horiz_search_span,
+                                    lock_span=lock_span,
+                                    span_output_factor=span_output_factor)
         for tweezer_num in range(num_tweezer):
             vert_center = vert_center_list[tweezer_num]
             horiz_center = horiz_center_list[tweezer_num]
-            vert_slice, horiz_slice, success = fit_for_roi(tot_avg_frame,
-                                                           vert_center, horiz_center,
-                                                           vert_search_span=vert_search_span,
-                                                           horiz_search_span=horiz_search_span,
-                                                           lock_span=lock_span,
-                                                           span_output_factor=span_output_factor)
+            vert_slice, horiz_slice, success = roi_fit_list[tweezer_num]
             roi_tuple_list.append((vert_slice, horiz_slice))
             roi_tuple_string = f'({vert_slice.start}, {vert_slice.stop}) x ({horiz_slice.start}, {horiz_slice.stop})'
             if not success:
@@ -1,6 +1,7 @@
+import time
 import numpy as np
 import matplotlib.pyplot as plt
-from .tools.smart_gaussian2d_fit import fit_gaussian2d
+from .tools.smart_gaussian2d_fit import fit_gaussian2d_batch
 
 
 def get_data_min_max(data):
@@ -8,8 +9,8 @@ def get_data_min_max(data):
         data_min = min(data)
         data_max = max(data)
     elif isinstance(data, np.ndarray):
-        data_min = data.min()
-        data_max = data.max()
+        data_min = np.nanmin(data)
+        data_max = np.nanmax(data)
     else:
         print('Unable to extract data minimum and maximum values.')
         raise ValueError
@@ -86,6 +87,21 @@ def qprint(string, quiet):
         print(string)
 
 
+class RateLimiter:
+    """ Allow an action at most max_rate times per second. is_due() is True once 1 / max_rate seconds have passed
+    since the last call to mark()."""
+    def __init__(self, max_rate):
+        self.max_rate = max_rate
+        self.min_interval = 1 / max_rate
+        self.last_time = None
+
+    def is_due(self):
+        return self.last_time is None or time.monotonic() - self.last_time >= self.min_interval
+
+    def mark(self):
+        self.last_time = time.monotonic()
+
+
 def make_centered_roi(vert_center, horiz_center, vert_span, horiz_span, max_vert=None, max_horiz=None):
     vert_lower = max(int(vert_center - vert_span / 2), 0)
     vert_upper = int(vert_center + vert_span / 2)
@@ -100,6 +116,38 @@ def make_centered_roi(vert_center, horiz_center, vert_span, horiz_span, max_vert
     return vert_slice, horiz_slice
 
 
+def get_roi_bounding_box(roi_list):
+    """
+    Return the smallest (vert_slice, horiz_slice) roi which contains every roi in roi_list. Returns None if the bounding
+    box cannot be determined without knowing the frame shape, e.g. if any roi has open or negative bounds or a step.
+    """
+    vert_lower, vert_upper, horiz_lower, horiz_upper = None, None, None, None
+    for roi in roi_list:
+        vert_slice, horiz_slice = roi
+        for roi_slice in (vert_slice, horiz_slice):
+            if not isinstance(roi_slice, slice) or roi_slice.step not in (None, 1):
+                return None
+            if roi_slice.start is None or roi_slice.stop is None or roi_slice.start < 0 or roi_slice.stop < 0:
+                return None
+        vert_lower = vert_slice.start if vert_lower is None else min(vert_lower, vert_slice.start)
+        vert_upper = vert_slice.stop if vert_upper is None else max(vert_upper, vert_slice.stop)
+        horiz_lower = horiz_slice.start if horiz_lower is None else min(horiz_lower, horiz_slice.start)
+        horiz_upper = horiz_slice.stop if horiz_upper is None else max(horiz_upper, horiz_slice.stop)
+    if vert_lower is None:
+        return None
+    return slice(vert_lower, vert_upper, 1), slice(horiz_lower, horiz_upper, 1)
+
+
+def shift_roi(roi, vert_offset, horiz_offset):
+    """
+    Shift roi so that it indexes into a sub-frame whose origin lies at (vert_offset, horiz_offset) in the full frame.
+    """
+    vert_slice, horiz_slice = roi
+    vert_slice = slice(vert_slice.start - vert_offset, vert_slice.stop - vert_offset, vert_slice.step)
+    horiz_slice = slice(horiz_slice.start - horiz_offset, horiz_slice.stop - horiz_offset, horiz_slice.step)
+    return vert_slice, horiz_slice
+
+
 def dict_compare(dict_1, dict_2):
     for key in dict_1.keys():
         if key not in dict_2:
@@ -142,27 +190,36 @@ def ROI_fit(fit_frame_array, roi_guess_array, quiet=True, iterations=1, roi_fina
         result[f'iteration-{i:01d}'] = {}
         if not quiet:
             print('iteration ', i)
+        # ROIs of the same shape are fitted together in a single batched fit.
+        shape_dict = dict()
         for pt in range(num_pts):
             frame = fit_frame_array[pt, :, :]
+            for twz in range(num_twz):
+                roi = roi_guess_array[pt, twz]
+                shape_dict.setdefault(frame[roi].shape, []).append((pt, twz))
+        fit_struct_dict = dict()
+        for pt_twz_list in shape_dict.values():
+            img_stack = np.stack([fit_frame_array[pt, :, :][roi_guess_array[pt, twz]] for pt, twz in pt_twz_list])
+            if i == 0:
+                guess = None
+            else:
+                guess = []
+                for pt, twz in pt_twz_list:
+                    roi = roi_guess_array[pt, twz]
+                    previous_fit_struct = result[f'iteration-{(i-1):01d}'][f'point-{pt:02d}'][f'tweezer-{twz:02d}']
+                    guess.append([(roi[1].stop - roi[1].start)/2,
+                                  (roi[0].stop - roi[0].start)/2,
+                                  previous_fit_struct['sx']['val'],
+                                  previous_fit_struct['sy']['val'],
+                                  previous_fit_struct['amp']['val'],
+                                  previous_fit_struct['offset']['val']])
+            fit_struct_list = fit_gaussian2d_batch(img_stack, fix_angle=True, fix_lin_slope=True, guess=guess)
+            fit_struct_dict.update(zip(pt_twz_list, fit_struct_list))
+        for pt in range(num_pts):
             res = {}
             for twz in range(num_twz):
                 roi = roi_guess_array[pt, twz]
-                if i == 0:
-                    fit_struct = fit_gaussian2d(frame[roi],
-                                                fix_angle=True, fix_lin_slope=True, show_plot=False)
-                else:
-                    fit_struct = fit_gaussian2d(frame[roi],
-                                                fix_angle=True, fix_lin_slope=True, show_plot=False,
-                                                guess=[(roi[1].stop - roi[1].start)/2,
-                                                       (roi[0].stop - roi[0].start)/2,
-                                                       result[f'iteration-{(i-1):01d}'][f'point-{pt:02d}'][
-                                                                    f'tweezer-{twz:02d}']['sx']['val'],
-                                                             result[f'iteration-{(i-1):01d}'][f'point-{pt:02d}'][
-                                                                 f'tweezer-{twz:02d}']['sy']['val'],
-                                                             result[f'iteration-{(i-1):01d}'][f'point-{pt:02d}'][
-                                                                 f'tweezer-{twz:02d}']['amp']['val'],
-                                                             result[f'iteration-{(i-1):01d}'][f'point-{pt:02d}'][
-                                                                 f'tweezer-{twz:02d}']['offset']['val']])
+                fit_struct = fit_struct_dict[(pt, twz)]
                 for key in ['val','val_lb','val_ub']:
                     fit_struct['x0'][key]+=roi[1].start
                     fit_struct['y0'][key]+=roi[0].start